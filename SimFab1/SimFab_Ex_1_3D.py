@@ -0,0 +1,128 @@
+import numpy as np
+import sys
+import time
+from SimFab_Ex_1_gridio import save_grid
+
+# 3D counterpart of the SDFGrid of Task 1 and 2, for quick geometry prototyping before running ViennaLS:
+# the same reflective / periodic boundary handling, vectorized sphere / box / cylinder builders and whole-field
+# gradient, normal and curvature operators (central differences, clamped at the grid edges like in Task 2).
+
+# central difference of a field along one axis, with the index clamped at the edges
+# (D[0] = (f[1] - f[0]) / 2h and D[-1] = (f[-1] - f[-2]) / 2h, as min / max on the index gives in Task 2)
+def central_difference(field, axis, spacing):
+    D = np.empty_like(field)
+    f = np.moveaxis(field, axis, 0)
+    d = np.moveaxis(D, axis, 0)
+    np.subtract(f[2:], f[:-2], out = d[1:-1])
+    d[0] = f[1] - f[0]
+    d[-1] = f[-1] - f[-2]
+    D /= 2 * spacing
+    return D
+
+class SDFGrid3D:
+    def __init__(self, n_x, n_y, n_z, spacing, boundary_condition, grid = None):    # Constructor for grid dimensions, spacing and BC
+
+        self.n_x = n_x           # No. of grid points along x-axis
+        self.n_y = n_y           # No. of grid points along y-axis
+        self.n_z = n_z           # No. of grid points along z-axis
+        self.spacing = spacing         # Grid spacing
+        self.boundary_condition = boundary_condition     # BC (Reflective or Periodic)
+        self.grid = np.zeros((n_x, n_y, n_z)) if grid is None else grid   # initializing the grid
+
+    def BC(self, i, j, k):   # boundary conditions for the indexes i, j, k (integers or index arrays), returns mapped coordinates
+        if self.boundary_condition == 'reflective':
+            return self.reflective(i, self.n_x), self.reflective(j, self.n_y), self.reflective(k, self.n_z)
+        elif self.boundary_condition == 'periodic':
+            return self.periodic(i, self.n_x), self.periodic(j, self.n_y), self.periodic(k, self.n_z)
+        return np.asarray(i) * self.spacing, np.asarray(j) * self.spacing, np.asarray(k) * self.spacing
+
+    def reflective(self, index, max_index):
+        index = np.asarray(index)
+        mapped = np.where(index < 0, -index, np.where(index >= max_index, 2 * max_index - index - 1, index))
+        return mapped * self.spacing
+
+    def periodic(self, index, max_index):
+        index = np.asarray(index)
+        mapped = np.where(index < 0, max_index + index, np.where(index >= max_index, index - max_index, index))
+        return mapped * self.spacing
+
+    def coordinates(self):   # mapped coordinates with shapes (n_x, 1, 1), (1, n_y, 1) and (1, 1, n_z), broadcasting to the full grid
+        return self.BC(np.arange(self.n_x)[:, None, None], np.arange(self.n_y)[None, :, None], np.arange(self.n_z)[None, None, :])
+
+    def distance_sphere(self, centre, radius):   # SDF of a sphere
+        x, y, z = self.coordinates()
+        x0, y0, z0 = centre
+        self.grid[...] = np.sqrt((x - x0)**2 + (y - y0)**2 + (z - z0)**2) - radius
+
+    def distance_box(self, min_corner, max_corner):   # SDF of an axis-aligned box (the 3D version of distance_rectangle)
+        x, y, z = self.coordinates()
+        d = [np.maximum(np.maximum(low - c, 0), c - high) for c, low, high in zip((x, y, z), min_corner, max_corner)]
+        outside = np.sqrt(d[0]**2 + d[1]**2 + d[2]**2)
+        inner = [np.minimum(c - low, high - c) for c, low, high in zip((x, y, z), min_corner, max_corner)]
+        inner = np.minimum(np.minimum(inner[0], inner[1]), inner[2])     # distance to the nearest face, > 0 inside
+        self.grid[...] = np.where(inner >= 0, -inner, outside)
+
+    # SDF of a closed cylinder along one axis ('x', 'y' or 'z')
+    # base_centre: centre of the bottom cap, radius: radius, height: length along the axis
+    def distance_cylinder(self, base_centre, radius, height, axis = 'z'):
+        coordinates = self.coordinates()
+        a = 'xyz'.index(axis)
+        along = coordinates[a] - (base_centre[a] + height / 2)
+        across = [coordinates[b] - base_centre[b] for b in range(3) if b != a]
+        d_radial = np.sqrt(across[0]**2 + across[1]**2) - radius
+        d_axial = np.abs(along) - height / 2
+        inside = np.minimum(np.maximum(d_radial, d_axial), 0)
+        self.grid[...] = inside + np.sqrt(np.maximum(d_radial, 0)**2 + np.maximum(d_axial, 0)**2)
+
+    # whole-field operators:
+
+    def gradient(self):     # It returns: (D_x, D_y, D_z) arrays
+        return tuple(central_difference(self.grid, axis, self.spacing) for axis in range(3))
+
+    # unit normals n = grad / (|grad| + p), zero where |grad| <= p (as the per-point normal of Task 2)
+    # It returns: (n_x, n_y, n_z) arrays
+    def normal(self, p = 1e-10):
+        D = self.gradient()
+        magnitude = np.sqrt(D[0]**2 + D[1]**2 + D[2]**2)
+        scale = np.where(magnitude > p, 1 / (magnitude + p), 0.0)
+        for component in D:
+            component *= scale
+        return D
+
+    # curvature = divergence of the unit normal
+    def curvature(self, p = 1e-10):
+        normal = self.normal(p)
+        curv = central_difference(normal[0], 0, self.spacing)
+        curv += central_difference(normal[1], 1, self.spacing)
+        curv += central_difference(normal[2], 2, self.spacing)
+        return curv
+
+    def save(self, filename):    # binary .sdf file (see SimFab_Ex_1_gridio)
+        save_grid(filename, self.grid, self.spacing, self.boundary_condition, (0.0, 0.0, 0.0))
+
+def main():     # command line: ./grid x-size y-size z-size spacing [Sphere / Box / Cylinder] [reflective / periodic] [parameters]
+    args = sys.argv[1:]
+    if len(args) < 10:
+        print("Provide the following values: [x-size y-size z-size] [spacing] [Sphere / Box / Cylinder] [reflective / periodic] [parameters]")
+        return
+    n_x, n_y, n_z = int(args[0]), int(args[1]), int(args[2])
+    spacing = float(args[3])
+    shape = args[4]
+    grid = SDFGrid3D(n_x, n_y, n_z, spacing, args[5])
+    values = [float(a) for a in args[6:]]
+
+    start = time.perf_counter()
+    if shape == "Sphere":        # centre (3 values), radius
+        grid.distance_sphere(values[0:3], values[3])
+    elif shape == "Box":         # minimum corner (3 values), maximum corner (3 values)
+        grid.distance_box(values[0:3], values[3:6])
+    elif shape == "Cylinder":    # centre of the bottom cap (3 values), radius, height; axis along z
+        grid.distance_cylinder(values[0:3], values[3], values[4])
+    else:
+        print("Error: shape has to be Sphere, Box or Cylinder")
+        return
+    print(f"{shape} SDF on {n_x} x {n_y} x {n_z} grid in {time.perf_counter() - start:.3f} s")
+    grid.save(f'{shape.lower()}_grid_3d.sdf')
+
+if __name__ == '__main__':
+    main()
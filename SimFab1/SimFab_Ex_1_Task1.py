@@ -1,15 +1,73 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import sys
+import zlib
+from SimFab_Ex_1_reinit import reinitialize
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+from SimFab_Ex_1_gridio import save_grid
+from SimFab_Ex_1_csg import evaluate_tiled
+from SimFab_Ex_1_halo import pad
+from SimFab_Ex_1_contour import extract_contour
+from SimFab_Ex_1_fieldcache import FieldCache
 
 class SDFGrid:
-    def __init__(self, n_x, n_y, spacing, boundary_condition):    # Constructor for grid dimensions, spacing and Boundary conditions (BC).
+    def __init__(self, n_x, n_y, spacing, boundary_condition, grid = None):    # Constructor for grid dimensions, spacing and Boundary conditions (BC).
+        # grid: optional existing storage for the values (e.g. a np.memmap of a grid file), a new array is allocated otherwise
         
         self.n_x = n_x           # No. of grid points along x-axis
         self.n_y = n_y           # No. of grid points along x-axis
         self.spacing = spacing         # Grid spacing
         self.boundary_condition = boundary_condition     # BC (Reflective or Periodic)
-        self.grid = np.zeros((n_x, n_y))  # initializing the grid
+        self.halo = None              # grid padded with ghost cells for the stencils (see padded())
+        self.version = 0              # increased whenever the grid changes
+        self.fingerprint = None       # fingerprint of the values the halo and the cached fields belong to
+        self.fields = FieldCache()    # derived fields of the current version (see derived())
+        self.grid = np.zeros((n_x, n_y)) if grid is None else grid  # initializing the grid
+
+    # the grid values; assigning a new array (or changing the values through the methods below) marks the halo as outdated
+    # Contract for the halo and the cached fields: values written in place (sdf_grid.grid[i, j] = ...) are detected by a
+    # fingerprint of the values (CRC32, see check_grid()) that is checked before the halo or a cached field is used;
+    # grid_changed() marks the change at once, without a check.
+
+    @property
+    def grid(self):
+        return self._grid
+
+    @grid.setter
+    def grid(self, values):
+        self._grid = values
+        self.grid_changed()
+
+    def grid_changed(self):
+        self.halo_valid = False
+        self.version += 1
+        self.fields.expire(self.version)
+        self.fingerprint = None
+
+    # the version of the current values: compares their fingerprint with the one of the halo and the cached fields and
+    # starts a new version if the grid has been changed in place since
+    def check_grid(self):
+        fingerprint = grid_fingerprint(self.grid)
+        if self.fingerprint is not None and fingerprint != self.fingerprint:
+            self.grid_changed()
+        self.fingerprint = fingerprint
+        return self.version
+
+    # a derived field (gradient, normals, ...) of the current grid: computed with compute() on first use and then
+    # taken from the cache until the grid changes (the cache size is limited by self.fields.max_bytes)
+    # name: identifies the field together with its parameters
+    def derived(self, name, compute, *parameters):
+        return self.fields.get((name,) + parameters, self.check_grid(), compute)
+
+    # the grid with a halo of `width` ghost cells filled according to the boundary condition (see SimFab_Ex_1_halo);
+    # the halo is filled once and reused until the grid changes
+
+    def padded(self, width = 1):
+        self.check_grid()
+        if not self.halo_valid or self.halo is None or self.halo.shape != (self.n_x + 2 * width, self.n_y + 2 * width):
+            self.halo = pad(np.asarray(self.grid), self.boundary_condition, width, out = self.halo)
+            self.halo_valid = True
+        return self.halo
 
     def BC(self, i, j):  # function to implement boundary conditions (i, j are the indexes in the x and y directions)
        
@@ -26,32 +84,56 @@ class SDFGrid:
             y = j * self.spacing
         return x, y    
 
+    def BC_vectorized(self, i, j):  # array version of BC(): i, j are index arrays (broadcastable), returns mapped coordinate arrays
+
+        if self.boundary_condition == 'reflective':
+            x = self.reflective_vectorized(i, self.n_x)
+            y = self.reflective_vectorized(j, self.n_y)
+        elif self.boundary_condition == 'periodic':
+            x = self.periodic_vectorized(i, self.n_x)
+            y = self.periodic_vectorized(j, self.n_y)
+        else:
+            x = i * self.spacing
+            y = j * self.spacing
+        return x, y
+
+    def coordinates(self):   # mapped x-coordinates as a column (n_x, 1) and y-coordinates as a row (1, n_y), broadcasting to the full grid
+        i = np.arange(self.n_x)[:, None]
+        j = np.arange(self.n_y)[None, :]
+        return self.BC_vectorized(i, j)
+
     def distance_circle(self, centre, radius):  # method to calculate signed distance function for circle.
          
         x0, y0 = centre    # co-ordinates of the centre of circle
-        for i in range(self.n_x):
-            for j in range(self.n_y):
-                x, y = self.BC(i, j)
+        x, y = self.coordinates()
 
-            # now to calculate the distance of a point from the grid surface
+        # now to calculate the distance of every grid point from the surface in one array operation
 
-                distance = np.sqrt((x - x0)**2 + (y - y0)**2) - radius
-                self.grid[i, j] = distance
+        self.grid[:, :] = np.sqrt((x - x0)**2 + (y - y0)**2) - radius
+        self.grid_changed()
 
     def distance_rectangle(self, min_corner, max_corner):   # Method to calculate SDF for rectangle.
         
         x_min, y_min = min_corner   # Coordinates of the rectangle's minimum corner
         x_max, y_max = max_corner   #  Coordinates of the rectangle's maximum corner
 
-        for i in range(self.n_x):
-            for j in range(self.n_y):
-                x, y = self.BC(i, j)
-                d_x = max(x_min - x, 0, x - x_max)
-                d_y = max(y_min - y, 0, y - y_max)
-                distance = np.sqrt(d_x**2 + d_y**2)
-                if x_min <= x <= x_max and y_min <= y <= y_max:
-                    distance = -min(x - x_min, x_max - x, y - y_min, y_max - y)
-                self.grid[i, j] = distance
+        x, y = self.coordinates()
+        d_x = np.maximum(np.maximum(x_min - x, 0), x - x_max)
+        d_y = np.maximum(np.maximum(y_min - y, 0), y - y_max)
+        distance = np.sqrt(d_x**2 + d_y**2)
+
+        # points inside the rectangle get minus the distance to the nearest side
+        inside = (x_min <= x) & (x <= x_max) & (y_min <= y) & (y <= y_max)
+        inner = -np.minimum(np.minimum(x - x_min, x_max - x), np.minimum(y - y_min, y_max - y))
+        self.grid[:, :] = np.where(inside, inner, distance)
+        self.grid_changed()
+
+    # method to calculate the SDF of a composed shape (Union / Intersection / Difference of many primitives, see SimFab_Ex_1_csg)
+    # tile: size of the tiles (in grid points) that are evaluated at once
+
+    def distance_shape(self, shape, tile = 64):
+        evaluate_tiled(shape, *self.coordinates(), out = self.grid, tile = tile)
+        self.grid_changed()
    
    # applying boundary conditions: 
 
@@ -76,14 +158,64 @@ class SDFGrid:
         else:
             return index * self.spacing
 
+    # array versions of the boundary conditions, same mapping as above applied to a whole index array at once
+
+    def reflective_vectorized(self, index, max_index):
+        index = np.asarray(index)
+        mapped = np.where(index < 0, -index, np.where(index >= max_index, 2 * max_index - index - 1, index))
+        return mapped * self.spacing
+
+    def periodic_vectorized(self, index, max_index):
+        index = np.asarray(index)
+        mapped = np.where(index < 0, max_index + index, np.where(index >= max_index, index - max_index, index))
+        return mapped * self.spacing
+
+    # rebuilds an exact signed distance function from the current zero level set (after advection has distorted it)
+    # method: 'fast_marching' or 'fast_sweeping', band: optional narrow-band width, only cells closer than this are recomputed
+
+    def reinitialize(self, method = 'fast_marching', band = None):
+        if isinstance(self.grid, NarrowBandGrid):
+            self.grid.rebuild()       # a narrow-band grid is redistanced by rebuilding its band
+        else:
+            self.grid[:, :] = reinitialize(self.grid, self.spacing, method, band)
+        self.grid_changed()
+
+    # switches the grid to narrow-band storage: only cells with |phi| < width * spacing are kept (see SimFab_Ex_1_narrowband)
+
+    def to_narrow_band(self, width = 5):
+        self.grid = NarrowBandGrid.from_dense(self.grid, self.spacing, width)
+
+    # zero contour of the grid (marching squares, see SimFab_Ex_1_contour) without plotting
+    # It returns: (vertices, segments, metrics) - metrics holds the enclosed 'area', the 'perimeter' and the 'centroid'
+
+    def interface(self):
+        return extract_contour(np.asarray(self.grid), self.spacing)
+
     # for saving the grid to a .csv file
 
     def save_to_csv(self, filename): 
         np.savetxt(filename, self.grid, delimiter=',')
 
+    # for saving the grid to the binary .sdf format (values plus spacing, boundary condition and origin, see SimFab_Ex_1_gridio)
+
+    def save(self, filename):
+        save_grid(filename, np.asarray(self.grid), self.spacing, self.boundary_condition)
+
+    # saves in the format given by the file extension (.csv or .sdf)
+
+    def save_as(self, filename):
+        if filename.endswith('.csv'):
+            self.save_to_csv(filename)
+        else:
+            self.save(filename)
+
 # Visualization of the grid 
 
-    def visualize(self, title):
+    # filename: render headless into an image file instead of opening a window (see SimFab_Ex_1_render)
+    def visualize(self, title, filename = None):
+        if filename is not None:
+            headless_renderer().render(self.grid, title, filename, self.spacing)
+            return
         
         x = np.linspace(0, self.n_x * self.spacing, self.n_x)
         y = np.linspace(0, self.n_y * self.spacing, self.n_y)
@@ -100,9 +232,29 @@ class SDFGrid:
         plt.show()
         
 
+# fingerprint of grid values (an array, e.g. a np.memmap, or a NarrowBandGrid): CRC32 of the raw data, so that a
+# value written in place changes it (one pass over the data, much cheaper than the fields it validates)
+def grid_fingerprint(values):
+    if isinstance(values, NarrowBandGrid):
+        return tuple(grid_fingerprint(a) for a in (values.keys, values.values, values.row_sign))
+    values = np.ascontiguousarray(values)
+    return (values.shape, values.dtype.str, zlib.crc32(values.view(np.uint8).reshape(-1) if values.size else b''))
+
+# one renderer per process, reused for every headless frame
+renderers = []
+
+def headless_renderer():
+    from SimFab_Ex_1_render import FrameRenderer
+    if not renderers:
+        renderers.append(FrameRenderer())
+    return renderers[0]
+
 def main():      # for running arguments, generating the grid and its visualization through command line.  
     
     args = sys.argv[1:]
+    extension = '.csv' if '--csv' in args else '.sdf'    # the grid is saved in the binary format unless --csv is given
+    headless = '--headless' in args      # with --headless the plot is written to <shape>_grid.png instead of being shown
+    args = [a for a in args if a not in ('--csv', '--headless')]
     if len(args) < 8:  # As the minimum conditions for a circle is 8, and 9 for a rectangle, so if the no. of arguments is less than 8 it will print the sentence below: 
         
         print("Provide the following values: ./Grid[x-size(n_x) y-size(n_y)] [spacing] [Circle / Rectangle] [reflective / periodic] [parameters]")
@@ -126,11 +278,12 @@ def main():      # for running arguments, generating the grid and its visualizat
             print("Error: Please provide exactly 8 arguments")
             return
         grid.distance_circle(center, radius)
+        image = 'circle_grid.png' if headless else None
         if args[4] == 'reflective':
-            grid.visualize('Signed Distance Function - Circle (Reflective)')
+            grid.visualize('Signed Distance Function - Circle (Reflective)', image)
         elif args[4] == 'periodic':
-            grid.visualize('Signed Distance Function - Circle (Periodic)')
-        grid.save_to_csv('circle_grid.csv')
+            grid.visualize('Signed Distance Function - Circle (Periodic)', image)
+        grid.save_as('circle_grid' + extension)
 
     elif shape == "Rectangle":
         # args[5] and args[6] = x and y-coordinates of the minimum corner of rectangle
@@ -141,11 +294,12 @@ def main():      # for running arguments, generating the grid and its visualizat
             print("Error: Please provide exactly 9 arguments")
             return
         grid.distance_rectangle(min_corner, max_corner)
+        image = 'rectangle_grid.png' if headless else None
         if args[4] == 'reflective':
-            grid.visualize('Signed Distance Function - Rectangle (Reflective)')
+            grid.visualize('Signed Distance Function - Rectangle (Reflective)', image)
         elif args[4] == 'periodic':
-            grid.visualize('Signed Distance Function - Rectangle (Periodic)')
-        grid.save_to_csv('rectangle_grid.csv')
+            grid.visualize('Signed Distance Function - Rectangle (Periodic)', image)
+        grid.save_as('rectangle_grid' + extension)
 
 if __name__ == '__main__':
     main()
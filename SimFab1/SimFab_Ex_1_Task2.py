@@ -1,6 +1,8 @@
 import numpy as np
 import sys
 from SimFab_Ex_1_Task1 import SDFGrid as BaseGrid  # importing the functions from Task 1
+from SimFab_Ex_1_halo import pad, shifted, central_derivative
+from SimFab_Ex_1_derivatives import one_sided_derivatives
 
 # Using the SDFGrid class from the SimFab_Ex_1_Task1 file
 
@@ -12,37 +14,96 @@ class SDFGrid(BaseGrid):
     # Calculation of numerical derivatives at the point (x, y) using central differences:
     # x: x-coordinate index in the grid
     # y: y-coordinate index in the grid
+    # x and y can also be index arrays, then the derivatives of all these points are returned as arrays.
+    # The neighbours are read from the current grid values (index clamped at the edges), so values changed in place
+    # are always seen.
     # It returns: Derivatives (D_x, D_y)  
     def numerical_derivative(self, x, y):
-        D_x = (self.grid[min(x + 1, self.n_x - 1), y] - self.grid[max(x - 1, 0), y]) / (2 * self.spacing)
-        D_y = (self.grid[x, min(y + 1, self.n_y - 1)] - self.grid[x, max(y - 1, 0)]) / (2 * self.spacing)
+        D_x = (self.grid[np.minimum(x + 1, self.n_x - 1), y] - self.grid[np.maximum(x - 1, 0), y]) / (2 * self.spacing)
+        D_y = (self.grid[x, np.minimum(y + 1, self.n_y - 1)] - self.grid[x, np.maximum(y - 1, 0)]) / (2 * self.spacing)
         return D_x, D_y
 
-    # Calculation of the normal vector at the point (x, y) using numerical derivatives:
+    # Calculation of the normal vector at the point (x, y) (or at index arrays x, y) using numerical derivatives:
     # It returns: Normal vector [D_x / magnitude, D_y / magnitude]
     def normal(self, x, y, p = 1e-10):
-        D_x, D_y = self.numerical_derivative(x, y)
-        magnitude = np.sqrt(D_x**2 + D_y**2)
-        if magnitude > p:
-            return D_x / (magnitude + p), D_y / (magnitude + p)
-        else:
-            return 0.0, 0.0     # to avoid division by zero by returning a zero vector
-
-    # Calculation of the curvature at the point (x, y) using numerical derivatives and normal:
-    # It returns: Curvature (curv)
-    def curvature(self, x, y):
-        n_x, n_y = self.normal(x, y)
+        return unit_normal(*self.numerical_derivative(x, y), p)
 
-        n_x_right, n_y_right = self.normal(min(x + 1, self.n_x - 1), y)
-        n_x_left, n_y_left = self.normal(max(x - 1, 0), y)
-        n_x_top, n_y_top = self.normal(x, min(y + 1, self.n_y - 1))
-        n_x_bottom, n_y_bottom = self.normal(x, max(y - 1, 0))
+    # Calculation of the curvature at the point (x, y) (or at index arrays x, y) using numerical derivatives and normal:
+    # the normals of the four neighbours (index clamped at the edges) are found in one vectorized call
+    # It returns: Curvature (curv)
+    def curvature(self, x, y, p = 1e-10):
+        x, y = np.asarray(x), np.asarray(y)
+        n_x, n_y = self.normal(np.stack((np.minimum(x + 1, self.n_x - 1), np.maximum(x - 1, 0), x, x)),
+                               np.stack((y, y, np.minimum(y + 1, self.n_y - 1), np.maximum(y - 1, 0))), p)
 
-        Dn_x = (n_x_right - n_x_left) / (2 * self.spacing)
-        Dn_y = (n_y_top - n_y_bottom) / (2 * self.spacing)
+        Dn_x = (n_x[0] - n_x[1]) / (2 * self.spacing)     # right - left
+        Dn_y = (n_y[2] - n_y[3]) / (2 * self.spacing)     # top - bottom
 
         curv = Dn_x + Dn_y
-        return curv
+        return curv[()]
+
+    # Whole-field operators: the same values as the per-point functions above, for the whole grid in a few array passes,
+    # or only for the cells of a boolean mask (then the values are returned in the order of grid[mask]).
+    # The whole-grid fields are cached (read-only) until the grid changes, also in place (see SDFGrid.check_grid()); a
+    # masked call takes its values from the cached field if there is one for the current values.
+
+    # It returns: (D_x, D_y) arrays
+    def gradient_field(self, mask = None):
+        if mask is not None:
+            return self.masked('gradient', mask) or self.numerical_derivative(*np.nonzero(mask))
+        return self.derived('gradient', lambda: central_derivative(self.padded(), 1, self.spacing))
+
+    # It returns: (n_x, n_y) arrays of unit normals (zero where |grad| <= p)
+    def normal_field(self, mask = None, p = 1e-10):
+        if mask is not None:
+            return self.masked('normal', mask, p) or unit_normal(*self.gradient_field(mask), p)
+        return self.derived('normal', lambda: unit_normal(*self.gradient_field(), p), p)
+
+    # It returns: curvature array (divergence of the unit normals)
+    def curvature_field(self, mask = None, p = 1e-10):
+        if mask is not None:
+            cached = self.masked('curvature', mask, p)
+            return cached[0] if cached else self.curvature(*np.nonzero(mask), p)
+        return self.derived('curvature', lambda: self.divergence(*self.normal_field(p = p)), p)
+
+    # one-sided derivatives of higher order for upwinding, scheme: 'upwind', 'eno2', 'eno3' or 'weno5' (see SimFab_Ex_1_derivatives)
+    # It returns: (D_x_minus, D_x_plus, D_y_minus, D_y_plus) arrays
+    def upwind_derivatives(self, scheme = 'weno5', mask = None):
+        if mask is not None:
+            return one_sided_derivatives(self.grid, self.spacing, scheme, self.boundary_condition, np.nonzero(mask))
+        return self.derived('upwind', lambda: one_sided_derivatives(self.grid, self.spacing, scheme, self.boundary_condition), scheme)
+
+    # It returns: (D_xx, D_xy, D_yy) arrays of second derivatives (central differences from the padded grid)
+    def hessian_field(self):
+        return self.derived('hessian', self.hessian)
+
+    def divergence(self, n_x, n_y):
+        Dn_x = central_derivative(pad(n_x), 1, self.spacing)[0]    # neighbours clamped at the edges, as in curvature()
+        Dn_y = central_derivative(pad(n_y), 1, self.spacing)[1]
+        return Dn_x + Dn_y
+
+    def hessian(self):
+        P = self.padded()
+        h2 = self.spacing**2
+        D_xx = (shifted(P, 1, 1, 0) - 2 * shifted(P, 1, 0, 0) + shifted(P, 1, -1, 0)) / h2
+        D_yy = (shifted(P, 1, 0, 1) - 2 * shifted(P, 1, 0, 0) + shifted(P, 1, 0, -1)) / h2
+        D_xy = (shifted(P, 1, 1, 1) - shifted(P, 1, 1, -1) - shifted(P, 1, -1, 1) + shifted(P, 1, -1, -1)) / (4 * h2)
+        return D_xx, D_xy, D_yy
+
+    # values of a cached whole-grid field at the mask cells, as a tuple (None if the field is not cached)
+    def masked(self, name, mask, *parameters):
+        field = self.fields.peek((name,) + parameters, self.check_grid())
+        if field is None:
+            return None
+        return tuple(f[mask] for f in field) if isinstance(field, tuple) else (field[mask],)
+
+# unit normal from derivatives (numbers or arrays): n = D / (|D| + p), zero vector where |D| <= p to avoid division by zero
+def unit_normal(D_x, D_y, p = 1e-10):
+    magnitude = np.sqrt(D_x**2 + D_y**2)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        n_x = np.where(magnitude > p, D_x / (magnitude + p), 0.0)
+        n_y = np.where(magnitude > p, D_y / (magnitude + p), 0.0)
+    return n_x[()], n_y[()]
 
 def main():     # To pass arguments using cmd and calculate normal vector and curvature
     args = sys.argv[1:]
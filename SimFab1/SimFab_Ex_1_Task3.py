@@ -2,80 +2,91 @@ import numpy as np
 import matplotlib.pyplot as plt
 import sys
 from SimFab_Ex_1_Task2 import SDFGrid  # to import the previous code and calculations of task 2
+from SimFab_Ex_1_gridio import read_any, save_grid, write_series
+from SimFab_Ex_1_render import FrameRenderer
+from SimFab_Ex_1_advection import advect, FLUXES
+from SimFab_Ex_1_integrate import evolve, snapshots, report_text
+from SimFab_Ex_1_velocity import Directional, Curvature, Extended
 
 # for advancing the surface by simply subtracting velocity value
 def simple_advance(grid, V, del_t):
     return grid - V * del_t
 
 # for advancing the surface using the Engquist-Osher scheme
-def engquist_osher(grid, velocity_field, spacing, del_t):
-    n_x, n_y = grid.shape
-    new_grid = np.copy(grid)
-    for x in range(n_x):
-        for y in range(n_y):
-            D_x, D_y = numerical_derivative(grid, x, y, spacing)
-            V = velocity_field[x, y]
-            if V < 0:
-                Dx_neg = max(-D_x, 0)**2 + min(-D_x, 0)**2
-                Dy_neg = max(-D_y, 0)**2 + min(-D_y, 0)**2
-                gradSDF_magnitude = np.sqrt(Dx_neg + Dy_neg)
-            else:
-                Dx_pos = max(D_x, 0)**2 + min(D_x, 0)**2
-                Dy_pos = max(D_y, 0)**2 + min(D_y, 0)**2
-                gradSDF_magnitude = np.sqrt(Dx_pos + Dy_pos)
-            new_grid[x, y] -= V * gradSDF_magnitude * del_t
-    return new_grid
+# velocity_field: number or array of the grid shape (normal speed of every cell)
+# boundary_condition: how the derivatives see beyond the edges (None: clamped index, 'reflective' or 'periodic')
+# The one-sided differences D+ / D- are taken as whole arrays and upwinded by the sign of the velocity,
+# see SimFab_Ex_1_advection; a NarrowBandGrid is only updated at its band cells.
+def engquist_osher(grid, velocity_field, spacing, del_t, boundary_condition = None):
+    return advect(grid, velocity_field, spacing, del_t, boundary_condition)
 
-# computing numerical derivatives
-def numerical_derivative(grid, x, y, spacing):
-    n_x, n_y = grid.shape
-    D_x = (grid[min(x + 1, n_x - 1), y] - grid[max(x - 1, 0), y]) / (2 * spacing)
-    D_y = (grid[x, min(y + 1, n_y - 1)] - grid[x, max(y - 1, 0)]) / (2 * spacing)
-    return D_x, D_y
+# the grid as an SDFGrid (with spacing 1); an SDFGrid is used as it is, so its cached normals and curvature are reused
+def as_sdf_grid(grid):
+    if isinstance(grid, SDFGrid):
+        return grid
+    sdf_grid = SDFGrid(grid.shape[0], grid.shape[1], 1.0)
+    sdf_grid.grid = grid
+    return sdf_grid
 
-# calculating the velocity field based on a given vector
+# calculating the velocity field based on a given vector (grid: array or SDFGrid), V = V_vector . n for all cells at once
+# (see SimFab_Ex_1_velocity; Directional(V_vector) can also be passed to evolve() to follow the moving normals)
 def velocity_field(grid, V_vector):
-    n_x, n_y = grid.shape
-    velocity = np.zeros_like(grid)
-    sdf_grid = SDFGrid(n_x, n_y, 1.0)
-    sdf_grid.grid = grid
-    for x in range(n_x):
-        for y in range(n_y):
-            n = sdf_grid.normal(x, y)
-            V = np.dot(V_vector, n)
-            velocity[x, y] = V
-    return velocity
+    return Directional(V_vector).evaluate(as_sdf_grid(grid))
 
-# calculation when the curvature is used as velocity
+# calculation when the curvature is used as velocity (grid: array or SDFGrid), V = -curvature
+# the curvature is only evaluated at the interface cells and extended to the rest of the grid (SimFab_Ex_1_extension):
+# far from the interface it has no meaning and its large values only make the advection unstable
 def curvature_as_velocity(grid):
-    n_x, n_y = grid.shape
-    velocity = np.zeros_like(grid)
-    sdf_grid = SDFGrid(n_x, n_y, 1.0)
-    sdf_grid.grid = grid
-    for x in range(n_x):
-        for y in range(n_y):
-            k = sdf_grid.curvature(x, y)   # k = curvature
-            velocity[x, y] = -k
-    return velocity
+    return Extended(Curvature(-1.0)).evaluate(as_sdf_grid(grid))
+
+# saves a result grid as .sdf (binary, default) or .csv, depending on the file extension
+def save_result(filename, grid, spacing):
+    if filename.endswith('.csv'):
+        np.savetxt(filename, grid, delimiter=',')
+    else:
+        save_grid(filename, grid, spacing)
 
-# for comparing different surface advancement methods
-def compare_advancements(shape, V, time, method, filename, spacing):
-    grid = np.loadtxt(filename, delimiter=',')
+# for comparing different surface advancement methods (filename: the initial grid, .sdf or .csv; extension: format of the results)
+# The snapshots at all times come from one run and are written into one time-series file (.sdfs, see SimFab_Ex_1_gridio);
+# frames: write one grid file and one plot per time instead, headless: only write the plots (with one reused figure) instead of showing them
+def compare_advancements(shape, V, time, method, filename, spacing, extension = '.sdf', headless = False, frames = False):
+    grid = read_any(filename)[0]
     sdf_grid = SDFGrid(grid.shape[0], grid.shape[1], spacing)
     sdf_grid.grid = grid
-    for t in time:
-        if method == "simple advance":
-            new_grid = simple_advance(sdf_grid.grid, V, t)
-        elif method == "engquist_osher":
-            velocity_field = np.full_like(grid, V)
-            new_grid = engquist_osher(sdf_grid.grid, velocity_field, sdf_grid.spacing, t)
-        output_filename = f'{shape.lower()}_{method}_t_{t}_dx_{spacing}.csv'
-        np.savetxt(output_filename, new_grid, delimiter=',')
+    report = {}
+    if method == "simple advance":
+        results = ((t, simple_advance(sdf_grid.grid, V, t)) for t in time)
+    elif method in FLUXES:      # engquist_osher, lax_friedrichs, local_lax_friedrichs or godunov
+        # CFL-limited sub-steps, integrated once up to the last time (one step of the full time is unstable for V t > spacing)
+        velocity_field = np.full_like(grid, V)
+        results = snapshots(sdf_grid.grid, velocity_field, sdf_grid.spacing, time, copy = False, report = report, flux = method)
+    else:
+        raise ValueError(f"method has to be simple advance or one of {', '.join(FLUXES)}")
+    if not frames:
+        output_filename = f'{shape.lower()}_{method}_dx_{spacing}.sdfs'
+        count = write_series(output_filename, results, spacing)
+        if report:
+            print(f'{method}    dx={spacing}:  {report_text(report)}')
+        print(f'Saved {count} grids (t = {", ".join(str(t) for t in time)}) to {output_filename}')
+        return
+    for t, new_grid in results:
+        output_filename = f'{shape.lower()}_{method}_t_{t}_dx_{spacing}{extension}'
+        save_result(output_filename, new_grid, spacing)
         print(f'Saved grid to {output_filename}')
-        plot_grid(new_grid, f'{shape}    {method}    t={t}    dx={spacing}', output_filename.replace('.csv', '.png'))
+        plot_grid(new_grid, f'{shape}    {method}    t={t}    dx={spacing}', output_filename.replace(extension, '.png'), headless)
+    if report:
+        print(f'{method}    dx={spacing}:  {report_text(report)}')
+
+# renderer reused by all headless plots of this process
+renderers = []
 
-# Plotting the grid
-def plot_grid(grid, title, filename):
+# Plotting the grid (headless: Agg rendering into the file only, nothing is shown and nothing blocks)
+def plot_grid(grid, title, filename, headless = False):
+    if headless:
+        if not renderers:
+            renderers.append(FrameRenderer())
+        renderers[0].render(grid, title, filename)
+        return
     plt.figure(figsize=(8, 6))
     plt.contourf(grid.T, levels=50, cmap='RdYlBu')
     plt.colorbar(label='Signed Distance')
@@ -91,6 +102,10 @@ def plot_grid(grid, title, filename):
 # main function for command-line arguments and running the script
 def main():
     args = sys.argv[1:]
+    extension = '.csv' if '--csv' in args else '.sdf'    # grids are saved in the binary format unless --csv is given
+    headless = '--headless' in args     # with --headless the plots are only written to .png files
+    frames = '--frames' in args         # with --frames every time gets its own grid file and plot instead of one .sdfs series
+    args = [a for a in args if a not in ('--csv', '--headless', '--frames')]
     if len(args) < 5:   # both circle and rectangle require 5 arguments
         print("Provide the following values: ./Grid[x-size(n_x) y-size(n_y)] [Circle / Rectangle] [parameters]")
         return
@@ -102,36 +117,37 @@ def main():
         center = (float(args[3]), float(args[4]))
         radius = 10      # Radius is fixed at 10
         grid.distance_circle(center, radius)
-        grid.save_to_csv('circle_grid.csv')
+        grid.save_as('circle_grid' + extension)
     elif shape == "Rectangle":
         min_corner = (float(args[3]), float(args[4]))
         max_corner = (min_corner[0] + 5, min_corner[1] + 20)           # Side lengths are fixed at 5 and 20
         grid.distance_rectangle(min_corner, max_corner)
-        grid.save_to_csv('rectangle_grid.csv')
+        grid.save_as('rectangle_grid' + extension)
     
     V = 10    # for making the calculations for V = 10
     time = [0.1, 1]
     for method in ["simple advance", "engquist_osher"]:
         for spacing in [1, 0.25]:
-            filename = f'{shape.lower()}_grid.csv'
-            compare_advancements(shape, V, time, method, filename, spacing)
+            filename = f'{shape.lower()}_grid{extension}'
+            compare_advancements(shape, V, time, method, filename, spacing, extension, headless, frames)
 
     # using Engquist-Osher scheme, investigating behaviour of rectangle and when curvature is used as velocity
     V_vector = np.array([1, 0])
-    grid = np.loadtxt(f'{shape.lower()}_grid.csv', delimiter=',')
+    grid, header = read_any(f'{shape.lower()}_grid{extension}')
+    sdf_grid = as_sdf_grid(grid)      # normals and curvature are computed once and reused for both spacings
     for spacing in [1, 0.25]:
-        velocity = velocity_field(grid, V_vector)
+        velocity = velocity_field(sdf_grid, V_vector)
         t = 1
-        new_grid = engquist_osher(grid, velocity, spacing, t)
-        np.savetxt(f'{shape.lower()}_vector_velocity_t_{t}_dx_{spacing}.csv', new_grid, delimiter=',')
-        print(f'Saved grid with vector velocity function to {shape.lower()}_vector_velocity_t_{t}_dx_{spacing}.csv')
-        plot_grid(new_grid, f'{shape}    vector velocity    t={t}     dx={spacing}', f'{shape.lower()}_vector_velocity_t_{t}_dx_{spacing}.png')
+        new_grid = evolve(grid, velocity, spacing, [t])[0][0]
+        save_result(f'{shape.lower()}_vector_velocity_t_{t}_dx_{spacing}{extension}', new_grid, spacing)
+        print(f'Saved grid with vector velocity function to {shape.lower()}_vector_velocity_t_{t}_dx_{spacing}{extension}')
+        plot_grid(new_grid, f'{shape}    vector velocity    t={t}     dx={spacing}', f'{shape.lower()}_vector_velocity_t_{t}_dx_{spacing}.png', headless)
 
-        curvature_velocity = curvature_as_velocity(grid)
-        new_grid = engquist_osher(grid, curvature_velocity, spacing, t)
-        np.savetxt(f'{shape.lower()}_curvature_velocity_t_{t}_dx_{spacing}.csv', new_grid, delimiter=',')
-        print(f'Saved grid with curvature velocity to {shape.lower()}_curvature_velocity_t_{t}_dx_{spacing}.csv')
-        plot_grid(new_grid, f'{shape}    curvature velocity    t={t}    dx={spacing}', f'{shape.lower()}_curvature_velocity_t_{t}_dx_{spacing}.png')
+        curvature_velocity = curvature_as_velocity(sdf_grid)
+        new_grid = evolve(grid, curvature_velocity, spacing, [t])[0][0]
+        save_result(f'{shape.lower()}_curvature_velocity_t_{t}_dx_{spacing}{extension}', new_grid, spacing)
+        print(f'Saved grid with curvature velocity to {shape.lower()}_curvature_velocity_t_{t}_dx_{spacing}{extension}')
+        plot_grid(new_grid, f'{shape}    curvature velocity    t={t}    dx={spacing}', f'{shape.lower()}_curvature_velocity_t_{t}_dx_{spacing}.png', headless)
 
 if __name__ == '__main__':
     main()
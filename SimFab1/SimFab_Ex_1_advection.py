@@ -0,0 +1,117 @@
+import numpy as np
+from SimFab_Ex_1_derivatives import one_sided_derivatives, band_cells
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+from SimFab_Ex_1_backend import register, kernel
+from SimFab_Ex_1_hamiltonian import NormalSpeed, VectorVelocity, as_hamiltonian
+from SimFab_Ex_1_velocity import VelocityField
+from SimFab_Ex_1_Task2 import SDFGrid
+
+# Level-set advection phi_t + V |grad phi| = 0 with the Engquist-Osher flux, vectorized over the whole grid:
+# the one-sided differences D- and D+ are taken with array slices (first order, or ENO / WENO from
+# SimFab_Ex_1_derivatives), and the upwind gradient magnitude is chosen per cell by the sign of the velocity:
+#   V > 0:  |grad phi|^2 = max(D_x-, 0)^2 + min(D_x+, 0)^2 + max(D_y-, 0)^2 + min(D_y+, 0)^2
+#   V < 0:  |grad phi|^2 = min(D_x-, 0)^2 + max(D_x+, 0)^2 + min(D_y-, 0)^2 + max(D_y+, 0)^2
+# The velocity can be a number or an array of the grid shape (a spatially varying normal speed).
+#
+# The same steps work with other numerical fluxes and Hamiltonians (SimFab_Ex_1_hamiltonian): a velocity pair (u, v)
+# transports the grid (H = u phi_x + v phi_y), and a Hamiltonian object gives any H(phi_x, phi_y). The flux is selected by name:
+#   'engquist_osher'        the flux above (normal speeds and vector velocities)
+#   'lax_friedrichs'        H(mean p, mean q) - alpha_x (p+ - p-) / 2 - alpha_y (q+ - q-) / 2, alpha = largest |dH/dp|, |dH/dq| of the grid
+#   'local_lax_friedrichs'  the same with alpha bounded over the box (p-, p+) x (q-, q+) of every cell (less diffusion)
+#   'godunov'               the exact Riemann solution, for general non-convex Hamiltonians
+# with p = phi_x, q = phi_y and their one-sided differences p-, p+, q-, q+.
+# A velocity field object (SimFab_Ex_1_velocity) is evaluated from the current grid, and only its active cells
+# (where the speed can be nonzero) are updated.
+
+FLUXES = ('engquist_osher', 'lax_friedrichs', 'local_lax_friedrichs', 'godunov')
+
+# upwind gradient magnitude for the sign of the velocity (the same for V = 0, where it is multiplied by 0)
+def engquist_osher_gradient(D_x_minus, D_x_plus, D_y_minus, D_y_plus, velocity):
+    positive, negative = velocity > 0, velocity <= 0
+    if not np.any(negative):      # only one of the two branches is needed when the velocity has one sign
+        return upwind_magnitude(D_x_minus, D_x_plus, D_y_minus, D_y_plus, 1)
+    if not np.any(positive):
+        return upwind_magnitude(D_x_minus, D_x_plus, D_y_minus, D_y_plus, -1)
+    return np.where(positive, upwind_magnitude(D_x_minus, D_x_plus, D_y_minus, D_y_plus, 1),
+                    upwind_magnitude(D_x_minus, D_x_plus, D_y_minus, D_y_plus, -1))
+
+# |grad phi| from the upwind sides for a positive (sign 1) or negative (sign -1) velocity
+def upwind_magnitude(D_x_minus, D_x_plus, D_y_minus, D_y_plus, sign):
+    behind, ahead = (np.maximum, np.minimum) if sign > 0 else (np.minimum, np.maximum)
+    D = behind(D_x_minus, 0)
+    total = D * D
+    for difference, side in ((D_x_plus, ahead), (D_y_minus, behind), (D_y_plus, ahead)):
+        D = side(difference, 0, out = D)
+        D *= D
+        total += D
+    return np.sqrt(total, out = total)
+
+# loop version for the kernel backends (see SimFab_Ex_1_backend)
+def engquist_osher_gradient_loop(D_x_minus, D_x_plus, D_y_minus, D_y_plus, velocity, out):
+    for k in range(out.shape[0]):
+        a, b, c, d = D_x_minus[k], D_x_plus[k], D_y_minus[k], D_y_plus[k]
+        if velocity[k] > 0:
+            a, b, c, d = max(a, 0.0), min(b, 0.0), max(c, 0.0), min(d, 0.0)
+        else:
+            a, b, c, d = min(a, 0.0), max(b, 0.0), min(c, 0.0), max(d, 0.0)
+        out[k] = np.sqrt(a * a + b * b + c * c + d * d)
+
+register('engquist_osher', engquist_osher_gradient, engquist_osher_gradient_loop, elementwise = True)
+
+# numerical Hamiltonian of every cell
+# H: Hamiltonian (SimFab_Ex_1_hamiltonian), D: one-sided differences (p-, p+, q-, q+), flux: one of FLUXES
+def numerical_hamiltonian(H, D, flux = 'engquist_osher'):
+    p_minus, p_plus, q_minus, q_plus = D
+    if flux == 'engquist_osher':
+        if isinstance(H, NormalSpeed):
+            return H.speed * kernel('engquist_osher')(*D, H.speed)
+        if isinstance(H, VectorVelocity):
+            return H.godunov(*D)          # for a linear Hamiltonian both are upwinding
+        raise ValueError("the Engquist-Osher flux is only available for normal speeds and vector velocities")
+    if flux == 'godunov':
+        return H.godunov(*D)
+    if flux in ('lax_friedrichs', 'local_lax_friedrichs'):
+        alpha_x, alpha_y = H.alpha(*D)
+        if flux == 'lax_friedrichs':
+            alpha_x, alpha_y = np.max(alpha_x), np.max(alpha_y)
+        return H.value((p_minus + p_plus) / 2, (q_minus + q_plus) / 2) - alpha_x * (p_plus - p_minus) / 2 - alpha_y * (q_plus - q_minus) / 2
+    raise ValueError(f"flux has to be one of {', '.join(FLUXES)}")
+
+# the change of phi in one time step, -del_t * H (for a NarrowBandGrid: at its band cells)
+def advection_rate(grid, velocity, spacing, boundary_condition = None, scheme = 'upwind', flux = 'engquist_osher'):
+    cells = band_cells(grid) if isinstance(grid, NarrowBandGrid) else None
+    if isinstance(velocity, VelocityField):
+        return field_rate(grid, velocity, spacing, boundary_condition, scheme, flux, cells)
+    D = one_sided_derivatives(grid, spacing, scheme, boundary_condition, cells)
+    H = as_hamiltonian(velocity)
+    if cells is not None:
+        H = H.select(cells)
+    return -numerical_hamiltonian(H, D, flux)
+
+# advection_rate() for a velocity field: derivatives, speeds and fluxes are only computed at the active cells
+# (of the band cells for a NarrowBandGrid), all other cells do not change
+# grid: also an SDFGrid over the dense values, whose normals and curvature the field then reuses
+def field_rate(grid, field, spacing, boundary_condition, scheme, flux, cells):
+    values = grid.grid if isinstance(grid, SDFGrid) else grid
+    active = field.active_cells(grid, cells)
+    if active is None:          # every cell can move
+        return -numerical_hamiltonian(NormalSpeed(field.evaluate(grid, cells)),
+                                      one_sided_derivatives(values, spacing, scheme, boundary_condition, cells), flux)
+    rate = np.zeros(np.shape(values) if cells is None else np.shape(cells[0]))
+    if len(active[0]):
+        D = one_sided_derivatives(values, spacing, scheme, boundary_condition, active)
+        change = -numerical_hamiltonian(NormalSpeed(field.evaluate(grid, active)), D, flux)
+        if cells is None:
+            rate[active] = change
+        else:           # positions of the active cells in the band
+            rate[np.searchsorted(grid.keys, active[0] * grid.n_y + active[1])] = change
+    return rate
+
+# One time step (Engquist-Osher unless another flux is given):
+# grid: 2D array or NarrowBandGrid, velocity: number or array of the grid shape (normal speed), pair (u, v), Hamiltonian
+# or velocity field
+# spacing: grid spacing, del_t: time step, boundary_condition: None (index clamped at the edges), 'reflective' or 'periodic'
+# scheme: spatial differences, 'upwind' (first order), 'eno2', 'eno3' or 'weno5', flux: one of FLUXES
+# It returns: the new grid (same storage type)
+def advect(grid, velocity, spacing, del_t, boundary_condition = None, scheme = 'upwind', flux = 'engquist_osher'):
+    return grid + del_t * advection_rate(grid, velocity, spacing, boundary_condition, scheme, flux)    # NarrowBandGrid: + acts on the band values
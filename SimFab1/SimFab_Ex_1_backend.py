@@ -0,0 +1,55 @@
+import numpy as np
+import os
+
+try:
+    import numba
+except ImportError:     # optional: without numba the NumPy versions are used
+    numba = None
+
+# Pluggable kernel backends for the stencils that are loop-shaped by nature (upwind / stencil selection, sweeps
+# over cell lists):
+# every kernel is registered with a NumPy version (whole arrays) and a loop version (plain loops over cells,
+# written in the subset of Python that numba compiles). The backend decides which one kernel(name) returns:
+#   'numba'   the loop version compiled just in time (default when numba is installed)
+#   'numpy'   the NumPy version (default otherwise)
+#   'python'  the loop version, interpreted (slow, for checking the loop code without numba)
+# The default can be set with the environment variable SIMFAB_BACKEND or with set_backend().
+# Both versions do the same floating point operations in the same order, so their results are identical.
+
+BACKENDS = ('numba', 'numpy', 'python')
+kernels = {}        # name -> (numpy version, loop version, elementwise)
+compiled = {}       # name -> numba-compiled loop version
+backend = {'name': os.environ.get('SIMFAB_BACKEND', 'numba' if numba is not None else 'numpy')}
+
+def available_backends():
+    return [b for b in BACKENDS if b != 'numba' or numba is not None]
+
+def set_backend(name):
+    if name not in available_backends():
+        raise ValueError(f"backend has to be one of {', '.join(available_backends())}")
+    backend['name'] = name
+
+# registers a kernel; elementwise: the loop version works on 1D arrays (v_1, ..., v_k, out) and is applied to
+# arrays of any shape through flattened copies, otherwise both versions are called with the same arguments
+def register(name, numpy_version, loop_version, elementwise = False):
+    kernels[name] = (numpy_version, loop_version, elementwise)
+
+# the version of a kernel for the backend (default: the current one)
+def kernel(name, backend_name = None):
+    backend_name = backend_name or backend['name']
+    numpy_version, loop_version, elementwise = kernels[name]
+    if backend_name == 'numpy' or (backend_name == 'numba' and numba is None):
+        return numpy_version
+    if backend_name == 'numba':
+        if name not in compiled:
+            compiled[name] = numba.njit(cache = True)(loop_version)
+        loop_version = compiled[name]
+    if not elementwise:
+        return loop_version
+
+    def apply(*arrays):
+        arrays = np.broadcast_arrays(*[np.asarray(a, dtype = float) for a in arrays])
+        out = np.empty(arrays[0].shape)
+        loop_version(*[np.ascontiguousarray(a).reshape(-1) for a in arrays], out.reshape(-1))
+        return out
+    return apply
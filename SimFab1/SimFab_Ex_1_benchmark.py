@@ -0,0 +1,478 @@
+import numpy as np
+import sys
+import time
+import os
+import tempfile
+from SimFab_Ex_1_Task1 import SDFGrid
+from SimFab_Ex_1_reinit import fast_marching, fast_sweeping
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+from SimFab_Ex_1_gridio import load_grid, write_series
+from SimFab_Ex_1_csg import Circle, Rectangle, Union, Difference
+from SimFab_Ex_1_3D import SDFGrid3D
+from SimFab_Ex_1_contour import extract_contour
+from SimFab_Ex_1_render import render_frames
+from SimFab_Ex_1_derivatives import one_sided_derivatives, SCHEMES
+from SimFab_Ex_1_backend import available_backends, set_backend, backend
+from SimFab_Ex_1_advection import advect, FLUXES
+from SimFab_Ex_1_integrate import evolve, snapshots
+from SimFab_Ex_1_velocity import Constant, Curvature, Extended
+from SimFab_Ex_1_quadtree import QuadTree, evolve as evolve_tree
+
+# Benchmarks for the SimFab1 level-set engine.
+# Run: python SimFab_Ex_1_benchmark.py [sizes ...]   (default sizes: 256 1024 4096)
+
+# timing helper: returns the best wall time (in seconds) over a few repeats
+def best_time(function, repeats = 3):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# reference per-point SDF construction (the original double loop over BC()), used to check the array builders
+def reference_circle(grid, centre, radius):
+    x0, y0 = centre
+    reference = np.zeros((grid.n_x, grid.n_y))
+    for i in range(grid.n_x):
+        for j in range(grid.n_y):
+            x, y = grid.BC(i, j)
+            reference[i, j] = np.sqrt((x - x0)**2 + (y - y0)**2) - radius
+    return reference
+
+def reference_rectangle(grid, min_corner, max_corner):
+    x_min, y_min = min_corner
+    x_max, y_max = max_corner
+    reference = np.zeros((grid.n_x, grid.n_y))
+    for i in range(grid.n_x):
+        for j in range(grid.n_y):
+            x, y = grid.BC(i, j)
+            d_x = max(x_min - x, 0, x - x_max)
+            d_y = max(y_min - y, 0, y - y_max)
+            distance = np.sqrt(d_x**2 + d_y**2)
+            if x_min <= x <= x_max and y_min <= y <= y_max:
+                distance = -min(x - x_min, x_max - x, y - y_min, y_max - y)
+            reference[i, j] = distance
+    return reference
+
+# SDF construction: vectorized builders for circle and rectangle, checked bit-for-bit against the loop on a small grid
+def benchmark_sdf_construction(sizes):
+    print("SDF construction (circle / rectangle)")
+    for boundary_condition in ['reflective', 'periodic']:
+        check = SDFGrid(64, 48, 0.5, boundary_condition)
+        check.distance_circle((14.0, 9.5), 7.25)
+        assert np.array_equal(check.grid, reference_circle(check, (14.0, 9.5), 7.25))
+        check.distance_rectangle((4.0, 3.0), (20.5, 17.0))
+        assert np.array_equal(check.grid, reference_rectangle(check, (4.0, 3.0), (20.5, 17.0)))
+    print("    vectorized grids match the per-point loop bit-for-bit")
+
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        centre = (n / 2, n / 2)
+        t_circle = best_time(lambda: grid.distance_circle(centre, n / 4))
+        t_rectangle = best_time(lambda: grid.distance_rectangle((n / 4, n / 8), (3 * n / 4, 7 * n / 8)))
+        print(f"    {n:>5}^2:  circle {t_circle * 1e3:9.2f} ms    rectangle {t_rectangle * 1e3:9.2f} ms")
+
+# reinitialization: a circle SDF distorted by a smooth positive factor is redistanced and compared with the exact SDF
+def benchmark_reinitialization(sizes, band = 5.0):
+    print("Reinitialization (fast marching / fast sweeping)")
+    for n in sizes:
+        spacing = 100.0 / n
+        grid = SDFGrid(n, n, spacing, 'reflective')
+        grid.distance_circle((50.0, 48.0), 20.0)
+        exact = grid.grid.copy()
+        x, y = grid.coordinates()
+        distorted = exact * (1 + 0.02 * x) * np.exp(0.01 * y)
+        near = np.abs(exact) < band - spacing
+        for name, method in [('fast marching', fast_marching), ('fast sweeping', fast_sweeping)]:
+            for width in [None, band]:
+                start = time.perf_counter()
+                result = method(distorted, spacing, width)
+                elapsed = time.perf_counter() - start
+                error = np.max(np.abs(result - exact)[near])
+                label = 'full grid' if width is None else f'band {width:g}'
+                print(f"    {n:>5}^2:  {name:<14} {label:<10} {elapsed * 1e3:9.2f} ms    max error near interface {error:.2e}")
+
+# narrow-band storage: memory of the band against the dense grid, and the cost of a band rebuild after a small move
+def benchmark_narrow_band(sizes, width = 5):
+    print("Narrow-band storage")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_circle((n / 2, n / 2), n / 4)
+        start = time.perf_counter()
+        band = NarrowBandGrid.from_dense(grid.grid, grid.spacing, width)
+        t_build = time.perf_counter() - start
+        moved = band - 0.5
+        start = time.perf_counter()
+        moved.rebuild()
+        t_rebuild = time.perf_counter() - start
+        print(f"    {n:>5}^2:  {band.band_size:>8} band cells    {band.nbytes / 1e6:8.3f} MB (dense {grid.grid.nbytes / 1e6:8.1f} MB)"
+              f"    build {t_build * 1e3:8.2f} ms    rebuild {t_rebuild * 1e3:9.2f} ms")
+
+# grid files: CSV text against the binary .sdf format (write, open, and read every value)
+def benchmark_grid_io(sizes):
+    print("Grid files (CSV / binary)")
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            grid = SDFGrid(n, n, 1.0, 'reflective')
+            grid.distance_circle((n / 2, n / 2), n / 4)
+            csv_file = os.path.join(directory, 'grid.csv')
+            sdf_file = os.path.join(directory, 'grid.sdf')
+            t_csv_write = best_time(lambda: grid.save_to_csv(csv_file), 1)
+            t_csv_read = best_time(lambda: np.loadtxt(csv_file, delimiter=','), 1)
+            t_sdf_write = best_time(lambda: grid.save(sdf_file), 1)
+            t_sdf_open = best_time(lambda: load_grid(sdf_file))
+            t_sdf_read = best_time(lambda: np.array(load_grid(sdf_file)[0]))
+            assert np.array_equal(load_grid(sdf_file)[0], np.loadtxt(csv_file, delimiter=','))
+            print(f"    {n:>5}^2:  csv write {t_csv_write * 1e3:9.2f} ms  read {t_csv_read * 1e3:9.2f} ms    "
+                  f"sdf write {t_sdf_write * 1e3:7.2f} ms  open {t_sdf_open * 1e3:5.2f} ms  read {t_sdf_read * 1e3:7.2f} ms")
+
+# CSG: a mask layout of many holes and lines, tiled with BVH culling against the plain minimum over all primitives;
+# the culling is checked on the full grid against overlapping and nested primitives
+def benchmark_csg(sizes, counts = (100, 1000, 4000)):
+    print("CSG composition (holes and lines cut out of a wafer)")
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        x, y = grid.coordinates()
+        blobs = [Circle(tuple(rng.uniform(0, n, 2)), rng.uniform(1, n / 4)) for _ in range(150)]
+        bars = [Rectangle((a, b), (a + rng.uniform(2, n / 2), b + rng.uniform(1, n / 4))) for a, b in rng.uniform(0, n, (150, 2))]
+        nested = [Circle((n / 2, n / 2), r) for r in np.linspace(1, n / 2, 20)]
+        for shape in (Union(blobs + bars + nested), Difference(Rectangle((0.0, 0.0), (n - 1.0, n - 1.0)), blobs + bars)):
+            grid.distance_shape(shape)
+            assert np.array_equal(grid.grid, shape.evaluate(x, y))
+        for count in counts:
+            holes = [Circle(tuple(rng.uniform(0, n, 2)), rng.uniform(1, 4)) for _ in range(count // 2)]
+            lines = [Rectangle((a, b), (a + rng.uniform(2, 20), b + rng.uniform(1, 3))) for a, b in rng.uniform(0, n, (count // 2, 2))]
+            mask = Difference(Rectangle((2.0, 2.0), (n - 3.0, n - 3.0)), holes + lines)
+            t_tiled = best_time(lambda: grid.distance_shape(mask), 1)
+            rows = max(1, min(n, 2**16 // count))      # the plain evaluation is timed on a few rows and scaled up
+            start = time.perf_counter()
+            plain = mask.evaluate(x[:rows], y)
+            t_plain = (time.perf_counter() - start) * n / rows
+            assert np.array_equal(grid.grid[:rows], plain)
+            print(f"    {n:>5}^2:  {count:>5} primitives    tiled {t_tiled * 1e3:9.2f} ms    plain {t_plain * 1e3:10.2f} ms (estimated)")
+
+# 3D grids: primitive builders and the whole-field operators; the sphere curvature is checked against 2 / radius
+def benchmark_3d(sizes):
+    print("3D grids (sphere / box / cylinder, gradient / normal / curvature)")
+    for n in sizes:
+        grid = SDFGrid3D(n, n, n, 1.0, 'reflective')
+        radius = n / 4
+        t_box = best_time(lambda: grid.distance_box((n / 4, n / 4, n / 8), (3 * n / 4, 5 * n / 8, 7 * n / 8)), 1)
+        t_cylinder = best_time(lambda: grid.distance_cylinder((n / 2, n / 2, n / 8), n / 5, 3 * n / 4), 1)
+        t_sphere = best_time(lambda: grid.distance_sphere((n / 2, n / 2, n / 2), radius), 1)
+        t_gradient = best_time(lambda: grid.gradient(), 1)
+        t_normal = best_time(lambda: grid.normal(), 1)
+        start = time.perf_counter()
+        curvature = grid.curvature()
+        t_curvature = time.perf_counter() - start
+        error = abs(curvature[n // 2 + int(radius), n // 2, n // 2] - 2 / radius)
+        print(f"    {n:>5}^3:  sphere {t_sphere * 1e3:8.1f} ms  box {t_box * 1e3:8.1f} ms  cylinder {t_cylinder * 1e3:8.1f} ms    "
+              f"gradient {t_gradient * 1e3:8.1f} ms  normal {t_normal * 1e3:8.1f} ms  curvature {t_curvature * 1e3:8.1f} ms (error {error:.1e})")
+
+# zero-contour extraction: marching squares with area / perimeter / centroid, checked against the exact circle
+def benchmark_contour(sizes):
+    print("Zero-contour extraction (marching squares and interface metrics)")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        radius = n / 3
+        grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), radius)
+        start = time.perf_counter()
+        vertices, segments, metrics = extract_contour(grid.grid, grid.spacing)
+        elapsed = time.perf_counter() - start
+        area_error = abs(metrics['area'] / (np.pi * radius**2) - 1)
+        perimeter_error = abs(metrics['perimeter'] / (2 * np.pi * radius) - 1)
+        print(f"    {n:>5}^2:  {len(segments):>7} segments  {elapsed * 1e3:9.2f} ms    "
+              f"relative error: area {area_error:.1e}  perimeter {perimeter_error:.1e}")
+
+def benchmark_rendering(sizes, frames = 20):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    print(f"Frame rendering ({frames} frames per size)")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grids = []
+        for k in range(frames):
+            grid.distance_circle((n / 2, n / 2), n / 3 - k * n / (4 * frames))
+            grids.append(grid.grid.copy())
+
+        def new_figures():     # the previous plots: a new 50-level contourf figure per frame
+            with tempfile.TemporaryDirectory() as folder:
+                for k, g in enumerate(grids):
+                    plt.figure(figsize = (8, 6))
+                    plt.contourf(g.T, levels = 50, cmap = 'RdYlBu')
+                    plt.colorbar(label = 'Signed Distance')
+                    plt.contour(g.T, levels = [0], colors = 'black')
+                    plt.savefig(os.path.join(folder, f'{k}.png'))
+                    plt.close()
+
+        def reused_figure(workers):
+            with tempfile.TemporaryDirectory() as folder:
+                render_frames(grids, [str(k) for k in range(frames)], [os.path.join(folder, f'{k}.png') for k in range(frames)], workers = workers)
+
+        t_new = best_time(new_figures, 1)
+        t_reused = best_time(lambda: reused_figure(1), 1)
+        t_pool = best_time(lambda: reused_figure(None), 1)
+        print(f"    {n:>5}^2:  new figures {frames / t_new * 60:8.0f} frames/min    reused figure {frames / t_reused * 60:8.0f} frames/min    "
+              f"pool ({os.cpu_count()} cores) {frames / t_pool * 60:8.0f} frames/min")
+
+# accuracy per second of the one-sided derivative schemes on a smooth periodic field:
+# maximum error of D- and D+ against the exact derivative, observed order of convergence and run time
+def benchmark_derivatives(sizes = (64, 128, 256, 512, 1024)):
+    print("One-sided derivatives (sin(x) cos(2y), periodic): max. error / observed order / time")
+    for scheme in SCHEMES:
+        line, previous = [], None
+        for n in sizes:
+            h = 2 * np.pi / n
+            x = np.arange(n) * h
+            phi = np.sin(x)[:, None] * np.cos(2 * x)[None, :]
+            exact_x = np.cos(x)[:, None] * np.cos(2 * x)[None, :]
+            exact_y = -2 * np.sin(x)[:, None] * np.sin(2 * x)[None, :]
+            elapsed = best_time(lambda: one_sided_derivatives(phi, h, scheme, 'periodic'))
+            D = one_sided_derivatives(phi, h, scheme, 'periodic')
+            error = max(np.abs(D[0] - exact_x).max(), np.abs(D[1] - exact_x).max(), np.abs(D[2] - exact_y).max(), np.abs(D[3] - exact_y).max())
+            order = f"{np.log2(previous / error):4.1f}" if previous else "   -"
+            line.append(f"{n:>5}^2 {error:.1e} {order} {elapsed * 1e3:7.1f} ms")
+            previous = error
+        print(f"    {scheme:>6}:  " + "   ".join(line))
+
+# the same runs with every kernel backend: time and whether the results are identical to the NumPy backend
+# (the interpreted 'python' backend only runs on the smallest size)
+def benchmark_backends(sizes):
+    print(f"Kernel backends ({', '.join(available_backends())}): time, identical to numpy")
+    default = backend['name']
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), n / 3)
+        grid.grid[:, :] = grid.grid * (1 + 0.5 * np.sin(np.arange(n) / 7)[:, None])     # no longer a distance function
+        runs = {'weno5': lambda: one_sided_derivatives(grid.grid, 1.0, 'weno5'),
+                'eno3': lambda: one_sided_derivatives(grid.grid, 1.0, 'eno3'),
+                'sweep': lambda: fast_sweeping(grid.grid, 1.0, band = 5.0),
+                'engquist_osher': lambda: advect(grid.grid, np.sin(np.arange(n) / 5)[:, None] * np.ones(n), 1.0, 0.5)}
+        for name, run in runs.items():
+            line = []
+            for b in available_backends():
+                if b == 'python' and n != min(sizes):
+                    continue
+                set_backend(b)
+                run()       # the first call compiles the numba kernels
+                elapsed = best_time(run, 1 if b == 'python' else 3)
+                result = np.array(run())
+                set_backend('numpy')
+                same = np.array_equal(result, np.array(run()))
+                line.append(f"{b} {elapsed * 1e3:9.1f} ms {'identical' if same else 'DIFFERENT'}")
+            print(f"    {n:>5}^2  {name:>14}:  " + "    ".join(line))
+    set_backend(default)
+
+# the previous per-cell Engquist-Osher loop of Task 3 (central differences in the upwind formula), as a reference
+def reference_engquist_osher(grid, velocity_field, spacing, del_t):
+    n_x, n_y = grid.shape
+    new_grid = grid.copy()
+    for x in range(n_x):
+        for y in range(n_y):
+            D_x = (grid[min(x + 1, n_x - 1), y] - grid[max(x - 1, 0), y]) / (2 * spacing)
+            D_y = (grid[x, min(y + 1, n_y - 1)] - grid[x, max(y - 1, 0)]) / (2 * spacing)
+            V = velocity_field[x, y]
+            if V < 0:
+                gradSDF_magnitude = np.sqrt(max(-D_x, 0)**2 + min(-D_x, 0)**2 + max(-D_y, 0)**2 + min(-D_y, 0)**2)
+            else:
+                gradSDF_magnitude = np.sqrt(max(D_x, 0)**2 + min(D_x, 0)**2 + max(D_y, 0)**2 + min(D_y, 0)**2)
+            new_grid[x, y] -= V * gradSDF_magnitude * del_t
+    return new_grid
+
+# Engquist-Osher steps of a rectangle shrinking with V = -1 (exact result after time t: phi + t):
+# time of one step for the previous loop and the vectorized kernel, and the error near the interface after 10 steps
+# (with central differences the corners and the ridges inside the rectangle do not move correctly)
+def benchmark_advection(sizes, del_t = 0.5, steps = 10):
+    print(f"Engquist-Osher steps (rectangle, V = -1, {steps} steps of {del_t})")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_rectangle((n / 4 + 0.3, n / 3 + 0.2), (3 * n / 4 + 0.1, 2 * n / 3 - 0.3))
+        velocity = -np.ones((n, n))
+        exact = grid.grid + steps * del_t
+        near = np.abs(exact) < 3
+        t_loop = best_time(lambda: reference_engquist_osher(grid.grid, velocity, 1.0, del_t), 1)
+        t_new = best_time(lambda: advect(grid.grid, velocity, 1.0, del_t))
+        errors = []
+        for step in (lambda p: reference_engquist_osher(p, velocity, 1.0, del_t), lambda p: advect(p, velocity, 1.0, del_t),
+                     lambda p: advect(p, velocity, 1.0, del_t, scheme = 'weno5')):
+            phi = grid.grid
+            for _ in range(steps if n <= 256 or len(errors) else 1):     # the loop is only run for several steps on small grids
+                phi = step(phi)
+            errors.append(np.abs(phi - exact)[near].max() if n <= 256 or len(errors) else np.nan)
+        print(f"    {n:>5}^2:  loop {t_loop * 1e3:10.1f} ms    vectorized {t_new * 1e3:8.2f} ms    speedup {t_loop / t_new:5.0f}x    "
+              f"max error near interface: loop {errors[0]:.2f}  upwind {errors[1]:.2f}  weno5 {errors[2]:.2f}")
+
+# integrator / spatial scheme / CFL number combinations on a circle growing with the speed V = 1 + 0.8 sin(6 pi x / n)
+# up to t = n / 8: difference near the interface to a reference run (TVD-RK3, WENO5, CFL 0.1), steps and run time
+# (for the WENO5 runs this is the error of the time integration alone)
+def benchmark_time_integration(sizes, runs = (('euler', 'upwind', 0.5), ('euler', 'weno5', 0.5), ('euler', 'weno5', 0.9),
+                                              ('rk2', 'weno5', 0.9), ('rk3', 'weno5', 0.5), ('rk3', 'weno5', 0.9))):
+    print("Time integration (circle, varying V): max. difference to reference near interface / steps / time")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), n / 4)
+        velocity = 1 + 0.8 * np.sin(6 * np.pi * np.arange(n) / n)[:, None] * np.ones(n)
+        t = n / 8
+        reference = evolve(grid.grid, velocity, 1.0, [t], 0.1, scheme = 'weno5', integrator = 'rk3')[0][0]
+        near = np.abs(reference) < 3
+        for integrator, scheme, cfl in runs:
+            grids, report = evolve(grid.grid, velocity, 1.0, [t], cfl, scheme = scheme, integrator = integrator)
+            error = np.abs(grids[0] - reference)[near].max()
+            print(f"    {n:>5}^2:  {integrator:>5} {scheme:>6}  CFL {cfl}:  {error:.1e}  {report['steps']:>5} steps  {report['wall_time'] * 1e3:9.1f} ms")
+
+# advection of the same circle (radius 32, growing with V = 1 up to t = 8) on larger and larger grids:
+# the dense grid costs in proportion to its area, the narrow band in proportion to the length of the interface
+def benchmark_narrow_band_advection(sizes, width = 6):
+    print(f"Narrow-band advection (circle of radius 32, band of {width} cells): time per step, dense against band")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), 32)
+        dense, dense_report = evolve(grid.grid, 1.0, 1.0, [8.0])
+        band, band_report = evolve(grid.grid, 1.0, 1.0, [8.0], band = width)
+        sizes_over_time = [size for t, size in band_report['band_sizes']]
+        radius = [np.sqrt(extract_contour(g[0], 1.0)[2]['area'] / np.pi) - 40 for g in (dense, band)]
+        print(f"    {n:>5}^2:  dense {dense_report['time_per_step'] * 1e3:9.2f} ms    band {band_report['time_per_step'] * 1e3:7.2f} ms    "
+              f"band cells {min(sizes_over_time)} - {max(sizes_over_time)}, {band_report['rebuilds']} rebuilds    "
+              f"radius error: dense {radius[0]:+.3f}  band {radius[1]:+.3f}")
+
+# the numerical fluxes on the circle (growing with V = 1) and the rectangle (shrinking with V = -1, its corners stay
+# sharp), and both rotated by the vector velocity omega (-(y - c_y), x - c_x) around c = (n / 2, n / 4), up to
+# t = n / 16 against the exact SDF: time per step, and the numerical diffusion as the largest error near the
+# interface and the error of the enclosed area
+def benchmark_fluxes(sizes):
+    print("Numerical fluxes (t = n / 16): time per step / max. error near interface / area error (cells)")
+    for n in sizes:
+        t = n / 16
+        circle, rectangle = SDFGrid(n, n, 1.0, 'reflective'), SDFGrid(n, n, 1.0, 'reflective')
+        centre, radius = (n / 2 + 0.3, n / 2 - 0.2), n / 5
+        low, high = (n / 4 + 0.3, n / 3 + 0.2), (3 * n / 4 + 0.1, 2 * n / 3 - 0.3)
+        circle.distance_circle(centre, radius)
+        rectangle.distance_rectangle(low, high)
+        shrunk = SDFGrid(n, n, 1.0, 'reflective')
+        shrunk.distance_rectangle((low[0] + t, low[1] + t), (high[0] - t, high[1] - t))
+
+        # rotation: the exact solution is the initial SDF at the points rotated back by the angle omega t
+        omega, x, y = 4 / n, *circle.coordinates()
+        rotation = (-omega * (y - n / 4) * np.ones((n, n)), omega * (x - n / 2) * np.ones((n, n)))
+        angle = omega * t
+        x_0 = n / 2 + np.cos(angle) * (x - n / 2) + np.sin(angle) * (y - n / 4)
+        y_0 = n / 4 - np.sin(angle) * (x - n / 2) + np.cos(angle) * (y - n / 4)
+        cases = [('circle', 'V = 1', circle, 1.0, circle.grid - t),
+                 ('rectangle', 'V = -1', rectangle, -1.0, shrunk.grid),
+                 ('circle', 'rotation', circle, rotation, Circle(centre, radius).evaluate(x_0, y_0)),
+                 ('rectangle', 'rotation', rectangle, rotation, Rectangle(low, high).evaluate(x_0, y_0))]
+        for shape, name, grid, velocity, reference in cases:
+            near = np.abs(reference) < 2
+            area = extract_contour(reference, 1.0)[2]['area']
+            for flux in FLUXES:
+                grids, report = evolve(grid.grid, velocity, 1.0, [t], flux = flux)
+                error = np.abs(grids[0] - reference)[near].max()
+                area_error = extract_contour(grids[0], 1.0)[2]['area'] - area
+                print(f"    {n:>5}^2  {shape:>9} {name:>12}  {flux:>20}:  {report['time_per_step'] * 1e3:8.2f} ms    "
+                      f"error {error:6.3f}    area {area_error:+8.1f}")
+
+# velocity fields that are only active on part of the grid: a speed of 1 inside a window of 64 x 64 cells (all other
+# cells skipped) against the same speed as an array that is 0 outside the window, and the curvature speed
+# (Curvature field, evaluated at the band cells only) in a narrow band against the dense grid; circle of radius n / 4
+def benchmark_velocity_fields(sizes, width = 6):
+    print("Velocity fields (circle, radius n / 4): time per step, speed array against field with active cells")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), n / 4)
+        window = np.zeros((n, n), dtype = bool)
+        window[3 * n // 4 - 32:3 * n // 4 + 32, n // 2 - 32:n // 2 + 32] = True
+        array_report = evolve(grid.grid, window * 1.0, 1.0, [4.0])[1]
+        field_report = evolve(grid.grid, Constant(1.0).masked(window), 1.0, [4.0])[1]
+        dense_report = evolve(grid.grid, Curvature(), 1.0, [4.0])[1]
+        band_report = evolve(grid.grid, Curvature(), 1.0, [4.0], band = width)[1]
+        print(f"    {n:>5}^2:  window: array {array_report['time_per_step'] * 1e3:8.2f} ms    field {field_report['time_per_step'] * 1e3:6.2f} ms    "
+              f"curvature: dense {dense_report['time_per_step'] * 1e3:8.2f} ms ({dense_report['steps']} steps)    "
+              f"band {band_report['time_per_step'] * 1e3:6.2f} ms ({band_report['steps']} steps)")
+
+# motion by curvature of the circle up to t = 8 with the curvature of every cell against the curvature of the interface
+# cells extended off the interface (to the whole grid and to a band of `width` cells): run time, number of steps (the
+# curvature far from the interface sets the CFL step of the dense run), curvature evaluations per step and how far phi
+# drifts from a distance function (largest ||grad phi| - 1| within 4 cells of the interface)
+def benchmark_velocity_extension(sizes, width = 6):
+    print("Velocity extension (circle, V = -curvature, up to t = 8): curvature of every cell / extended from the interface")
+    for n in sizes:
+        grid = SDFGrid(n, n, 1.0, 'reflective')
+        grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), n / 4)
+        for name, field in (('dense', Curvature()), ('extended', Extended(Curvature())), ('band', Extended(Curvature(), width))):
+            result, report = evolve(grid.grid, field, 1.0, [8.0])
+            gradient = np.hypot(*np.gradient(result[0]))
+            drift = np.max(np.abs(gradient - 1)[np.abs(result[0]) < 4])
+            evaluated = n * n if name == 'dense' else field.evaluations // report['steps']
+            print(f"    {n:>5}^2 {name:>9}:  {report['time_per_step'] * report['steps']:7.3f} s ({report['steps']:>3} steps)    "
+                  f"{evaluated:>8} curvature evaluations per step    drift {drift:.4f}")
+
+# quadtree AMR against the uniform grid of its finest spacing: a rectangle and a circle in a domain of n x n units with
+# 16 x 16 root cells, refined down to the spacing `finest`; number of cells, construction time, and V = 1 up to t
+# (time and largest error at the interface against the exact offset distance). The uniform grid only runs up to 1024^2
+def benchmark_quadtree(sizes, finest = 0.25, t = 4.0):
+    print(f"Quadtree AMR (finest spacing {finest}, V = 1 up to t = {t:g}): tree / uniform grid of the finest spacing")
+    for n in sizes:
+        root = n / 16
+        max_level = int(round(np.log2(root / finest)))
+        points = int(round(n / finest))
+        for name, shape in (('rectangle', Rectangle((n / 4 + 0.3, n / 4 - 0.2), (3 * n / 4, n / 2))),
+                            ('circle', Circle((n / 2 + 0.3, n / 2 - 0.2), n / 4))):
+            t_build = best_time(lambda: QuadTree.from_function(shape, 16, 16, root, max_level), 1)
+            tree = QuadTree.from_function(shape, 16, 16, root, max_level)
+            leaves = tree.cell_count
+            report = evolve_tree(tree, 1.0, t)
+            x, y = tree.centres()
+            error = np.max(np.abs(tree.values - (shape.evaluate(x, y) - t))[np.abs(tree.values) < tree.size])
+            line = (f"    {n:>5} units {name:>9}:  tree {leaves:>8} leaves ({leaves / points**2:6.2%})  build {t_build:6.3f} s  "
+                    f"advection {report['wall_time']:7.3f} s ({report['adapts']} adaptions)  error {error:.4f}")
+            if points <= 1024:
+                x = np.arange(points) * finest
+                phi = shape.evaluate(x[:, None], x[None, :])
+                result, uniform_report = evolve(phi, 1.0, finest, [t])
+                uniform_error = np.max(np.abs(result[0] - (phi - t))[np.abs(result[0]) < finest])
+                line += f"    uniform {points**2:>8} cells  advection {uniform_report['wall_time']:7.3f} s  error {uniform_error:.4f}"
+            print(line)
+
+# snapshots of the growing circle (V = 1) up to t = 16: restarting from t = 0 for every snapshot against one streaming
+# run written into a time-series file (the streaming cost stays that of one run, however many snapshots are taken)
+def benchmark_time_series(sizes, counts = (2, 8, 32)):
+    print("Time series (circle, V = 1, up to t = 16): restart per snapshot / one streaming run into a .sdfs file")
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'series.sdfs')
+        for n in sizes:
+            grid = SDFGrid(n, n, 1.0, 'reflective')
+            grid.distance_circle((n / 2 + 0.3, n / 2 - 0.2), n / 4)
+            for count in counts:
+                times = list(np.linspace(16 / count, 16, count))
+                t_restart = best_time(lambda: [evolve(grid.grid, 1.0, 1.0, [t]) for t in times], 1)
+                t_stream = best_time(lambda: write_series(filename, snapshots(grid.grid, 1.0, 1.0, times, copy = False), 1.0), 1)
+                print(f"    {n:>5}^2, {count:>3} snapshots:  restart {t_restart:8.3f} s    streaming {t_stream:7.3f} s    "
+                      f"file {os.path.getsize(filename) / 2**20:7.1f} MB")
+
+def main():
+    args = sys.argv[1:]
+    sizes = [int(a) for a in args] if args else [256, 1024, 4096]
+    benchmark_sdf_construction(sizes)
+    benchmark_reinitialization([n for n in sizes if n <= 1024])
+    benchmark_narrow_band(sizes)
+    benchmark_grid_io([n for n in sizes if n <= 1024])
+    benchmark_csg([n for n in sizes if n <= 1024])
+    benchmark_3d([n // 4 for n in sizes if n <= 1024])
+    benchmark_contour(sizes)
+    benchmark_rendering([n for n in sizes if n <= 1024])
+    benchmark_advection([n for n in sizes if n <= 1024])
+    benchmark_narrow_band_advection(sizes)
+    benchmark_time_integration([n for n in sizes if n <= 256])
+    benchmark_fluxes([n for n in sizes if n <= 1024])
+    benchmark_velocity_fields([n for n in sizes if n <= 1024])
+    benchmark_velocity_extension([n for n in sizes if n <= 1024])
+    benchmark_quadtree(sizes)
+    benchmark_time_series([n for n in sizes if n <= 1024])
+    benchmark_backends([n for n in sizes if n <= 1024])
+    benchmark_derivatives([n for n in (64, 128, 256, 512, 1024, 2048, 4096) if n <= max(sizes)])
+
+if __name__ == '__main__':
+    main()
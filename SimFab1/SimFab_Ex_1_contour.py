@@ -0,0 +1,160 @@
+import numpy as np
+
+# Zero-contour extraction with marching squares, on whole arrays (no plotting needed):
+# every grid cell (i, j) - (i + 1, j + 1) whose corners change sign contributes one segment (two for saddle cells)
+# between the linearly interpolated zero crossings on its edges. Crossings on a shared edge are one vertex, so the
+# segments form connected polylines.
+# Segments are oriented with the inside (phi < 0) on their left, so the enclosed area and centroid follow from
+# Green's theorem over the segments, closed with the inside parts of the domain boundary where the interface leaves
+# the grid.
+
+# vertices on the grid edges that the zero contour crosses
+# It returns: (vertices (m, 2), x_keys, y_keys) - the crossed edges along x and along y as sorted flat indices
+# i * n_y + j of their first grid point; vertex k belongs to x_keys[k], vertex len(x_keys) + k to y_keys[k]
+def edge_vertices(grid, inside, spacing, origin):
+    n_x, n_y = grid.shape
+
+    i, j = np.nonzero(inside[:-1, :] != inside[1:, :])
+    t = grid[i, j] / (grid[i, j] - grid[i + 1, j])
+    vertices_x = np.column_stack((origin[0] + (i + t) * spacing, origin[1] + j * spacing))
+
+    k, l = np.nonzero(inside[:, :-1] != inside[:, 1:])
+    t = grid[k, l] / (grid[k, l] - grid[k, l + 1])
+    vertices_y = np.column_stack((origin[0] + k * spacing, origin[1] + (l + t) * spacing))
+
+    return np.concatenate((vertices_x, vertices_y)), i * n_y + j, k * n_y + l
+
+# vertex index of the crossed edges with the given flat keys (-1 for edges that are not crossed)
+def find_vertex(keys, key, offset):
+    position = np.searchsorted(keys, key)
+    found = np.take(keys, position, mode = 'clip') == key if len(keys) else np.zeros(key.shape, dtype = bool)
+    return np.where(found, position + offset, -1)
+
+# Marching squares:
+# grid: level-set values (n_x, n_y), spacing: grid spacing, origin: coordinates of grid point (0, 0)
+# It returns: (vertices, segments) - vertex coordinates (m, 2) and pairs of vertex indices (s, 2), inside on the left
+def marching_squares(grid, spacing, origin = (0.0, 0.0)):
+    grid = np.asarray(grid, dtype = float)
+    n_x, n_y = grid.shape
+    inside = grid < 0
+    vertices, x_keys, y_keys = edge_vertices(grid, inside, spacing, origin)
+
+    # only the cells whose corners are not all on the same side are visited
+    corner = inside[:-1, :-1]
+    i, j = np.nonzero((inside[1:, :-1] != corner) | (inside[1:, 1:] != corner) | (inside[:-1, 1:] != corner))
+    key = i * n_y + j
+
+    # vertex index on the four edges of every cell: 0 bottom (y = j), 1 right (x = i + 1), 2 top (y = j + 1), 3 left (x = i)
+    offset = len(x_keys)
+    edges = np.column_stack((find_vertex(x_keys, key, 0), find_vertex(y_keys, key + n_y, offset),
+                             find_vertex(x_keys, key + 1, 0), find_vertex(y_keys, key, offset)))
+    crossed = edges >= 0
+    count = crossed.sum(axis = -1)
+    cell_i, cell_j = i, j
+
+    # ordinary cells: the two crossed edges are joined
+    ordinary = np.flatnonzero(count == 2)
+    first = np.argmax(crossed[ordinary], axis = -1)
+    second = 3 - np.argmax(crossed[ordinary][:, ::-1], axis = -1)
+    segments = [np.column_stack((edges[ordinary, first], edges[ordinary, second]))]
+    cells = [ordinary]
+
+    # saddle cells (all four edges crossed): the value at the cell centre decides which corners are connected
+    saddle = np.flatnonzero(count == 4)
+    if len(saddle):
+        i, j = cell_i[saddle], cell_j[saddle]
+        v00, v10, v11, v01 = grid[i, j], grid[i + 1, j], grid[i + 1, j + 1], grid[i, j + 1]
+        centre_inside = (v00 + v10 + v11 + v01) / 4 < 0
+        corner_00_inside = v00 < 0
+        # the segments cut off corners 10 and 01 (edges 0-1, 2-3) or corners 00 and 11 (edges 3-0, 1-2)
+        cut_10_01 = centre_inside == corner_00_inside
+        e = edges[saddle]
+        pair_a = np.where(cut_10_01[:, None], e[:, [0, 1]], e[:, [3, 0]])
+        pair_b = np.where(cut_10_01[:, None], e[:, [2, 3]], e[:, [1, 2]])
+        segments += [pair_a, pair_b]
+        cells += [saddle, saddle]
+
+    segments = np.concatenate(segments)
+    cells = np.concatenate(cells)
+    i, j = cell_i[cells], cell_j[cells]
+
+    # orientation: the inside (-grad phi) has to be on the left of the segment direction d, i.e. d_y * g_x - d_x * g_y > 0
+    g_x = (grid[i + 1, j] - grid[i, j] + grid[i + 1, j + 1] - grid[i, j + 1]) / 2
+    g_y = (grid[i, j + 1] - grid[i, j] + grid[i + 1, j + 1] - grid[i + 1, j]) / 2
+    d = vertices[segments[:, 1]] - vertices[segments[:, 0]]
+    flip = d[:, 1] * g_x - d[:, 0] * g_y < 0
+    segments[flip] = segments[flip][:, ::-1]
+
+    # where phi is exactly zero at a grid point, the crossings of all edges meeting there are the same point:
+    # merge equal vertices and drop the segments that shrink to a point
+    vertices, index = np.unique(vertices, axis = 0, return_inverse = True)
+    segments = index.reshape(-1)[segments]
+    segments = segments[segments[:, 0] != segments[:, 1]]
+    return vertices, segments
+
+# inside parts of the domain boundary, walked counter-clockwise, as segment end points (p, q)
+def boundary_segments(grid, spacing, origin):
+    n_x, n_y = grid.shape
+    x = origin[0] + np.arange(n_x) * spacing
+    y = origin[1] + np.arange(n_y) * spacing
+    sides = [   # values and points along each side, in counter-clockwise order
+        (grid[:, 0], np.column_stack((x, np.full(n_x, y[0])))),
+        (grid[-1, :], np.column_stack((np.full(n_y, x[-1]), y))),
+        (grid[::-1, -1], np.column_stack((x[::-1], np.full(n_x, y[-1])))),
+        (grid[0, ::-1], np.column_stack((np.full(n_y, x[0]), y[::-1]))),
+    ]
+    starts, ends = [], []
+    for values, points in sides:
+        a, b = values[:-1], values[1:]
+        p, q = points[:-1], points[1:]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            t = np.where(a != b, a / (a - b), 0.0)[:, None]
+        crossing = p + t * (q - p)
+        # clip every piece of the side to its inside part
+        start = np.where((a < 0)[:, None], p, crossing)
+        end = np.where((b < 0)[:, None], q, crossing)
+        keep = (a < 0) | (b < 0)
+        starts.append(start[keep])
+        ends.append(end[keep])
+    return np.concatenate(starts), np.concatenate(ends)
+
+# Interface metrics from oriented segments: enclosed area, perimeter and centroid of the inside region (phi < 0)
+# It returns: dictionary with 'area', 'perimeter', 'centroid'
+def interface_metrics(grid, spacing, vertices, segments, origin = (0.0, 0.0)):
+    p, q = vertices[segments[:, 0]], vertices[segments[:, 1]]
+    perimeter = np.sum(np.sqrt(np.sum((q - p)**2, axis = 1)))
+
+    # close the region along the domain boundary where the inside reaches it
+    boundary_p, boundary_q = boundary_segments(np.asarray(grid, dtype = float), spacing, origin)
+    p = np.concatenate((p, boundary_p))
+    q = np.concatenate((q, boundary_q))
+
+    cross = p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]
+    area = np.sum(cross) / 2
+    if area != 0:
+        centroid = (np.sum((p[:, 0] + q[:, 0]) * cross) / (6 * area), np.sum((p[:, 1] + q[:, 1]) * cross) / (6 * area))
+    else:
+        centroid = (np.nan, np.nan)
+    return {'area': area, 'perimeter': perimeter, 'centroid': centroid}
+
+# zero contour and its metrics in one pass
+# It returns: (vertices, segments, metrics)
+def extract_contour(grid, spacing, origin = (0.0, 0.0)):
+    vertices, segments = marching_squares(grid, spacing, origin)
+    return vertices, segments, interface_metrics(grid, spacing, vertices, segments, origin)
+
+# chains the segments into polylines (arrays of vertex indices; closed ones end with their first vertex)
+def polylines(segments):
+    following = {}
+    for start, end in segments.tolist():
+        following.setdefault(start, []).append(end)      # a vertex where two contours touch has two outgoing segments
+    ends = set(segments[:, 1].tolist())
+    starts = [v for v in following if v not in ends]      # open polylines start where no segment ends
+    lines = []
+    for start in starts + list(following):
+        while following.get(start):
+            line = [start]
+            while following.get(line[-1]):
+                line.append(following[line[-1]].pop())
+            lines.append(np.array(line))
+    return lines
@@ -0,0 +1,312 @@
+import numpy as np
+import heapq
+
+# Constructive solid geometry (CSG) for SDF grids:
+# primitives (Circle, Rectangle) are combined with Union, Intersection and Difference into one shape, whose signed
+# distance is evaluated tile by tile with array operations.
+#
+# Culling: every shape gives a lower and an upper bound of its SDF over a rectangular tile. A union only evaluates
+# the children whose lower bound is below the smallest upper bound (all others cannot be the minimum anywhere in the
+# tile), intersections and differences do the same for the maximum. A union of many children keeps them in a
+# bounding-volume hierarchy (BVH), so the candidates of a tile are found without looking at every child.
+# The culling is exact: the result equals the plain min / max over all primitives.
+#
+# Every shape has a bounding box `bbox` = (x_min, y_min, x_max, y_max) with the property that its SDF at a point
+# outside the box is at least the distance of the point to the box.
+
+# distance between two boxes (0 if they overlap)
+def box_distance(a, b):
+    d_x = max(a[0] - b[2], b[0] - a[2], 0)
+    d_y = max(a[1] - b[3], b[1] - a[3], 0)
+    return np.sqrt(d_x**2 + d_y**2)
+
+# the four corners of a box, as arrays of x and y
+def box_corners(box):
+    return np.array([box[0], box[2], box[0], box[2]]), np.array([box[1], box[1], box[3], box[3]])
+
+class Circle:
+    def __init__(self, centre, radius):
+        self.centre = centre
+        self.radius = radius
+        x0, y0 = centre
+        self.bbox = (x0 - radius, y0 - radius, x0 + radius, y0 + radius)
+        self.parameters = (x0, y0, radius)
+
+    def evaluate(self, x, y):     # same formula as SDFGrid.distance_circle
+        x0, y0 = self.centre
+        return np.sqrt((x - x0)**2 + (y - y0)**2) - self.radius
+
+    # It returns: (lower, upper) bound of the SDF over the tile box
+    def bounds(self, tile):
+        lower, upper = Circle.bounds_group(np.array([self.parameters], dtype = float), tile)
+        return lower[0], upper[0]
+
+    # bounds for many circles at once, parameters: array of rows (x0, y0, radius)
+    # (the SDF is convex, so its maximum over the tile lies at the corner furthest from the centre)
+    @staticmethod
+    def bounds_group(parameters, tile):
+        x0, y0, r = parameters[:, 0], parameters[:, 1], parameters[:, 2]
+        near_x = np.maximum(np.maximum(tile[0] - x0, x0 - tile[2]), 0)
+        near_y = np.maximum(np.maximum(tile[1] - y0, y0 - tile[3]), 0)
+        far_x = np.maximum(np.abs(x0 - tile[0]), np.abs(x0 - tile[2]))
+        far_y = np.maximum(np.abs(y0 - tile[1]), np.abs(y0 - tile[3]))
+        return np.sqrt(near_x**2 + near_y**2) - r, np.sqrt(far_x**2 + far_y**2) - r
+
+    # minimum of the SDFs of many circles, evaluated together by broadcasting
+    @staticmethod
+    def evaluate_group(parameters, x, y):
+        shape = (-1,) + (1,) * np.ndim(x)
+        x0, y0, r = (parameters[:, k].reshape(shape) for k in range(3))
+        return np.min(np.sqrt((x - x0)**2 + (y - y0)**2) - r, axis = 0)
+
+class Rectangle:
+    def __init__(self, min_corner, max_corner):
+        self.min_corner = min_corner
+        self.max_corner = max_corner
+        self.bbox = (min_corner[0], min_corner[1], max_corner[0], max_corner[1])
+        self.parameters = self.bbox
+
+    def evaluate(self, x, y):     # same formula as SDFGrid.distance_rectangle
+        (x_min, y_min), (x_max, y_max) = self.min_corner, self.max_corner
+        return Rectangle.distance(x, y, x_min, y_min, x_max, y_max)
+
+    @staticmethod
+    def distance(x, y, x_min, y_min, x_max, y_max):
+        d_x = np.maximum(np.maximum(x_min - x, 0), x - x_max)
+        d_y = np.maximum(np.maximum(y_min - y, 0), y - y_max)
+        distance = np.sqrt(d_x**2 + d_y**2)
+        inside = (x_min <= x) & (x <= x_max) & (y_min <= y) & (y <= y_max)
+        inner = -np.minimum(np.minimum(x - x_min, x_max - x), np.minimum(y - y_min, y_max - y))
+        return np.where(inside, inner, distance)
+
+    def bounds(self, tile):
+        lower, upper = Rectangle.bounds_group(np.array([self.parameters], dtype = float), tile)
+        return lower[0], upper[0]
+
+    # bounds for many rectangles at once, parameters: array of rows (x_min, y_min, x_max, y_max)
+    # if the tile touches a rectangle, its SDF can go down to minus half the smaller side; the maximum is at a corner
+    @staticmethod
+    def bounds_group(parameters, tile):
+        x_min, y_min, x_max, y_max = (parameters[:, k] for k in range(4))
+        near_x = np.maximum(np.maximum(tile[0] - x_max, x_min - tile[2]), 0)
+        near_y = np.maximum(np.maximum(tile[1] - y_max, y_min - tile[3]), 0)
+        lower = np.sqrt(near_x**2 + near_y**2)
+        lower = np.where(lower == 0, -np.minimum(x_max - x_min, y_max - y_min) / 2, lower)
+        corners_x, corners_y = box_corners(tile)
+        upper = np.max(Rectangle.distance(corners_x, corners_y, x_min[:, None], y_min[:, None], x_max[:, None], y_max[:, None]), axis = 1)
+        return lower, upper
+
+    @staticmethod
+    def evaluate_group(parameters, x, y):
+        shape = (-1,) + (1,) * np.ndim(x)
+        x_min, y_min, x_max, y_max = (parameters[:, k].reshape(shape) for k in range(4))
+        return np.min(Rectangle.distance(x, y, x_min, y_min, x_max, y_max), axis = 0)
+
+# primitives that are handled in groups (bounds_group / evaluate_group on parameter arrays)
+PRIMITIVES = (Circle, Rectangle)
+
+# evaluation of any shape on one tile (primitives have no culling of their own)
+def evaluate_shape(shape, x, y, tile):
+    if hasattr(shape, 'evaluate_tile'):
+        return shape.evaluate_tile(x, y, tile)
+    return shape.evaluate(x, y)
+
+# prunes candidate children for a tile: keeps those whose lower bound is not above the smallest upper bound
+# It returns: (groups, others, lower, upper) as Union.candidates
+def prune(groups, others, tile):
+    group_bounds = [(kind, parameters) + kind.bounds_group(parameters, tile) for kind, parameters in groups]
+    other_bounds = [(shape,) + tuple(shape.bounds(tile)) for shape in others]
+    upper = min([u.min() for kind, parameters, l, u in group_bounds] + [u for shape, l, u in other_bounds])
+    lower = min([l.min() for kind, parameters, l, u in group_bounds] + [l for shape, l, u in other_bounds])
+    groups = [(kind, parameters[l <= upper]) for kind, parameters, l, u in group_bounds if np.any(l <= upper)]
+    others = [shape for shape, l, u in other_bounds if l <= upper]
+    return groups, others, lower, upper
+
+class Union:
+    def __init__(self, shapes, leaf_size = 16, split_work = 65536):
+        # split_work: a tile whose candidates times points exceed this is split into quarters (down to 4 x 4 points),
+        # each of which prunes the candidates again, so the work follows the local density of the primitives
+        self.split_work = split_work
+        self.shapes = list(shapes)
+        boxes = np.array([s.bbox for s in self.shapes], dtype = float)
+        self.bbox = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+        self.tree = BVHNode(self.shapes, leaf_size)
+        self.last = None          # (tile, candidates) of the last tile
+
+    # candidate children for a tile: best-first search through the BVH, pruning every node whose lower bound over the
+    # tile (BVHNode.lower_bound) is above the smallest upper bound found so far
+    # It returns: (groups, others, lower, upper) - the candidate primitives as (kind, parameter array) groups, the other
+    # candidate shapes, and the lower and upper bound of the union over the tile
+    def candidates(self, tile):
+        if self.last is not None and self.last[0] == tile:
+            return self.last[1]      # bounds() and evaluate_tile() of the same tile share one search
+        best_upper = np.inf
+        found = []
+        heap = [(self.tree.lower_bound(tile), 0, self.tree)]
+        counter = 1
+        while heap:
+            bound, _, node = heapq.heappop(heap)
+            if bound > best_upper:
+                heapq.heappush(heap, (bound, counter, node))       # pruned, with the rest of the heap
+                break
+            if node.children is None:
+                for kind, parameters in node.groups:
+                    lower, upper = kind.bounds_group(parameters, tile)
+                    best_upper = min(best_upper, upper.min())
+                    found.append((kind, parameters, lower))
+                for shape in node.others:
+                    lower, upper = shape.bounds(tile)
+                    best_upper = min(best_upper, upper)
+                    found.append((None, shape, np.array([lower])))
+            else:
+                for child in node.children:
+                    heapq.heappush(heap, (child.lower_bound(tile), counter, child))
+                    counter += 1
+
+        groups, others = {}, []
+        for kind, item, lower in found:
+            keep = lower <= best_upper
+            if kind is None:
+                if keep[0]:
+                    others.append(item)
+            elif keep.any():
+                groups.setdefault(kind, []).append(item[keep])
+        groups = [(kind, np.concatenate(parts)) for kind, parts in groups.items()]
+        # lower bound of the union: the candidates and the pruned nodes (all of them above best_upper)
+        lower = min([lower.min() for kind, item, lower in found] + [bound for bound, _, node in heap[:1]])
+        result = (groups, others, lower, best_upper)
+        self.last = (tile, result)
+        return result
+
+    def bounds(self, tile):
+        groups, others, lower, upper = self.candidates(tile)
+        return lower, upper
+
+    def evaluate_tile(self, x, y, tile, chunk = 64):
+        groups, others, lower, upper = self.candidates(tile)
+        return self.evaluate_candidates(x, y, groups, others, chunk)
+
+    # minimum over the candidates; primitive groups are split into chunks of `chunk` so the temporary arrays stay small
+    # x: column (n_x, 1), y: row (1, n_y) of the tile points
+    def evaluate_candidates(self, x, y, groups, others, chunk):
+        count = sum(len(parameters) for kind, parameters in groups) + len(others)
+        if (count * np.size(x) * np.size(y) > self.split_work and np.ndim(x) == 2 and np.shape(x)[1] == 1
+                and np.shape(x)[0] >= 8 and np.shape(y)[-1] >= 8):
+            half_x, half_y = (x.shape[0] + 1) // 2, (y.shape[1] + 1) // 2
+            result = np.empty((x.shape[0], y.shape[1]))
+            for rows in (slice(0, half_x), slice(half_x, None)):
+                for columns in (slice(0, half_y), slice(half_y, None)):
+                    x_part, y_part = x[rows], y[:, columns]
+                    part = (x_part.min(), y_part.min(), x_part.max(), y_part.max())
+                    part_groups, part_others = prune(groups, others, part)[:2]
+                    result[rows, columns] = self.evaluate_candidates(x_part, y_part, part_groups, part_others, chunk)
+            return result
+        result = None
+        for kind, parameters in groups:
+            for start in range(0, len(parameters), chunk):
+                values = kind.evaluate_group(parameters[start:start + chunk], x, y)
+                result = values if result is None else np.minimum(result, values)
+        for shape in others:
+            values = evaluate_shape(shape, x, y, tile)
+            result = values if result is None else np.minimum(result, values)
+        return result
+
+    def evaluate(self, x, y):
+        result = self.shapes[0].evaluate(x, y)
+        for shape in self.shapes[1:]:
+            result = np.minimum(result, shape.evaluate(x, y))
+        return result
+
+class Intersection:
+    def __init__(self, shapes):
+        self.shapes = list(shapes)
+        # the SDF of the intersection is at least the SDF of every child, so any child box works: take the smallest
+        self.bbox = min((s.bbox for s in self.shapes), key = lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+
+    def bounds(self, tile):
+        limits = [s.bounds(tile) for s in self.shapes]
+        return max(l for l, u in limits), max(u for l, u in limits)
+
+    # children whose upper bound is below the largest lower bound cannot be the maximum and are skipped
+    def evaluate_tile(self, x, y, tile):
+        limits = [s.bounds(tile) for s in self.shapes]
+        largest_lower = max(l for l, u in limits)
+        result = None
+        for shape, (lower, upper) in zip(self.shapes, limits):
+            if upper < largest_lower:
+                continue
+            values = evaluate_shape(shape, x, y, tile)
+            result = values if result is None else np.maximum(result, values)
+        return result
+
+    def evaluate(self, x, y):
+        result = self.shapes[0].evaluate(x, y)
+        for shape in self.shapes[1:]:
+            result = np.maximum(result, shape.evaluate(x, y))
+        return result
+
+class Difference:
+    # base minus all cutters: max(d_base, -d_cutter_1, -d_cutter_2, ...); many cutters are kept in a Union (with BVH)
+    def __init__(self, base, cutters):
+        self.base = base
+        self.cutters = Union(cutters) if len(cutters) > 1 else cutters[0]
+        self.bbox = base.bbox
+
+    def bounds(self, tile):
+        base_lower, base_upper = self.base.bounds(tile)
+        cut_lower, cut_upper = self.cutters.bounds(tile)
+        return max(base_lower, -cut_upper), max(base_upper, -cut_lower)
+
+    def evaluate_tile(self, x, y, tile):
+        base_lower, base_upper = self.base.bounds(tile)
+        cut_lower, cut_upper = self.cutters.bounds(tile)
+        values = evaluate_shape(self.base, x, y, tile)
+        if -cut_lower > base_lower:       # otherwise -d_cutters <= d_base everywhere on the tile
+            values = np.maximum(values, -evaluate_shape(self.cutters, x, y, tile))
+        return values
+
+    def evaluate(self, x, y):
+        return np.maximum(self.base.evaluate(x, y), -self.cutters.evaluate(x, y))
+
+class BVHNode:
+    # binary tree over the bounding boxes, split at the median of the box centres along the longer side;
+    # the primitives of a leaf are stored as parameter arrays per kind, so their bounds are computed together
+    def __init__(self, shapes, leaf_size):
+        boxes = np.array([s.bbox for s in shapes], dtype = float)
+        self.bbox = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+        # the smallest SDF value of any shape below the node (minus the largest inscribed radius for primitives):
+        # the lower bound of a shape over its own box
+        self.deepest = min(s.bounds(s.bbox)[0] for s in shapes)
+        if len(shapes) <= leaf_size:
+            self.children = None
+            self.groups = [(kind, np.array([s.parameters for s in shapes if type(s) is kind], dtype = float))
+                           for kind in PRIMITIVES if any(type(s) is kind for s in shapes)]
+            self.others = [s for s in shapes if type(s) not in PRIMITIVES]
+            return
+        axis = 0 if self.bbox[2] - self.bbox[0] >= self.bbox[3] - self.bbox[1] else 1
+        centres = boxes[:, axis] + boxes[:, axis + 2]
+        order = np.argsort(centres, kind = 'stable')
+        half = len(shapes) // 2
+        self.children = [BVHNode([shapes[k] for k in order[:half]], leaf_size),
+                         BVHNode([shapes[k] for k in order[half:]], leaf_size)]
+
+    # lower bound of the SDFs below the node over a tile: away from the node box the SDF of every shape is at least
+    # the distance to the box; where the tile meets the box, a point can lie inside a shape
+    def lower_bound(self, tile):
+        distance = box_distance(self.bbox, tile)
+        return distance if distance > 0 else self.deepest
+
+# SDF of a shape on a grid, tile by tile
+# x: x-coordinates as a column (n_x, 1), y: y-coordinates as a row (1, n_y) (as returned by SDFGrid.coordinates())
+# out: optional output array (e.g. the grid itself), tile: tile size in grid points
+def evaluate_tiled(shape, x, y, out = None, tile = 64):
+    n_x, n_y = x.shape[0], y.shape[1]
+    if out is None:
+        out = np.empty((n_x, n_y))
+    for i in range(0, n_x, tile):
+        for j in range(0, n_y, tile):
+            x_tile = x[i:i + tile]
+            y_tile = y[:, j:j + tile]
+            box = (x_tile.min(), y_tile.min(), x_tile.max(), y_tile.max())
+            out[i:i + tile, j:j + tile] = evaluate_shape(shape, x_tile, y_tile, box)
+    return out
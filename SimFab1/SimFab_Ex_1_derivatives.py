@@ -0,0 +1,125 @@
+import numpy as np
+from SimFab_Ex_1_halo import pad, shifted, halo_indices
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+from SimFab_Ex_1_backend import register, kernel
+
+# One-sided (upwind) spatial derivatives D- and D+ of higher order, for the whole grid or for a list of cells:
+#   'upwind'  first-order one-sided differences
+#   'eno2'    second-order ENO (the smoother of two stencils)
+#   'eno3'    third-order ENO (the smoothest of three stencils)
+#   'weno5'   fifth-order WENO (weighted combination of the three ENO3 stencils, Jiang & Peng)
+# All schemes work on the first differences d_k = (phi[k + 1] - phi[k]) / h. Along one axis, D- at index i uses
+# v1 .. v5 = d_{i-3} .. d_{i+1}, and D+ uses the mirrored v1 .. v5 = d_{i+2} .. d_{i-2}; with this numbering the same
+# formula gives both. Every scheme reads at most 3 cells on each side, taken from a halo of 3 ghost cells that is
+# filled according to the boundary condition (see SimFab_Ex_1_halo).
+
+SCHEMES = ('upwind', 'eno2', 'eno3', 'weno5')
+WIDTH = 3
+
+def upwind(v1, v2, v3, v4, v5):
+    return v3
+
+# the argument with the smaller magnitude
+def smaller(a, b):
+    return np.where(np.abs(a) <= np.abs(b), a, b)
+
+def eno2(v1, v2, v3, v4, v5):
+    return v3 + 0.5 * smaller(v3 - v2, v4 - v3)
+
+def eno3(v1, v2, v3, v4, v5):
+    stencil_1 = v1 / 3 - 7 * v2 / 6 + 11 * v3 / 6
+    stencil_2 = -v2 / 6 + 5 * v3 / 6 + v4 / 3
+    stencil_3 = v3 / 3 + 5 * v4 / 6 - v5 / 6
+    left = np.abs(v3 - v2) <= np.abs(v4 - v3)      # second-order choice, then the smoother third difference
+    a, b, c = np.abs(v1 - 2 * v2 + v3), np.abs(v2 - 2 * v3 + v4), np.abs(v3 - 2 * v4 + v5)
+    return np.where(left, np.where(a <= b, stencil_1, stencil_2), np.where(b <= c, stencil_2, stencil_3))
+
+def weno5(v1, v2, v3, v4, v5):
+    stencil_1 = v1 / 3 - 7 * v2 / 6 + 11 * v3 / 6
+    stencil_2 = -v2 / 6 + 5 * v3 / 6 + v4 / 3
+    stencil_3 = v3 / 3 + 5 * v4 / 6 - v5 / 6
+    S_1 = 13 / 12 * (v1 - 2 * v2 + v3)**2 + 1 / 4 * (v1 - 4 * v2 + 3 * v3)**2     # smoothness of the stencils
+    S_2 = 13 / 12 * (v2 - 2 * v3 + v4)**2 + 1 / 4 * (v2 - v4)**2
+    S_3 = 13 / 12 * (v3 - 2 * v4 + v5)**2 + 1 / 4 * (3 * v3 - 4 * v4 + v5)**2
+    epsilon = 1e-6 * np.maximum.reduce([v1**2, v2**2, v3**2, v4**2, v5**2]) + 1e-99
+    a_1 = 0.1 / (S_1 + epsilon)**2
+    a_2 = 0.6 / (S_2 + epsilon)**2
+    a_3 = 0.3 / (S_3 + epsilon)**2
+    return (a_1 * stencil_1 + a_2 * stencil_2 + a_3 * stencil_3) / (a_1 + a_2 + a_3)
+
+# loop versions of the ENO3 / WENO5 stencil selection for the kernel backends (see SimFab_Ex_1_backend)
+
+def eno3_loop(v1, v2, v3, v4, v5, out):
+    for k in range(out.shape[0]):
+        a, b, c, d, e = v1[k], v2[k], v3[k], v4[k], v5[k]
+        if abs(c - b) <= abs(d - c):
+            if abs(a - 2 * b + c) <= abs(b - 2 * c + d):
+                out[k] = a / 3 - 7 * b / 6 + 11 * c / 6
+            else:
+                out[k] = -b / 6 + 5 * c / 6 + d / 3
+        elif abs(b - 2 * c + d) <= abs(c - 2 * d + e):
+            out[k] = -b / 6 + 5 * c / 6 + d / 3
+        else:
+            out[k] = c / 3 + 5 * d / 6 - e / 6
+
+def weno5_loop(v1, v2, v3, v4, v5, out):
+    for k in range(out.shape[0]):
+        a, b, c, d, e = v1[k], v2[k], v3[k], v4[k], v5[k]
+        S_1 = 13 / 12 * ((a - 2 * b + c) * (a - 2 * b + c)) + 1 / 4 * ((a - 4 * b + 3 * c) * (a - 4 * b + 3 * c))
+        S_2 = 13 / 12 * ((b - 2 * c + d) * (b - 2 * c + d)) + 1 / 4 * ((b - d) * (b - d))
+        S_3 = 13 / 12 * ((c - 2 * d + e) * (c - 2 * d + e)) + 1 / 4 * ((3 * c - 4 * d + e) * (3 * c - 4 * d + e))
+        epsilon = 1e-6 * max(a * a, b * b, c * c, d * d, e * e) + 1e-99
+        a_1 = 0.1 / ((S_1 + epsilon) * (S_1 + epsilon))
+        a_2 = 0.6 / ((S_2 + epsilon) * (S_2 + epsilon))
+        a_3 = 0.3 / ((S_3 + epsilon) * (S_3 + epsilon))
+        out[k] = (a_1 * (a / 3 - 7 * b / 6 + 11 * c / 6) + a_2 * (-b / 6 + 5 * c / 6 + d / 3) + a_3 * (c / 3 + 5 * d / 6 - e / 6)) / (a_1 + a_2 + a_3)
+
+register('eno3', eno3, eno3_loop, elementwise = True)
+register('weno5', weno5, weno5_loop, elementwise = True)
+
+# phi at offsets -3 .. 3 along one axis, for the whole grid (views of the padded grid) or for the cells (i, j)
+def stencil_values(grid, axis, boundary_condition, cells, padded):
+    if cells is None:
+        return [shifted(padded, WIDTH, k, 0) if axis == 0 else shifted(padded, WIDTH, 0, k) for k in range(-WIDTH, WIDTH + 1)]
+    i, j = cells
+    n = grid.shape[axis]
+    index = halo_indices(n, WIDTH, boundary_condition)        # source index of the positions -3 .. n + 2
+    along = i if axis == 0 else j
+    values = []
+    for k in range(-WIDTH, WIDTH + 1):
+        moved = index[along + k + WIDTH]
+        values.append(grid[moved, j] if axis == 0 else grid[i, moved])
+    return values
+
+# One-sided derivatives of a grid:
+# grid: 2D array or NarrowBandGrid, spacing: grid spacing, scheme: one of SCHEMES
+# boundary_condition: None (index clamped at the edges), 'reflective' or 'periodic'
+# cells: optional (i, j) index arrays, then only these cells are computed (for a NarrowBandGrid: its band cells by default)
+# It returns: (D_x_minus, D_x_plus, D_y_minus, D_y_plus) arrays of the grid shape, or of the length of the cells
+def one_sided_derivatives(grid, spacing, scheme = 'weno5', boundary_condition = None, cells = None):
+    if scheme not in SCHEMES:
+        raise ValueError(f"scheme has to be one of {', '.join(SCHEMES)}")
+    formula = kernel(scheme) if scheme in ('eno3', 'weno5') else {'upwind': upwind, 'eno2': eno2}[scheme]
+    if cells is None and isinstance(grid, NarrowBandGrid):
+        cells = band_cells(grid)
+    if scheme == 'upwind' and cells is None:      # first order needs only the two neighbours
+        return upwind_differences(np.asarray(grid, dtype = float), spacing, boundary_condition)
+    padded = pad(np.asarray(grid, dtype = float), boundary_condition, WIDTH) if cells is None else None
+    results = []
+    for axis in (0, 1):
+        phi = stencil_values(grid, axis, boundary_condition, cells, padded)
+        d = [(phi[m + 1] - phi[m]) / spacing for m in range(2 * WIDTH)]       # d[m] = d_{i - 3 + m}
+        results.append(formula(d[0], d[1], d[2], d[3], d[4]))                  # D-
+        results.append(formula(d[5], d[4], d[3], d[2], d[1]))                  # D+
+    return tuple(results)
+
+# first-order D- and D+ of the whole grid from the differences between neighbours (one pass per axis)
+def upwind_differences(grid, spacing, boundary_condition):
+    padded = pad(grid, boundary_condition, 1)
+    d_x = np.diff(padded[:, 1:-1], axis = 0) / spacing        # d_x[i] = (phi[i] - phi[i - 1]) / h
+    d_y = np.diff(padded[1:-1, :], axis = 1) / spacing
+    return d_x[:-1], d_x[1:], d_y[:, :-1], d_y[:, 1:]
+
+# (i, j) index arrays of the stored cells of a NarrowBandGrid
+def band_cells(grid):
+    return grid.keys // grid.n_y, grid.keys % grid.n_y
@@ -0,0 +1,106 @@
+import numpy as np
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+from SimFab_Ex_1_backend import register, kernel
+
+# Velocity extension off the interface:
+# speeds that only mean something on the surface (curvature, flux-dependent rates) are evaluated at the cells next to
+# the zero level set only, and carried outward along the normals so that grad V . grad phi = 0. Moving with such a
+# speed keeps phi a signed distance function, so it does not have to be reinitialized after every step.
+# The discrete equation is upwinded like the fast marching method: every cell takes the weighted mean of its
+# neighbours closer to the interface (one per axis), with the weights |phi| - |phi_neighbour|,
+#   V = (w_x V_x + w_y V_y) / (w_x + w_y)
+# Every cell depends only on cells with a smaller |phi|, so one pass in the order of |phi| (the marching order, known
+# in advance because phi is already a distance) solves it. The cells are handled as flat arrays with neighbour tables,
+# so the same code runs on a whole grid, on the cells of a band |phi| < band, or on the cells of a NarrowBandGrid.
+
+# position in the sorted flat indices `keys` of the neighbour (d_i, d_j) of every cell, len(keys) where it is missing
+def neighbour_positions(keys, shape, d_i, d_j):
+    n_x, n_y = shape
+    i, j = np.divmod(keys, n_y)
+    valid = (i + d_i >= 0) & (i + d_i < n_x) & (j + d_j >= 0) & (j + d_j < n_y)
+    neighbour = keys + d_i * n_y + d_j
+    position = np.searchsorted(keys, neighbour)
+    found = valid & (np.take(keys, position, mode = 'clip') == neighbour)
+    return np.where(found, position, len(keys))
+
+# the cells of the extension: flat indices, phi values and the neighbour positions (+x, -x, +y, -y)
+def extension_cells(grid, spacing, band):
+    if isinstance(grid, NarrowBandGrid):
+        keys, values = grid.keys, grid.values
+        if band is not None:
+            inside = np.abs(values) < band * spacing
+            keys, values = keys[inside], values[inside]
+    else:
+        values = np.asarray(grid, dtype = float).ravel()
+        keys = np.arange(len(values)) if band is None else np.flatnonzero(np.abs(values) < band * spacing)
+        values = values[keys]
+    shape = np.shape(grid)
+    neighbours = [neighbour_positions(keys, shape, d_i, d_j) for d_i, d_j in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+    return keys, values, neighbours
+
+# loop version: one pass over the cells in the order of increasing |phi| (speed[-1] is the missing neighbour)
+# first, second: upwind neighbour along x and y, w_first, w_second: their weights, order: the cells to compute, sorted
+# neighbours: (4, cells) positions of all four neighbours (only used by the NumPy version)
+def extend_cells(speed, first, second, w_first, w_second, order, neighbours):
+    for k in order:
+        speed[k] = (w_first[k] * speed[first[k]] + w_second[k] * speed[second[k]]) / (w_first[k] + w_second[k])
+
+# NumPy version: the cells are computed front by front. A cell is ready once its upwind neighbours are final, and
+# the next front is made of the ready neighbours of the last one; every cell is computed once, with the same
+# operations as in the loop, so the values are exactly those of the ordered pass.
+def extend_cells_numpy(speed, first, second, w_first, w_second, order, neighbours):
+    final = np.ones(len(speed), dtype = bool)
+    final[order] = False
+    front = np.flatnonzero(final[:-1])
+    slot = np.zeros(len(speed), dtype = np.int64)
+    while len(front):
+        candidates = neighbours[:, front].ravel()
+        candidates = candidates[~final[candidates]]        # (the missing neighbour is final)
+        slot[candidates] = np.arange(len(candidates))       # one copy of every cell reached from several sides
+        candidates = candidates[slot[candidates] == np.arange(len(candidates))]
+        ready = candidates[(final[first[candidates]] | (w_first[candidates] == 0)) & (final[second[candidates]] | (w_second[candidates] == 0))]
+        speed[ready] = (w_first[ready] * speed[first[ready]] + w_second[ready] * speed[second[ready]]) / (w_first[ready] + w_second[ready])
+        final[ready] = True
+        front = ready
+
+register('extension', extend_cells_numpy, extend_cells)
+
+# Velocity extension:
+# grid: level set (array or NarrowBandGrid, close to a signed distance), spacing: grid spacing
+# speed: the speed at the interface cells - a function speed(i, j) of index arrays, a velocity field
+# (SimFab_Ex_1_velocity), or an array of the grid shape (only its values at the interface cells are used)
+# band: only extend to the cells with |phi| < band * spacing (default: the whole grid, or the whole band)
+# It returns: (speeds, keys, evaluated) - the extended speeds at the cells with the flat indices `keys` (the whole grid in
+# C order, the band cells, or the band of a NarrowBandGrid), and the number of cells where the speed was evaluated;
+# cells without a neighbour closer to the interface keep the speed 0
+def extend_velocity(grid, speed, spacing, band = None):
+    keys, values, neighbours = extension_cells(grid, spacing, band)
+    n_y = np.shape(grid)[1]
+
+    # interface cells: a sign change to one of the four neighbours
+    phi = np.append(values, np.nan)
+    interface = np.zeros(len(keys), dtype = bool)
+    for position in neighbours:
+        interface |= (values * phi[position] <= 0) & (values != phi[position])
+    i, j = np.divmod(keys[interface], n_y)
+    if callable(speed):
+        seeds = speed(i, j)
+    elif hasattr(speed, 'evaluate'):
+        seeds = speed.evaluate(grid, (i, j))
+    else:
+        seeds = np.asarray(speed)[i, j]
+    extended = np.zeros(len(keys) + 1)
+    extended[:-1][interface] = seeds
+
+    # the upwind neighbour along each axis and its weight |phi| - |phi_neighbour| (0 where it is not closer)
+    distance = np.append(np.abs(values), np.inf)
+    upwind, weights = [], []
+    for plus, minus in ((neighbours[0], neighbours[1]), (neighbours[2], neighbours[3])):
+        nearer = np.where(distance[plus] <= distance[minus], plus, minus)
+        upwind.append(nearer)
+        weights.append(np.maximum(distance[:-1] - distance[nearer], 0.0))
+    free = ~interface & (weights[0] + weights[1] > 0)
+    order = np.flatnonzero(free)
+    order = order[np.argsort(distance[order], kind = 'stable')]
+    kernel('extension')(extended, upwind[0], upwind[1], weights[0], weights[1], order, np.array(neighbours))
+    return extended[:-1], keys, int(interface.sum())
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+# Cache of derived fields (gradient, normals, curvature, Hessian, ...) of one grid:
+# every entry is stored with the grid version it was computed from (SDFGrid.version, increased whenever the grid
+# changes, also in place, see SDFGrid.check_grid()), so an entry of an older version is never returned. The total size of the cached arrays is limited to
+# max_bytes; when a new entry does not fit, the least recently used entries are evicted first.
+# Cached arrays are made read-only, since the same array is handed to every caller.
+
+# size of a cached value: an array or a tuple of arrays
+def value_bytes(value):
+    if isinstance(value, tuple):
+        return sum(value_bytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+def read_only(value):
+    if isinstance(value, tuple):
+        return tuple(read_only(v) for v in value)
+    if hasattr(value, 'setflags'):
+        value.setflags(write = False)
+    return value
+
+class FieldCache:
+    def __init__(self, max_bytes = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key -> (version, value), least recently used first
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # cached value of `key` for the grid version, or None
+    def peek(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    # the value of `key` for the grid version, computed with compute() if it is not cached
+    def get(self, key, version, compute):
+        value = self.peek(key, version)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = read_only(compute())
+        self.store(key, version, value)
+        return value
+
+    def store(self, key, version, value):
+        self.discard(key)
+        size = value_bytes(value)
+        if size > self.max_bytes:     # larger than the whole cache: returned, but not kept
+            return
+        while self.nbytes + size > self.max_bytes:
+            self.discard(next(iter(self.entries)))
+        self.entries[key] = (version, value)
+        self.nbytes += size
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= value_bytes(entry[1])
+
+    # drops all entries computed from other versions than `version`
+    def expire(self, version):
+        for key in [k for k, (v, value) in self.entries.items() if v != version]:
+            self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
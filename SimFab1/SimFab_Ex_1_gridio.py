@@ -0,0 +1,143 @@
+import numpy as np
+import json
+import os
+import sys
+
+# Binary grid format (.sdf) replacing the CSV files:
+#   bytes 0-7    magic b'SDFGRID1'
+#   bytes 8-11   length of the JSON header (little-endian uint32)
+#   JSON header  shape, dtype, spacing, boundary_condition, origin (padded with spaces so the data is 64-byte aligned)
+#   data         the raw grid values in C order
+# The data block is opened with np.memmap, so loading a grid reads nothing until the values are used.
+
+MAGIC = b'SDFGRID1'
+ALIGNMENT = 64
+
+# header bytes (magic, length, padded JSON) for a grid of the given shape
+def encode_header(shape, spacing, boundary_condition = None, origin = (0.0, 0.0), dtype = '<f8'):
+    header = json.dumps({
+        'shape': [int(n) for n in shape],
+        'dtype': np.dtype(dtype).str,
+        'spacing': float(spacing),
+        'boundary_condition': boundary_condition,
+        'origin': [float(o) for o in origin],
+    }).encode()
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % ALIGNMENT)
+    return MAGIC + np.uint32(len(header)).astype('<u4').tobytes() + header
+
+# writes a grid with its metadata
+# grid: 2D array, spacing: grid spacing, boundary_condition: 'reflective' / 'periodic' / None, origin: coordinates of grid point (0, 0)
+def save_grid(filename, grid, spacing, boundary_condition = None, origin = (0.0, 0.0)):
+    grid = np.ascontiguousarray(grid, dtype = '<f8')
+    with open(filename, 'wb') as f:
+        f.write(encode_header(grid.shape, spacing, boundary_condition, origin))
+        grid.tofile(f)
+
+# reads the header of a grid file
+# It returns: (metadata dictionary, byte offset of the data block)
+def read_header(filename):
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not an SDF grid file")
+        length = int(np.frombuffer(f.read(4), dtype = '<u4')[0])
+        header = json.loads(f.read(length).decode())
+    header['shape'] = tuple(header['shape'])
+    header['origin'] = tuple(header['origin'])
+    return header, len(MAGIC) + 4 + length
+
+# opens a grid file without reading the values
+# mode: np.memmap mode, 'r' read-only (default), 'r+' write back to the file, 'c' copy-on-write
+# It returns: (grid as np.memmap, metadata dictionary)
+def load_grid(filename, mode = 'r'):
+    header, offset = read_header(filename)
+    grid = np.memmap(filename, dtype = header['dtype'], mode = mode, offset = offset, shape = header['shape'])
+    return grid, header
+
+# creates a grid file of the given shape without writing the values (the file is sparse until filled)
+# It returns: (grid as a writable np.memmap, metadata dictionary)
+def create_grid(filename, shape, spacing, boundary_condition = None, origin = (0.0, 0.0)):
+    header = encode_header(shape, spacing, boundary_condition, origin)
+    with open(filename, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + int(np.prod(shape)) * 8)
+    return load_grid(filename, mode = 'r+')
+
+# converts a CSV grid (as written by SDFGrid.save_to_csv) into the binary format
+def csv_to_grid(csv_filename, grid_filename = None, spacing = 1.0, boundary_condition = None, origin = (0.0, 0.0)):
+    if grid_filename is None:
+        grid_filename = csv_filename.rsplit('.', 1)[0] + '.sdf'
+    grid = np.loadtxt(csv_filename, delimiter = ',')
+    save_grid(grid_filename, grid, spacing, boundary_condition, origin)
+    return grid_filename
+
+# reads a grid from either format: .csv files are parsed as text, everything else is memory-mapped
+# It returns: (grid, metadata dictionary - empty for CSV files)
+def read_any(filename):
+    if filename.endswith('.csv'):
+        return np.loadtxt(filename, delimiter = ','), {}
+    return load_grid(filename)
+
+# Time-series format (.sdfs) for the snapshots of one run:
+#   bytes 0-7    magic b'SDFSERI1'
+#   bytes 8-11   length of the JSON header, JSON header  as for .sdf files (the shape is the shape of one snapshot)
+#   records      one chunk per snapshot: the time (float64), padding to 64 bytes, the snapshot values in C order
+# Snapshots are appended as they are computed and nothing before them is rewritten, so a file that is still being
+# written (or whose run was interrupted) can be read up to its last complete record.
+
+SERIES_MAGIC = b'SDFSERI1'
+
+# numpy dtype of one record for snapshots of the given shape
+def series_record(shape):
+    return np.dtype([('time', '<f8'), ('padding', 'V' + str(ALIGNMENT - 8)), ('grid', '<f8', tuple(shape))])
+
+# writes the snapshots of a run into one time-series file while they are produced
+# snapshots: iterable of (t, grid), e.g. the generator of SimFab_Ex_1_integrate.snapshots(); every snapshot is
+# written and flushed before the next one is requested, so only one snapshot is held in memory
+# It returns: the number of snapshots written
+def write_series(filename, snapshots, spacing, boundary_condition = None, origin = (0.0, 0.0)):
+    count = 0
+    with open(filename, 'wb') as f:
+        for t, grid in snapshots:
+            grid = np.asarray(grid)
+            if count == 0:
+                f.write(SERIES_MAGIC + encode_header(grid.shape, spacing, boundary_condition, origin)[len(MAGIC):])
+                record = np.zeros(1, dtype = series_record(grid.shape))
+            record['time'] = t
+            record['grid'] = grid
+            record.tofile(f)
+            f.flush()
+            count += 1
+    return count
+
+# opens a time-series file without reading the snapshots
+# It returns: (times, grids as np.memmap of shape (snapshots, n_x, n_y), metadata dictionary)
+def load_series(filename, mode = 'r'):
+    with open(filename, 'rb') as f:
+        if f.read(len(SERIES_MAGIC)) != SERIES_MAGIC:
+            raise ValueError(f"{filename} is not an SDF time-series file")
+        length = int(np.frombuffer(f.read(4), dtype = '<u4')[0])
+        header = json.loads(f.read(length).decode())
+    header['shape'] = tuple(header['shape'])
+    header['origin'] = tuple(header['origin'])
+    offset = len(SERIES_MAGIC) + 4 + length
+    record = series_record(header['shape'])
+    count = (os.path.getsize(filename) - offset) // record.itemsize        # complete records only
+    if count == 0:
+        return np.empty(0), np.empty((0,) + header['shape']), header
+    records = np.memmap(filename, dtype = record, mode = mode, offset = offset, shape = (count,))
+    return np.array(records['time']), records['grid'], header
+
+def main():     # converts CSV grids from the command line:  python SimFab_Ex_1_gridio.py file.csv [file.csv ...] [spacing] [reflective / periodic]
+    args = sys.argv[1:]
+    files = [a for a in args if a.endswith('.csv')]
+    if not files:
+        print("Provide the following values: [grid.csv ...] [spacing] [reflective / periodic]")
+        return
+    options = [a for a in args if not a.endswith('.csv')]
+    spacing = float(options[0]) if len(options) > 0 else 1.0
+    boundary_condition = options[1] if len(options) > 1 else None
+    for filename in files:
+        print(f"Converted {filename} to {csv_to_grid(filename, spacing = spacing, boundary_condition = boundary_condition)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Ghost-cell halo for stencil operations:
+# the grid is copied into a padded array with `width` extra cells on every side, and the extra (ghost) cells are filled
+# once according to the boundary condition. A stencil is then a plain slice of the padded array, with no index
+# clamping or branching at the edges.
+# The ghost cells use the same index mapping as SDFGrid.BC(): 'reflective' (index -i -> i, index n - 1 + i -> n - i),
+# 'periodic' (wrap around), and for no boundary condition (None) the index is clamped to the edge, which gives the
+# same one-sided differences as the min / max clamping of the per-point derivatives.
+
+# source index of every padded position -width .. n - 1 + width along one axis
+def halo_indices(n, width, boundary_condition):
+    index = np.arange(-width, n + width)
+    if boundary_condition == 'reflective':
+        return np.where(index < 0, -index, np.where(index >= n, 2 * n - index - 1, index))
+    elif boundary_condition == 'periodic':
+        return np.where(index < 0, n + index, np.where(index >= n, index - n, index))
+    return np.clip(index, 0, n - 1)
+
+# fills the ghost cells of a padded 2D array in place (the interior must already hold the grid values)
+def fill_halo(padded, width, boundary_condition):
+    if width == 0:
+        return padded
+    n_x, n_y = padded.shape[0] - 2 * width, padded.shape[1] - 2 * width
+    rows = halo_indices(n_x, width, boundary_condition) + width
+    columns = halo_indices(n_y, width, boundary_condition) + width
+    padded[:width] = padded[rows[:width]]
+    padded[-width:] = padded[rows[-width:]]
+    padded[:, :width] = padded[:, columns[:width]]      # after the rows, so the corners are filled as well
+    padded[:, -width:] = padded[:, columns[-width:]]
+    return padded
+
+# copies a grid into a padded array (reusing `out` if given) and fills its halo
+def pad(grid, boundary_condition = None, width = 1, out = None):
+    n_x, n_y = grid.shape
+    if out is None or out.shape != (n_x + 2 * width, n_y + 2 * width):
+        out = np.empty((n_x + 2 * width, n_y + 2 * width))
+    out[width:width + n_x, width:width + n_y] = grid
+    return fill_halo(out, width, boundary_condition)
+
+# slice of a padded array shifted by (d_x, d_y) cells relative to the interior, e.g. shifted(P, 1, 1, 0) = phi[i + 1, j]
+def shifted(padded, width, d_x, d_y):
+    n_x, n_y = padded.shape[0] - 2 * width, padded.shape[1] - 2 * width
+    return padded[width + d_x:width + d_x + n_x, width + d_y:width + d_y + n_y]
+
+# central differences of the whole grid from a padded array
+# It returns: (D_x, D_y) arrays of the interior shape
+def central_derivative(padded, width, spacing):
+    D_x = (shifted(padded, width, 1, 0) - shifted(padded, width, -1, 0)) / (2 * spacing)
+    D_y = (shifted(padded, width, 0, 1) - shifted(padded, width, 0, -1)) / (2 * spacing)
+    return D_x, D_y
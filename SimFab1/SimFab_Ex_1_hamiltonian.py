@@ -0,0 +1,131 @@
+import numpy as np
+
+# Hamiltonians of the level-set equation phi_t + H(phi_x, phi_y) = 0 for the numerical fluxes:
+#   NormalSpeed(V)        H = V |grad phi|          (motion in the normal direction; V number or array)
+#   VectorVelocity(u, v)  H = u phi_x + v phi_y     (transport with a vector velocity)
+#   Hamiltonian(f, ...)   H = f(phi_x, phi_y, ...)  (any, also non-convex, Hamiltonian)
+# Every Hamiltonian gives its value, bounds alpha_x >= |dH/dp|, alpha_y >= |dH/dq| over the boxes between the
+# one-sided differences (p-, p+) x (q-, q+) of every cell (for the Lax-Friedrichs fluxes), and its Godunov flux
+#   ext over p in (p-, p+) of ext over q in (q-, q+) of H(p, q),  ext = min if p- <= p+, max if p- > p+
+# (closed forms for the normal speed and the vector velocity, a search over sample points for general Hamiltonians).
+# p is phi_x and q is phi_y; the numerical fluxes built from these are in SimFab_Ex_1_advection.
+
+# the values of a per-cell parameter at the given cells (numbers are kept)
+def at_cells(parameter, cells):
+    return parameter if np.ndim(parameter) == 0 else np.asarray(parameter)[cells]
+
+# Godunov's ext over the interval between a and b, for the values along the first axis:
+# the minimum where a <= b, the maximum where a > b
+def extremum(values, a, b):
+    return np.where(a <= b, values.min(axis = 0), values.max(axis = 0))
+
+class Hamiltonian:
+    # function: H(p, q, *parameters) on arrays, alpha: (alpha_x, alpha_y) numbers or arrays of the grid shape
+    # parameters: arrays of the grid shape (or numbers) passed on to the function, so that they can follow a narrow band
+    # samples: points inside every interval (besides its ends and 0) at which the Godunov flux looks for the extremum;
+    # the flux is exact for Hamiltonians whose extrema lie there, otherwise it converges with the number of samples
+    def __init__(self, function, alpha, parameters = (), samples = 8):
+        self.function = function
+        self.alpha_bounds = alpha
+        self.parameters = parameters
+        self.samples = samples
+
+    def value(self, p, q):
+        return self.function(p, q, *self.parameters)
+
+    # the Hamiltonian at the given cells (index arrays (i, j) of a narrow band)
+    def select(self, cells):
+        alpha = tuple(at_cells(a, cells) for a in self.alpha_bounds)
+        return Hamiltonian(self.function, alpha, tuple(at_cells(a, cells) for a in self.parameters), self.samples)
+
+    # alpha_x, alpha_y over the boxes (p-, p+) x (q-, q+) of every cell
+    def alpha(self, p_minus, p_plus, q_minus, q_plus):
+        return self.alpha_bounds
+
+    # largest speed of the interface (for the CFL condition)
+    def max_speed(self):
+        alpha_x, alpha_y = (np.max(np.abs(a)) for a in self.alpha_bounds)
+        return np.sqrt(alpha_x**2 + alpha_y**2)
+
+    # sample points of the intervals between a and b: the ends, 0 where it lies inside, and `samples` inner points
+    def interval_points(self, a, b):
+        t = np.linspace(0, 1, self.samples + 2)[1:-1].reshape((-1,) + (1,) * np.ndim(a))
+        zero = np.where((a <= 0) == (0 <= b), 0.0, a)       # 0 if it lies between a and b (either order)
+        return np.concatenate((np.stack((a, b, zero)), a + t * (b - a)))
+
+    def godunov(self, p_minus, p_plus, q_minus, q_plus):
+        p = self.interval_points(p_minus, p_plus)[:, None]
+        q = self.interval_points(q_minus, q_plus)[None, :]
+        values = self.value(p, q)
+        return extremum(extremum(values.swapaxes(0, 1), q_minus, q_plus), p_minus, p_plus)
+
+class NormalSpeed(Hamiltonian):
+    def __init__(self, speed):
+        self.speed = speed
+
+    def value(self, p, q):
+        return self.speed * np.sqrt(p * p + q * q)
+
+    def select(self, cells):
+        return NormalSpeed(at_cells(self.speed, cells))
+
+    # |dH/dp| = |V| |p| / |grad phi| over the box: the largest |p| over the smallest |grad phi| (at most |V|)
+    def alpha(self, p_minus, p_plus, q_minus, q_plus):
+        speed = np.abs(self.speed)
+        p_large, p_small = interval_magnitudes(p_minus, p_plus)
+        q_large, q_small = interval_magnitudes(q_minus, q_plus)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            alpha_x = speed * np.nan_to_num(p_large / np.sqrt(p_large**2 + q_small**2), nan = 1.0)
+            alpha_y = speed * np.nan_to_num(q_large / np.sqrt(q_large**2 + p_small**2), nan = 1.0)
+        return alpha_x, alpha_y
+
+    def max_speed(self):
+        return np.max(np.abs(self.speed))
+
+    # closed form (Osher & Sethian): the upwind side with the larger magnitude along each axis
+    def godunov(self, p_minus, p_plus, q_minus, q_plus):
+        def magnitude(sign):
+            behind, ahead = (np.maximum, np.minimum) if sign > 0 else (np.minimum, np.maximum)
+            return np.sqrt(np.maximum(behind(p_minus, 0)**2, ahead(p_plus, 0)**2) + np.maximum(behind(q_minus, 0)**2, ahead(q_plus, 0)**2))
+        if np.all(self.speed > 0):
+            return self.speed * magnitude(1)
+        if np.all(self.speed <= 0):
+            return self.speed * magnitude(-1)
+        return self.speed * np.where(self.speed > 0, magnitude(1), magnitude(-1))
+
+class VectorVelocity(Hamiltonian):
+    def __init__(self, u, v):
+        self.u = u
+        self.v = v
+
+    def value(self, p, q):
+        return self.u * p + self.v * q
+
+    def select(self, cells):
+        return VectorVelocity(at_cells(self.u, cells), at_cells(self.v, cells))
+
+    def alpha(self, p_minus, p_plus, q_minus, q_plus):
+        return np.abs(self.u), np.abs(self.v)
+
+    def max_speed(self):
+        return np.max(np.sqrt(np.square(self.u) + np.square(self.v)))
+
+    # for a linear Hamiltonian the Godunov (and Engquist-Osher) flux is plain upwinding
+    def godunov(self, p_minus, p_plus, q_minus, q_plus):
+        return np.where(self.u > 0, self.u * p_minus, self.u * p_plus) + np.where(self.v > 0, self.v * q_minus, self.v * q_plus)
+
+# the largest and the smallest magnitude over the interval between a and b (the smallest is 0 if it contains 0)
+def interval_magnitudes(a, b):
+    large = np.maximum(np.abs(a), np.abs(b))
+    small = np.where((a <= 0) == (0 <= b), 0.0, np.minimum(np.abs(a), np.abs(b)))
+    return large, small
+
+# the Hamiltonian for a velocity: a Hamiltonian is used as it is, a number or an array of the grid shape is a normal
+# speed, and a pair (u, v) of numbers or arrays (or an array of shape (2, n_x, n_y)) is a vector velocity
+def as_hamiltonian(velocity):
+    if isinstance(velocity, Hamiltonian):
+        return velocity
+    if isinstance(velocity, (tuple, list)) or np.ndim(velocity) in (1, 3):
+        u, v = velocity
+        return VectorVelocity(u, v)
+    return NormalSpeed(velocity)
@@ -0,0 +1,198 @@
+import numpy as np
+import time
+from SimFab_Ex_1_advection import advection_rate
+from SimFab_Ex_1_hamiltonian import as_hamiltonian
+from SimFab_Ex_1_velocity import VelocityField, sdf_view
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+
+# Time integration of the level-set equation with adaptive, CFL-limited time steps:
+# every step takes del_t = cfl * spacing / max|V| for the current maximum speed, shortened where needed so that every
+# requested output time is reached exactly. If the velocity vanishes everywhere the grid cannot change any more,
+# so the integration stops early and the remaining outputs are the current grid.
+# The velocity can be a number, an array of the grid shape, a vector velocity (u, v), a Hamiltonian
+# (see SimFab_Ex_1_advection), or a function velocity(phi) returning one of those that is evaluated again in every step
+# (e.g. a curvature- or normal-dependent speed). A velocity field object (SimFab_Ex_1_velocity) is also evaluated in
+# every step, but only at its active cells (and band cells). max|V| is the largest speed of the interface.
+
+# Integrators for phi_t = L(phi) with any spatial operator L (rate(phi) -> array of the shape of phi):
+#   ForwardEuler  phi + del_t L(phi)
+#   TVDRK2        Heun's method as a convex combination of Euler steps (Shu & Osher), second order
+#   TVDRK3        three-stage Shu-Osher scheme, third order
+# step() updates the state array in place; the stages are kept in buffers that are allocated on the first step and
+# reused afterwards, so the integrator itself allocates no arrays per step.
+
+class ForwardEuler:
+    stages = 1
+
+    def __init__(self):
+        self.buffers = []
+
+    # buffer number k with the shape of the state (allocated once)
+    def buffer(self, k, state):
+        while len(self.buffers) <= k:
+            self.buffers.append(None)
+        if self.buffers[k] is None or self.buffers[k].shape != state.shape:
+            self.buffers[k] = np.empty_like(state)
+        return self.buffers[k]
+
+    # one Euler step from `source` into `target`: target = source + del_t L(source)
+    def euler(self, source, target, rate, del_t):
+        np.multiply(rate(source), del_t, out = target)
+        target += source
+
+    # the rate is scaled into a buffer: the array returned by rate() can be cached or shared and is never written
+    def step(self, state, rate, del_t):
+        change = self.buffer(0, state)
+        np.multiply(rate(state), del_t, out = change)
+        state += change
+        return state
+
+class TVDRK2(ForwardEuler):
+    stages = 2
+
+    def step(self, state, rate, del_t):
+        stage_1, stage_2 = self.buffer(0, state), self.buffer(1, state)
+        self.euler(state, stage_1, rate, del_t)
+        self.euler(stage_1, stage_2, rate, del_t)
+        state += stage_2          # phi = (phi + stage 2) / 2
+        state *= 0.5
+        return state
+
+class TVDRK3(ForwardEuler):
+    stages = 3
+
+    def step(self, state, rate, del_t):
+        stage_1, stage_2, scaled = self.buffer(0, state), self.buffer(1, state), self.buffer(2, state)
+        self.euler(state, stage_1, rate, del_t)
+        self.euler(stage_1, stage_2, rate, del_t)
+        stage_2 *= 0.25           # stage 2 = 3/4 phi + 1/4 (stage 1 + del_t L(stage 1))
+        np.multiply(state, 0.75, out = scaled)
+        stage_2 += scaled
+        self.euler(stage_2, stage_1, rate, del_t)
+        stage_1 *= 2 / 3          # phi = 1/3 phi + 2/3 (stage 2 + del_t L(stage 2))
+        state *= 1 / 3
+        state += stage_1
+        return state
+
+INTEGRATORS = {'euler': ForwardEuler, 'rk2': TVDRK2, 'rk3': TVDRK3}
+
+# velocity for the current grid
+def current_velocity(velocity, phi):
+    return velocity(phi) if callable(velocity) else velocity
+
+# Narrow-band mode: only the cells of a band around the interface are stored and updated (see SimFab_Ex_1_narrowband),
+# so a step costs in proportion to the length of the interface. The interface moves at most max|V| del_t per step;
+# once it has travelled so far since the last rebuild that the stencils at the interface could reach the band edge
+# (width - stencil reach - 1 cells), the band is rebuilt around the interface and reinitialized (NarrowBandGrid.rebuild).
+
+# cells read on each side by the spatial schemes
+STENCIL_REACH = {'upwind': 1, 'eno2': 2, 'eno3': 3, 'weno5': 3}
+
+# Streaming integration of phi_t + V |grad phi| = 0, or phi_t + H = 0 (Engquist-Osher flux unless another is given, see SimFab_Ex_1_advection):
+# a generator that integrates once up to the last output time and yields (t, grid) as soon as each output time is
+# reached, so any number of snapshots costs one run to the latest time.
+# grid: initial grid (array or NarrowBandGrid), velocity: number, array or function of phi, spacing: grid spacing
+# times: increasing output times, cfl: CFL number (V del_t / spacing) of every step
+# boundary_condition, scheme, flux: as for advect(), integrator: 'euler', 'rk2' or 'rk3' (or an integrator object)
+# band: half width (in cells) of a narrow band to advect a dense grid in; a NarrowBandGrid always uses its own band.
+# The snapshots have the storage type of the input grid. copy: yield copies; with copy = False the working grid
+# itself is yielded (except for a dense grid advected in a band), only valid until the next snapshot is requested.
+# report: dictionary that is filled with the statistics of evolve() while the run proceeds
+def snapshots(grid, velocity, spacing, times, cfl = 0.5, boundary_condition = None, scheme = 'upwind', integrator = 'euler',
+              band = None, copy = True, report = None, flux = 'engquist_osher'):
+    integrator = INTEGRATORS[integrator]() if isinstance(integrator, str) else integrator
+    dense = not isinstance(grid, NarrowBandGrid)
+    # the working grid, updated in place
+    phi = NarrowBandGrid.from_dense(grid, spacing, band) if dense and band is not None else grid.copy()
+    t = 0.0
+    narrow = isinstance(phi, NarrowBandGrid)
+    if narrow:
+        # the state is the array of band values; the stages are evaluated on a second grid sharing the band cells
+        view = phi.copy()
+        travel_limit = (phi.width - STENCIL_REACH[scheme] - 1) * spacing
+        if travel_limit <= 0:
+            raise ValueError(f"the band has to be wider than {STENCIL_REACH[scheme] + 1} cells for the {scheme} scheme")
+        travelled, rebuilds, band_sizes = 0.0, 0, [(0.0, phi.band_size)]
+
+        def rate(values):
+            view.values = values
+            return advection_rate(view, current_velocity(velocity, view), spacing, boundary_condition, scheme, flux)
+    else:
+        # a velocity field sees the grid as an SDFGrid with the spacing of the run; the one of the state is built once
+        # per step, so its normals and curvature serve both the CFL speed and the first stage
+        def rate(values):
+            if isinstance(velocity, VelocityField):
+                grid = step_grid if values is state and step_grid is not None else sdf_view(values, spacing)
+                return advection_rate(grid, velocity, spacing, boundary_condition, scheme, flux)
+            return advection_rate(values, current_velocity(velocity, values), spacing, boundary_condition, scheme, flux)
+    state = phi.values if narrow else phi
+    step_grid = None
+
+    report = {} if report is None else report
+    steps, sizes, stopped = 0, [], None
+    wall_time = 0.0         # time spent in the run itself (not in the consumer of the snapshots)
+    stepping = 0.0          # wall time of the steps alone (without the copies of the outputs)
+    for target in times:
+        step_start = time.perf_counter()
+        while t < target and stopped is None:
+            if isinstance(velocity, VelocityField):
+                step_grid = None if narrow else sdf_view(state, spacing)
+                speed = velocity.max_speed(phi if narrow else step_grid)
+            else:
+                speed = as_hamiltonian(current_velocity(velocity, phi)).max_speed()
+            if speed == 0:
+                stopped = t
+                break
+            del_t = cfl * spacing / speed
+            if t + del_t * (1 + 1e-6) >= target:     # (a rounding remainder is taken into this step)
+                del_t, t = target - t, target      # the output time is hit exactly
+            else:
+                t += del_t
+            integrator.step(state, rate, del_t)
+            step_grid = None
+            steps += 1
+            sizes.append(del_t)
+            if narrow:
+                travelled += speed * del_t
+                if travelled + cfl * spacing > travel_limit:     # the next step could reach the band edge
+                    phi.rebuild()
+                    view.keys, view.row_sign = phi.keys, phi.row_sign
+                    state = phi.values
+                    travelled, rebuilds = 0.0, rebuilds + 1
+                band_sizes.append((t, phi.band_size))
+        stepping += time.perf_counter() - step_start
+        if narrow and dense:
+            snapshot = phi.to_dense()
+        else:
+            snapshot = phi.copy() if copy else phi
+        wall_time += time.perf_counter() - step_start
+        report.update({'steps': steps, 'wall_time': wall_time, 'time_per_step': stepping / max(steps, 1),
+                       'min_step': min(sizes, default = 0.0), 'max_step': max(sizes, default = 0.0), 'stopped': stopped})
+        if narrow:
+            report['rebuilds'] = rebuilds
+            report['band_sizes'] = band_sizes
+        yield target, snapshot
+
+# Integration up to the output times, collecting all snapshots (arguments as for snapshots())
+# It returns: (grids, report) - the grid at every output time, and a dictionary with 'steps', 'wall_time',
+# 'time_per_step', 'min_step', 'max_step' and 'stopped' (the time where the velocity vanished, or None);
+# in narrow-band mode also 'rebuilds' and 'band_sizes' (list of (t, number of band cells) after every step)
+def evolve(grid, velocity, spacing, times, cfl = 0.5, boundary_condition = None, scheme = 'upwind', integrator = 'euler', band = None,
+           flux = 'engquist_osher'):
+    report = {}
+    grids = [snapshot for t, snapshot in snapshots(grid, velocity, spacing, times, cfl, boundary_condition, scheme,
+                                                   integrator, band, report = report, flux = flux)]
+    return grids, report
+
+# one line summary of an evolve() report
+def report_text(report):
+    if report['steps'] == 0:
+        text = "no steps"
+    else:
+        text = f"{report['steps']} steps in {report['wall_time']:.3f} s ({report['time_per_step'] * 1e3:.2f} ms per step, del_t {report['min_step']:.3g} - {report['max_step']:.3g})"
+    if 'band_sizes' in report:
+        sizes = [size for t, size in report['band_sizes']]
+        text += f", band {min(sizes)} - {max(sizes)} cells, {report['rebuilds']} rebuilds"
+    if report['stopped'] is not None:
+        text += f", velocity vanished at t = {report['stopped']:.3g}"
+    return text
@@ -0,0 +1,210 @@
+import numpy as np
+from SimFab_Ex_1_reinit import eikonal_update_vectorized
+
+# Narrow-band storage of a level-set grid:
+# only the cells with |phi| < width * spacing are stored, as a sorted array of flat indices (i * n_y + j) and an array
+# of their values. Every other cell reads as +far or -far (far = width * spacing); its sign is the sign of the
+# nearest band cell in the same row, or a stored per-row sign for rows that do not touch the band at all.
+# Memory therefore grows with the length of the interface (plus one byte per row), not with the area of the grid.
+#
+# The object indexes like the dense array (grid[i, j], also with index arrays), so the per-point derivative, normal,
+# curvature and advection functions of Task 2 and Task 3 work on it unchanged. Writes only change band cells.
+
+class NarrowBandGrid:
+    def __init__(self, n_x, n_y, spacing, width, keys, values, row_sign):
+        self.n_x = n_x             # No. of grid points along x-axis
+        self.n_y = n_y             # No. of grid points along y-axis
+        self.spacing = spacing     # Grid spacing
+        self.width = width         # half width of the band in grid spacings
+        self.far = width * spacing         # value magnitude of every cell outside the band
+        self.keys = keys           # sorted flat indices of the band cells
+        self.values = values       # phi at the band cells
+        self.row_sign = row_sign   # sign (+1 / -1) of the rows without band cells
+
+    # builds the band from a dense grid (also a np.memmap), reading `block` rows at a time
+    @classmethod
+    def from_dense(cls, grid, spacing, width = 5, block = 256):
+        n_x, n_y = grid.shape
+        far = width * spacing
+        keys, values = [], []
+        row_sign = np.ones(n_x, dtype = np.int8)
+        for start in range(0, n_x, block):
+            rows = np.asarray(grid[start:start + block], dtype = float)
+            i, j = np.nonzero(np.abs(rows) < far)
+            keys.append((i + start) * n_y + j)
+            values.append(rows[i, j])
+            row_sign[start:start + block] = np.where(rows[:, 0] < 0, -1, 1)
+        return cls(n_x, n_y, spacing, width, np.concatenate(keys).astype(np.int64), np.concatenate(values), row_sign)
+
+    @property
+    def shape(self):
+        return (self.n_x, self.n_y)
+
+    @property
+    def band_size(self):       # number of stored cells
+        return len(self.keys)
+
+    @property
+    def nbytes(self):          # memory used by the band arrays
+        return self.keys.nbytes + self.values.nbytes + self.row_sign.nbytes
+
+    # band positions of the cells (i, j): It returns (position in keys/values, mask of the cells that are in the band)
+    def locate(self, i, j):
+        key = np.asarray(i) * self.n_y + np.asarray(j)
+        position = np.searchsorted(self.keys, key)
+        found = np.take(self.keys, position, mode = 'clip') == key if len(self.keys) else np.zeros(key.shape, dtype = bool)
+        return position, found
+
+    # sign of the cells (i, j) taken from the nearest band cell in the same row
+    def outside_sign(self, i, j, position):
+        i = np.asarray(i)
+        row_start = i * self.n_y
+        before = position - 1
+        after = np.minimum(position, len(self.keys) - 1)
+        has_before = (before >= 0) & (np.take(self.keys, before, mode = 'clip') >= row_start)
+        has_after = (position < len(self.keys)) & (np.take(self.keys, after, mode = 'clip') < row_start + self.n_y)
+        sign = np.where(has_before, np.sign(np.take(self.values, before, mode = 'clip')),
+                        np.where(has_after, np.sign(np.take(self.values, after, mode = 'clip')), self.row_sign[i]))
+        return np.where(sign == 0, 1, sign)
+
+    def check_bounds(self, i, j):
+        if np.any((np.asarray(i) < 0) | (np.asarray(i) >= self.n_x) | (np.asarray(j) < 0) | (np.asarray(j) >= self.n_y)):
+            raise IndexError(f"index out of bounds for narrow-band grid of shape {self.shape}")
+
+    def __getitem__(self, index):
+        i, j = index
+        self.check_bounds(i, j)
+        if not len(self.keys):
+            result = self.row_sign[np.asarray(i)] * self.far + 0 * np.asarray(j)
+        else:
+            position, found = self.locate(i, j)
+            inside = np.take(self.values, position, mode = 'clip')
+            result = np.where(found, inside, self.outside_sign(i, j, position) * self.far)
+        return result[()] if np.ndim(result) == 0 else result
+
+    # writes to cells outside the band are dropped: the band only changes through rebuild()
+    def __setitem__(self, index, value):
+        i, j = index
+        self.check_bounds(i, j)
+        position, found = self.locate(i, j)
+        value = np.broadcast_to(value, np.shape(position))
+        self.values[position[found]] = value[found]
+
+    def copy(self):
+        return NarrowBandGrid(self.n_x, self.n_y, self.spacing, self.width, self.keys.copy(), self.values.copy(), self.row_sign.copy())
+
+    # arithmetic with scalars or band-shaped arrays acts on the band values (e.g. simple_advance: grid - V * del_t)
+    def apply(self, function):
+        result = self.copy()
+        result.values = function(self.values)
+        return result
+
+    def __add__(self, other):
+        return self.apply(lambda values: values + other)
+
+    def __sub__(self, other):
+        return self.apply(lambda values: values - other)
+
+    def __mul__(self, other):
+        return self.apply(lambda values: values * other)
+
+    def __neg__(self):
+        result = self.apply(lambda values: -values)
+        result.row_sign = -self.row_sign
+        return result
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    # dense (n_x, n_y) array, for plotting and for code that needs the full grid
+    def to_dense(self):
+        i, j = np.divmod(np.arange(self.n_x * self.n_y).reshape(self.n_x, self.n_y), self.n_y)
+        return np.asarray(self[i, j], dtype = float)
+
+    def __array__(self, dtype = None, copy = None):
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    @property
+    def T(self):
+        return self.to_dense().T
+
+    # Band rebuild after the surface has moved (it must still lie inside the old band):
+    # the zero crossings between band cells seed a sparse Eikonal solve that recomputes the distance out to `far`,
+    # so the new band follows the interface and holds a clean signed distance again. All steps work on arrays of the
+    # band cells, so the cost grows with the length of the interface.
+    def rebuild(self):
+        if not len(self.keys):
+            return
+        n_y = self.n_y
+        i, j = np.divmod(self.keys, n_y)
+
+        # seeds: band cells next to a sign change, with the distance interpolated along x and y as in the dense solver
+        d_x = np.full(len(self.keys), np.inf)
+        d_y = np.full(len(self.keys), np.inf)
+        for axis_distance, d_i, d_j in ((d_x, 1, 0), (d_x, -1, 0), (d_y, 0, 1), (d_y, 0, -1)):
+            k, l = i + d_i, j + d_j
+            valid = (k >= 0) & (k < self.n_x) & (l >= 0) & (l < n_y)
+            neighbour = self[np.where(valid, k, i), np.where(valid, l, j)]
+            crossing = valid & (self.values * neighbour <= 0) & (self.values != neighbour)
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                theta = np.where(crossing, self.values / (self.values - neighbour), np.inf)
+            np.minimum(axis_distance, np.abs(theta) * self.spacing, out = axis_distance)
+        with np.errstate(divide = 'ignore'):
+            seed = 1 / np.sqrt(1 / d_x**2 + 1 / d_y**2)
+        seed[self.values == 0] = 0.0
+
+        # candidate cells: every cell that can be closer than `far` to a seed (up to width * sqrt(2) + 1 steps away)
+        seeds = self.keys[np.isfinite(seed)]
+        keys = seeds
+        for _ in range(int(np.ceil(self.width * np.sqrt(2))) + 1):
+            keys = np.unique(np.concatenate([keys] + [shifted for shifted in self.neighbour_keys(keys) if len(shifted)]))
+        # Jacobi iterations of the Eikonal update on the candidates, with the seeds fixed: every iteration carries the
+        # distance one cell further, the values only decrease and stop at the same discrete solution as fast marching
+        neighbours = [self.neighbour_positions(keys, d_i, d_j) for d_i, d_j in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+        distance = np.full(len(keys) + 1, np.inf)          # the last entry stands for the missing neighbours
+        fixed = np.searchsorted(keys, seeds)
+        distance[fixed] = seed[np.isfinite(seed)]
+        free = np.ones(len(keys), dtype = bool)
+        free[fixed] = False
+        for _ in range(4 * len(keys)):
+            a = np.minimum(distance[neighbours[0]], distance[neighbours[1]])
+            b = np.minimum(distance[neighbours[2]], distance[neighbours[3]])
+            update = np.where(free, np.minimum(distance[:-1], eikonal_update_vectorized(a, b, self.spacing)), distance[:-1])
+            if np.array_equal(update, distance[:-1]):
+                break
+            distance[:-1] = update
+
+        # signs come from the old representation, which is still valid away from the interface
+        inside = distance[:-1] < self.far
+        keys = keys[inside]
+        new_i, new_j = np.divmod(keys, n_y)
+        values = distance[:-1][inside] * np.where(self[new_i, new_j] < 0, -1, 1)
+
+        # rows that lose all their band cells keep the sign they had
+        empty = np.ones(self.n_x, dtype = bool)
+        empty[new_i] = False
+        rows = np.flatnonzero(empty)
+        self.row_sign[rows] = np.where(self[rows, np.zeros_like(rows)] < 0, -1, 1)
+        self.keys, self.values = keys, values
+
+    # flat indices of the 4 neighbours of the cells with flat indices `keys` that lie inside the grid (one array per direction)
+    def neighbour_keys(self, keys):
+        i, j = np.divmod(keys, self.n_y)
+        result = []
+        for d_i, d_j in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            valid = (i + d_i >= 0) & (i + d_i < self.n_x) & (j + d_j >= 0) & (j + d_j < self.n_y)
+            result.append((keys + d_i * self.n_y + d_j)[valid])
+        return result
+
+    # position in the sorted `keys` of the neighbour (d_i, d_j) of every cell, len(keys) where it is not in `keys`
+    def neighbour_positions(self, keys, d_i, d_j):
+        i, j = np.divmod(keys, self.n_y)
+        valid = (i + d_i >= 0) & (i + d_i < self.n_x) & (j + d_j >= 0) & (j + d_j < self.n_y)
+        neighbour = keys + d_i * self.n_y + d_j
+        position = np.searchsorted(keys, neighbour)
+        found = valid & (np.take(keys, position, mode = 'clip') == neighbour)
+        return np.where(found, position, len(keys))
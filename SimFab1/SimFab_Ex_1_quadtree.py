@@ -0,0 +1,358 @@
+import numpy as np
+import sys
+import time
+from SimFab_Ex_1_csg import Circle, Rectangle
+from SimFab_Ex_1_hamiltonian import as_hamiltonian
+from SimFab_Ex_1_advection import numerical_hamiltonian
+
+# Quadtree adaptive mesh refinement of a level set:
+# the domain [0, n_x * spacing] x [0, n_y * spacing] is covered by n_x x n_y root cells of size `spacing` (level 0);
+# a cell of level L has the size spacing / 2**L and splits into four children of level L + 1, down to max_level.
+# Only the leaves are stored: their level and integer position (i, j) on that level, sorted by the key
+# (level offset + i * cells per row + j), and phi at their centres. A point is found by a binary search of its key,
+# level by level, so all operations work on whole arrays of leaves.
+#
+# Refinement: a cell is split while it lies near the interface (|phi| < width * its size), or a little further out
+# (|phi| < 2 * width * its size) where the level sets bend on the scale of the cell (|curvature| * size > tolerance,
+# e.g. around the corners of a rectangle). Everything else stays coarse, so the number of leaves grows with the length
+# of the interface instead of the area of the domain. The tree is kept 2:1 balanced (leaves that share an edge or a
+# corner differ by at most one level): the interface lies in a band of finest cells, a uniform grid for the operators,
+# and the level jumps only occur away from it.
+# Derivatives: the one-sided difference to the neighbour across each face, taken between the cell centres. The
+# neighbour is the leaf of the same size or the coarser leaf across the face, or the mean of the two finer leaves along
+# the face (2:1 balance leaves no other case); at the domain boundary the difference is 0 (reflective boundary).
+# Advection: phi_t + H = 0 with the numerical fluxes of SimFab_Ex_1_advection on these differences, with a time step
+# set by the finest cells; the tree is adapted to the interface again before it can leave the band of finest cells.
+
+# cells split in a refinement: near the interface, or where the level sets bend on the scale of the cell
+def refinement(phi, curvature, size, width, tolerance):
+    return (np.abs(phi) < width * size) | ((np.abs(phi) < 2 * width * size) & (np.abs(curvature) * size > tolerance))
+
+# the signed distance function of a shape (SimFab_Ex_1_csg) or function distance(x, y)
+def distance_function(shape):
+    return shape.evaluate if hasattr(shape, 'evaluate') else shape
+
+# curvature (Laplacian) of a signed distance function at the points (x, y), with the step size
+def function_curvature(distance, x, y, size):
+    return (distance(x + size, y) + distance(x - size, y) + distance(x, y + size) + distance(x, y - size) - 4 * distance(x, y)) / size**2
+
+class QuadTree:
+    def __init__(self, n_x, n_y, spacing, max_level, level, i, j, values = None):
+        self.n_x = n_x                 # No. of root cells along x-axis
+        self.n_y = n_y                 # No. of root cells along y-axis
+        self.spacing = spacing         # size of the root cells
+        self.max_level = max_level     # level of the finest cells (size spacing / 2**max_level)
+        # first key of every level
+        self.offsets = n_x * n_y * (4**np.arange(max_level + 2, dtype = np.int64) - 1) // 3
+        self.set_leaves(level, i, j, np.zeros(len(level)) if values is None else values)
+
+    # builds the tree of a shape (SimFab_Ex_1_csg) or function distance(x, y), refined top-down from the root cells
+    # width: half width of the band around the interface in cell sizes, tolerance: |curvature| * size above which the
+    # cells near the interface are refined further
+    @classmethod
+    def from_function(cls, shape, n_x, n_y, spacing, max_level, width = 4, tolerance = 0.5):
+        distance = distance_function(shape)
+        i, j = (a.ravel() for a in np.meshgrid(np.arange(n_x), np.arange(n_y), indexing = 'ij'))
+        leaves = []
+        for level in range(max_level + 1):
+            size = spacing / 2**level
+            x, y = (i + 0.5) * size, (j + 0.5) * size
+            split = refinement(distance(x, y), function_curvature(distance, x, y, size), size, width, tolerance)
+            if level == max_level:
+                split[:] = False
+            leaves.append((np.full(np.count_nonzero(~split), level), i[~split], j[~split]))
+            i, j = children(i[split], j[split])
+        level, i, j = (np.concatenate(a) for a in zip(*leaves))
+        tree = cls(n_x, n_y, spacing, max_level, level, i, j)
+        tree.balance(distance)
+        tree.values = distance(*tree.centres())
+        return tree
+
+    # sets the leaves in key order and drops the cached neighbour tables
+    # fields: further per-leaf arrays, returned in the new order
+    def set_leaves(self, level, i, j, values, fields = ()):
+        keys = self.offsets[level] + i * (self.n_y << level.astype(np.int64)) + j
+        order = np.argsort(keys)
+        self.keys = keys[order]
+        self.level, self.i, self.j, self.values = level[order], i[order], j[order], values[order]
+        self.stencil = None
+        return tuple(field[order] for field in fields)
+
+    @property
+    def cell_count(self):
+        return len(self.keys)
+
+    @property
+    def finest_spacing(self):
+        return self.spacing / 2**self.max_level
+
+    @property
+    def size(self):        # size of every leaf
+        return self.spacing / 2.0**self.level
+
+    # cell centres of the leaves: It returns (x, y)
+    def centres(self):
+        size = self.size
+        return (self.i + 0.5) * size, (self.j + 0.5) * size
+
+    # the leaves containing the points (x, y): It returns their positions in the leaf arrays, -1 outside the domain
+    # (the levels are searched from the finest one, where most leaves are, and only for the points not found yet)
+    def locate(self, x, y):
+        x, y = np.broadcast_arrays(np.asarray(x, dtype = float), np.asarray(y, dtype = float))
+        result = np.full(x.shape, -1, dtype = np.int64)
+        inside = (x >= 0) & (x < self.n_x * self.spacing) & (y >= 0) & (y < self.n_y * self.spacing)
+        remaining = np.flatnonzero(inside)
+        x, y, flat = x.ravel(), y.ravel(), result.reshape(-1)
+        for level in range(self.max_level, -1, -1):
+            if not len(remaining):
+                break
+            size = self.spacing / 2**level
+            key = self.offsets[level] + (x[remaining] // size).astype(np.int64) * (self.n_y << level) + (y[remaining] // size).astype(np.int64)
+            position = np.searchsorted(self.keys, key)
+            found = np.take(self.keys, position, mode = 'clip') == key
+            flat[remaining[found]] = position[found]
+            remaining = remaining[~found]
+        return result
+
+    # Neighbour tables (computed once per tree and kept until the leaves change):
+    # for every axis and side, the two leaves across the face (the same leaf twice unless there are two finer leaves)
+    # and the distance between the cell centres along the axis (inf at the domain boundary, where the leaf itself is used)
+    def neighbours(self):
+        if self.stencil is None:
+            x, y = self.centres()
+            size = self.size
+            reach = size / 2 + self.finest_spacing / 2      # centre of the nearest finest cell across the face
+            own = np.arange(self.cell_count)
+            self.stencil = []
+            for axis in (0, 1):
+                centre = (x, y)[axis]
+                for side in (-1, 1):
+                    # the leaf across the face a quarter of the cell size above the middle of the face
+                    d_x, d_y = (side * reach, size / 4) if axis == 0 else (size / 4, side * reach)
+                    first = self.locate(x + d_x, y + d_y)
+                    missing = first < 0
+                    first = np.where(missing, own, first)
+                    # a finer leaf there: the other one along the face is its sibling one cell lower in a balanced
+                    # tree; otherwise (a tree that is being balanced) the leaf a quarter below the middle is searched
+                    second = first.copy()
+                    finer = np.flatnonzero(self.level[first] > self.level)
+                    sibling = first[finer]
+                    level = self.level[sibling]
+                    key = self.offsets[level] + (self.i[sibling] - axis) * (self.n_y << level) + self.j[sibling] - (1 - axis)
+                    position = np.searchsorted(self.keys, key)
+                    found = np.take(self.keys, position, mode = 'clip') == key
+                    second[finer[found]] = position[found]
+                    lost = finer[~found]
+                    if len(lost):
+                        lower_x, lower_y = (x + d_x, y - size / 4) if axis == 0 else (x - size / 4, y + d_y)
+                        second[lost] = self.locate(lower_x[lost], lower_y[lost])
+                    distance = np.abs((centre[first] + centre[second]) / 2 - centre)
+                    distance[missing] = np.inf
+                    self.stencil.append((first, second, distance))
+        return self.stencil
+
+    # one-sided differences of phi at every leaf: It returns (D-x, D+x, D-y, D+y)
+    # gradient: (phi_x, phi_y) of the leaves, to move the values of the neighbours onto the axis through the cell centre
+    # (a coarser neighbour is half a cell off); without it the differences are only first order at the level jumps
+    def one_sided_derivatives(self, gradient = None):
+        values = self.values
+        centres = self.centres()
+        D = []
+        for k, (first, second, distance) in enumerate(self.neighbours()):
+            neighbour = (values[first] + values[second]) / 2
+            if gradient is not None:
+                across = 1 - k // 2
+                g, t = gradient[across], centres[across]
+                neighbour = neighbour - (g[first] * (t[first] - t) + g[second] * (t[second] - t)) / 2
+            difference = (neighbour - values) / distance
+            D.append(difference if k % 2 else -difference)
+        return tuple(D)
+
+    # central gradient of phi at every leaf: It returns (phi_x, phi_y)
+    def gradient(self):
+        D = self.one_sided_derivatives()
+        return (D[0] + D[1]) / 2, (D[2] + D[3]) / 2
+
+    # curvature of the level sets through every leaf (Laplacian of phi, phi being a signed distance)
+    def curvature(self):
+        D = self.one_sided_derivatives(self.gradient())
+        stencil = self.neighbours()
+        curvature = np.zeros(self.cell_count)
+        for axis in (0, 1):
+            (_, _, before), (_, _, after) = stencil[2 * axis], stencil[2 * axis + 1]
+            span = np.where(np.isinf(before), after, np.where(np.isinf(after), before, (before + after) / 2))
+            curvature += (D[2 * axis + 1] - D[2 * axis]) / span
+        return curvature
+
+    # phi at the points (x, y): the value of the leaf containing the point, linearly continued with its central gradient
+    def sample(self, x, y):
+        leaf = self.locate(x, y)
+        if np.any(leaf < 0):
+            raise IndexError("points outside the domain of the quadtree")
+        phi_x, phi_y = self.gradient()
+        centre_x, centre_y = self.centres()
+        return self.values[leaf] + phi_x[leaf] * (x - centre_x[leaf]) + phi_y[leaf] * (y - centre_y[leaf])
+
+    # the level set sampled on a uniform grid (points at multiples of the spacing, as the SDFGrid of Task 1)
+    def to_grid(self, spacing):
+        x = np.arange(int(round(self.n_x * self.spacing / spacing))) * spacing
+        y = np.arange(int(round(self.n_y * self.spacing / spacing))) * spacing
+        return self.sample(x[:, None] + 0 * y[None, :], y[None, :] + 0 * x[:, None])
+
+    # splits the marked leaves into their four children
+    # distance: function distance(x, y) for the values of the children, otherwise they continue the parent linearly
+    # fields: (phi_x, phi_y, further per-leaf arrays) of the leaves, inherited by the children and returned in the new
+    # order; the gradient is computed if they are not given
+    def split(self, mask, distance = None, fields = None):
+        i, j = children(self.i[mask], self.j[mask])
+        level = np.repeat(self.level[mask] + 1, 4)
+        size = self.spacing / 2.0**level
+        x, y = (i + 0.5) * size, (j + 0.5) * size
+        if fields is None and distance is None:
+            fields = self.gradient()
+        fields = fields or ()
+        if distance is not None:
+            values = distance(x, y)
+        else:
+            phi_x, phi_y = (np.repeat(g[mask], 4) for g in fields[:2])
+            centre_x, centre_y = (np.repeat(c[mask], 4) for c in self.centres())
+            values = np.repeat(self.values[mask], 4) + phi_x * (x - centre_x) + phi_y * (y - centre_y)
+        keep = ~mask
+        return self.set_leaves(np.concatenate((self.level[keep], level)), np.concatenate((self.i[keep], i)),
+                               np.concatenate((self.j[keep], j)), np.concatenate((self.values[keep], values)),
+                               [np.concatenate((field[keep], np.repeat(field[mask], 4))) for field in fields])
+
+    # merges every group of four sibling leaves that are all marked into their parent (with the mean value)
+    # fields: further per-leaf arrays, averaged like the values
+    # It returns: the fields in the new order, or None if no leaves were merged
+    def coarsen(self, mask, fields = ()):
+        candidates = np.flatnonzero(mask & (self.level > 0))
+        parents = self.offsets[self.level[candidates] - 1] + (self.i[candidates] >> 1) * (self.n_y << (self.level[candidates] - 1)) + (self.j[candidates] >> 1)
+        group, count = np.unique(parents, return_inverse = True, return_counts = True)[1:]
+        merged = count[group] == 4
+        if not np.any(merged):
+            return None
+        members = candidates[merged][np.argsort(group[merged], kind = 'stable')]      # the four siblings one after another
+        keep = np.ones(self.cell_count, dtype = bool)
+        keep[members] = False
+        parent = members[::4]
+        return self.set_leaves(np.concatenate((self.level[keep], self.level[parent] - 1)), np.concatenate((self.i[keep], self.i[parent] >> 1)),
+                               np.concatenate((self.j[keep], self.j[parent] >> 1)),
+                               np.concatenate((self.values[keep], self.values[members].reshape(-1, 4).mean(axis = 1))),
+                               [np.concatenate((field[keep], field[members].reshape(-1, 4).mean(axis = 1))) for field in fields])
+
+    # 2:1 balance: splits every leaf that is more than one level coarser than a leaf sharing an edge or a corner with it
+    # (the edges are checked with the neighbour tables, which the derivatives then use, and the corners by search)
+    def balance(self, distance = None):
+        while True:
+            coarse = np.zeros(self.cell_count, dtype = bool)
+            for first, second, _ in self.neighbours():
+                for neighbour in (first, second):
+                    coarse[neighbour[self.level[neighbour] < self.level - 1]] = True
+            deep = np.flatnonzero(self.level >= 2)         # only these can have a leaf two levels coarser
+            x, y = (c[deep] for c in self.centres())
+            reach = self.size[deep] / 2 + self.finest_spacing / 2
+            for d_x, d_y in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                neighbour = self.locate(x + d_x * reach, y + d_y * reach)
+                valid = neighbour >= 0
+                too_coarse = self.level[neighbour[valid]] < self.level[deep[valid]] - 1
+                coarse[neighbour[valid][too_coarse]] = True
+            if not np.any(coarse):
+                return
+            self.split(coarse, distance)
+
+    # adapts the tree to the current level set: splits the leaves that meet the refinement condition and merges the
+    # groups of four whose parent does not meet it, both repeatedly (so a band that moved into coarse cells reaches the
+    # finest level, and the cells it left return to the coarsest level they need). Gradient and curvature are computed
+    # once; new leaves inherit them, so the neighbour tables are only built again for the balance.
+    def adapt(self, width = 4, tolerance = 0.5):
+        fields = self.gradient() + (self.curvature(),)
+        for _ in range(self.max_level):
+            split = refinement(self.values, fields[2], self.size, width, tolerance) & (self.level < self.max_level)
+            if not np.any(split):
+                break
+            fields = self.split(split, fields = fields)
+        for _ in range(self.max_level):
+            fields = self.coarsen(~refinement(self.values, fields[2], 2 * self.size, width, tolerance), fields)
+            if fields is None:
+                break
+        self.balance()
+
+    # the speeds at the leaves: a number, an array with one value per leaf, a pair (u, v) of those, or a function
+    # velocity(x, y) of the cell centres
+    def leaf_velocity(self, velocity):
+        return velocity(*self.centres()) if callable(velocity) else velocity
+
+    # the change of phi per unit time, -H (flux: one of SimFab_Ex_1_advection.FLUXES)
+    def advection_rate(self, velocity, flux = 'engquist_osher'):
+        return -numerical_hamiltonian(as_hamiltonian(self.leaf_velocity(velocity)), self.one_sided_derivatives(), flux)
+
+# the four children (i, j) on the next level of the cells (i, j), in the order of the cells
+def children(i, j):
+    d_i, d_j = np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1])
+    return (2 * i[:, None] + d_i).ravel(), (2 * j[:, None] + d_j).ravel()
+
+# Advection of the tree level set up to t_end (forward Euler, first-order upwind differences, as in Task 3)
+# tree: QuadTree (changed in place), velocity: see QuadTree.leaf_velocity, cfl: time step in finest cells per max speed
+# width, tolerance: the refinement condition of QuadTree.adapt; the tree is adapted whenever the interface has moved
+# width - 1 finest cells since the last adaption, so it never leaves the band of finest cells
+# It returns: report dictionary with 'steps', 'adapts', 'cells' (largest number of leaves), 'wall_time' and 'time_per_step'
+def evolve(tree, velocity, t_end, cfl = 0.5, flux = 'engquist_osher', width = 4, tolerance = 0.5):
+    start = time.perf_counter()
+    t, travelled = 0.0, 0.0
+    report = {'steps': 0, 'adapts': 0, 'cells': tree.cell_count}
+    while t < t_end:
+        speed = as_hamiltonian(tree.leaf_velocity(velocity)).max_speed()
+        if speed == 0:
+            break
+        del_t = min(cfl * tree.finest_spacing / speed, t_end - t)
+        tree.values = tree.values + del_t * tree.advection_rate(velocity, flux)
+        t += del_t
+        travelled += speed * del_t
+        report['steps'] += 1
+        if travelled > (width - 1) * tree.finest_spacing and t < t_end:
+            tree.adapt(width, tolerance)
+            travelled = 0.0
+            report['adapts'] += 1
+            report['cells'] = max(report['cells'], tree.cell_count)
+    report['wall_time'] = time.perf_counter() - start
+    report['time_per_step'] = report['wall_time'] / max(report['steps'], 1)
+    return report
+
+def main():     # python SimFab_Ex_1_quadtree.py x-size y-size [Circle / Rectangle] [x, y of the centre / corner] [finest spacing] [time]
+    args = sys.argv[1:]
+    if len(args) < 5:
+        print("Provide the following values: [x-size(n_x) y-size(n_y)] [Circle / Rectangle] [x, y of the centre / corner] [finest spacing] [time]")
+        return
+    n_x, n_y, name = int(args[0]), int(args[1]), args[2]
+    corner = (float(args[3]), float(args[4]))
+    finest = float(args[5]) if len(args) > 5 else 0.25
+    t = float(args[6]) if len(args) > 6 else 1.0
+    if name == "Circle":
+        shape = Circle(corner, 10)      # radius fixed at 10, as in Task 3
+    elif name == "Rectangle":
+        shape = Rectangle(corner, (corner[0] + 5, corner[1] + 20))
+    else:
+        print("Error: shape has to be Circle or Rectangle")
+        return
+
+    # root cells of 8 units (or the largest power of 2 below that dividing the domain), refined down to the finest spacing
+    root = 8.0
+    while root > 1 and (n_x % root or n_y % root):
+        root /= 2
+    max_level = max(int(round(np.log2(root / finest))), 0)
+    tree = QuadTree.from_function(shape, int(n_x // root), int(n_y // root), root, max_level)
+    uniform = int(round(n_x / tree.finest_spacing)) * int(round(n_y / tree.finest_spacing))
+    print(f"{tree.cell_count} leaves (levels 0 - {max_level}, finest spacing {tree.finest_spacing:g}) against {uniform} cells "
+          f"of the uniform grid ({tree.cell_count / uniform:.1%})")
+
+    # V = 1 moves the interface out by t: the exact level set at the interface is the initial distance minus t
+    report = evolve(tree, 1.0, t)
+    x, y = tree.centres()
+    near = np.abs(tree.values) < tree.size
+    error = np.max(np.abs(tree.values - (shape.evaluate(x, y) - t))[near])
+    print(f"V = 1 up to t = {t:g}: {report['steps']} steps in {report['wall_time']:.3f} s, {report['adapts']} adaptions, "
+          f"{tree.cell_count} leaves, largest error at the interface {error:.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import numpy as np
+import sys
+import time
+from SimFab_Ex_1_Task2 import SDFGrid
+from SimFab_Ex_1_gridio import read_any
+
+# Batched off-grid queries of distance, normal and curvature:
+# the fields are computed once for the whole grid (and cached on the SDFGrid, see SDFGrid.derived()), then evaluated
+# at arbitrary points by bilinear or bicubic (Catmull-Rom) interpolation, vectorized over all points. Interpolated
+# normals are normalized again. Points outside the grid are clamped to its edge.
+# A query file (.csv / .txt with x, y per line, or .npy of shape (m, 2)) can be answered in one run from the command line.
+
+# fractional grid index of coordinates along one axis, clamped to the grid
+def grid_position(coordinate, origin, spacing, n):
+    return np.clip((np.asarray(coordinate, dtype = float) - origin) / spacing, 0, n - 1)
+
+# base index and offset of every position for a stencil of the grid cell that contains it
+def cell(position, n):
+    base = np.minimum(np.floor(position).astype(np.intp), max(n - 2, 0))
+    return base, position - base
+
+# Catmull-Rom weights of the points base - 1 .. base + 2 for the offset t
+def cubic_weights(t):
+    t2, t3 = t * t, t * t * t
+    return (-0.5 * t3 + t2 - 0.5 * t, 1.5 * t3 - 2.5 * t2 + 1, -1.5 * t3 + 2 * t2 + 0.5 * t, 0.5 * t3 - 0.5 * t2)
+
+# Interpolation of a grid field at points:
+# field: (n_x, n_y) array, x, y: coordinate arrays, method: 'bilinear' or 'bicubic'
+# It returns: array of the interpolated values (shape of x)
+def interpolate(field, x, y, spacing, origin = (0.0, 0.0), method = 'bilinear'):
+    n_x, n_y = field.shape
+    i, t = cell(grid_position(x, origin[0], spacing, n_x), n_x)
+    j, s = cell(grid_position(y, origin[1], spacing, n_y), n_y)
+    if method == 'bilinear':
+        i1, j1 = np.minimum(i + 1, n_x - 1), np.minimum(j + 1, n_y - 1)
+        return ((1 - t) * (1 - s) * field[i, j] + t * (1 - s) * field[i1, j]
+                + (1 - t) * s * field[i, j1] + t * s * field[i1, j1])
+    elif method == 'bicubic':
+        w_x, w_y = cubic_weights(t), cubic_weights(s)
+        result = np.zeros(np.shape(t))
+        for a in range(4):
+            row = np.clip(i + a - 1, 0, n_x - 1)      # the stencil is clamped at the edges
+            for b in range(4):
+                result += w_x[a] * w_y[b] * field[row, np.clip(j + b - 1, 0, n_y - 1)]
+        return result
+    raise ValueError("method has to be 'bilinear' or 'bicubic'")
+
+# Query of distance, unit normal and curvature at points:
+# grid: Task 2 SDFGrid, points: (m, 2) array of coordinates, chunk: points per pass (limits the temporary memory)
+# It returns: dictionary with 'distance' (m,), 'normal' (m, 2), 'curvature' (m,)
+def query(grid, points, method = 'bilinear', origin = (0.0, 0.0), chunk = 2**20):
+    points = np.asarray(points, dtype = float).reshape(-1, 2)
+    fields = {'distance': np.asarray(grid.grid), 'curvature': grid.curvature_field()}
+    normal_x, normal_y = grid.normal_field()
+    result = {'distance': np.empty(len(points)), 'normal': np.empty((len(points), 2)), 'curvature': np.empty(len(points))}
+    for start in range(0, len(points), chunk):
+        x, y = points[start:start + chunk, 0], points[start:start + chunk, 1]
+        for name, field in fields.items():
+            result[name][start:start + chunk] = interpolate(field, x, y, grid.spacing, origin, method)
+        n = np.column_stack((interpolate(normal_x, x, y, grid.spacing, origin, method), interpolate(normal_y, x, y, grid.spacing, origin, method)))
+        length = np.sqrt(np.sum(n**2, axis = 1, keepdims = True))
+        result['normal'][start:start + chunk] = np.divide(n, length, out = np.zeros_like(n), where = length > 0)
+    return result
+
+# points from a query file: .npy (m, 2) array, or text with x, y per line (comma separated, '#' comments)
+def read_points(filename):
+    if filename.endswith('.npy'):
+        return np.load(filename).reshape(-1, 2)
+    return np.loadtxt(filename, delimiter = ',', ndmin = 2)[:, :2]
+
+# writes the results as columns x, y, distance, normal_x, normal_y, curvature (.npy or .csv)
+def save_results(filename, points, result):
+    table = np.column_stack((points, result['distance'], result['normal'], result['curvature']))
+    if filename.endswith('.npy'):
+        np.save(filename, table)
+    else:
+        np.savetxt(filename, table, delimiter = ',', header = 'x,y,distance,normal_x,normal_y,curvature')
+
+def main():     # command line: ./query grid.sdf points.csv [bilinear / bicubic] [results.csv]
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print("Provide the following values: [grid.sdf / grid.csv] [points.csv / points.npy] [bilinear / bicubic] [results.csv / results.npy]")
+        return
+    values, header = read_any(args[0])
+    method = args[2] if len(args) > 2 else 'bilinear'
+    output = args[3] if len(args) > 3 else args[1].rsplit('.', 1)[0] + '_results.csv'
+    grid = SDFGrid(values.shape[0], values.shape[1], header.get('spacing', 1.0))
+    grid.boundary_condition = header.get('boundary_condition')
+    grid.grid = values
+
+    points = read_points(args[1])
+    start = time.perf_counter()
+    result = query(grid, points, method, tuple(header.get('origin', (0.0, 0.0))))
+    print(f"{len(points)} points ({method}) in {time.perf_counter() - start:.3f} s")
+    save_results(output, points, result)
+    print(f"Saved results to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import numpy as np
+import heapq
+import math
+from SimFab_Ex_1_backend import register, kernel
+
+# Reinitialization (redistancing) of a level-set grid:
+# rebuilds a signed distance function from the zero level set of `grid` after advection has distorted it.
+# Two solvers of the Eikonal equation |grad(phi)| = 1 are provided:
+#   fast_marching  - Dijkstra-like front propagation with a heap, O(N log N)
+#   fast_sweeping  - Gauss-Seidel sweeps in alternating directions, O(N) per sweep, vectorized along lines
+# Both accept an optional narrow-band width `band`: only cells closer than `band` to the interface are
+# recomputed, cells further away keep their sign and are clamped to at least `band` in magnitude.
+
+# distance estimates for the cells next to the zero level set, from linear interpolation of the crossings
+# It returns: (distance, interface) - unsigned distance (inf away from the interface) and the mask of interface cells
+def interface_distance(grid, spacing):
+    n_x, n_y = grid.shape
+    d_x = np.full(grid.shape, np.inf)
+    d_y = np.full(grid.shape, np.inf)
+
+    # crossings between neighbours along x: phi changes sign (or touches zero) between i and i+1
+    left, right = grid[:-1, :], grid[1:, :]
+    crossing = (left * right <= 0) & (left != right)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.where(crossing, left / (left - right), np.inf)     # fraction of the spacing from the left cell to the crossing
+    d_x[:-1, :] = np.minimum(d_x[:-1, :], np.abs(theta) * spacing)
+    d_x[1:, :] = np.minimum(d_x[1:, :], np.abs(1 - theta) * spacing)
+
+    # crossings along y
+    bottom, top = grid[:, :-1], grid[:, 1:]
+    crossing = (bottom * top <= 0) & (bottom != top)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.where(crossing, bottom / (bottom - top), np.inf)
+    d_y[:, :-1] = np.minimum(d_y[:, :-1], np.abs(theta) * spacing)
+    d_y[:, 1:] = np.minimum(d_y[:, 1:], np.abs(1 - theta) * spacing)
+
+    # distance to the local straight interface through both crossings: 1/d^2 = 1/d_x^2 + 1/d_y^2
+    with np.errstate(divide='ignore'):
+        distance = 1 / np.sqrt(1 / d_x**2 + 1 / d_y**2)
+    distance[grid == 0] = 0.0
+    interface = np.isfinite(distance)
+    return distance, interface
+
+# upwind solution of the discrete Eikonal equation at one cell from its smallest x- and y-neighbours a and b
+def eikonal_update(a, b, spacing):
+    if a > b:
+        a, b = b, a
+    if b - a >= spacing:
+        return a + spacing
+    return 0.5 * (a + b + math.sqrt(2 * spacing**2 - (a - b)**2))
+
+# array version of eikonal_update (a, b may contain inf)
+def eikonal_update_vectorized(a, b, spacing):
+    low = np.minimum(a, b)
+    high = np.maximum(a, b)
+    one_sided = low + spacing
+    with np.errstate(invalid='ignore'):
+        gap = high - low      # nan where both neighbours are still unknown (inf)
+        two_sided = 0.5 * (low + high + np.sqrt(np.maximum(2 * spacing**2 - gap**2, 0)))
+        return np.where(gap < spacing, two_sided, one_sided)
+
+# restores the sign of the input grid and clamps the cells outside the narrow band
+def signed_result(grid, distance, band):
+    if band is not None:
+        distance = np.where(distance < band, distance, np.maximum(np.abs(grid), band))
+    return np.where(grid < 0, -distance, distance)
+
+# Fast marching method:
+# grid: level-set values (n_x, n_y), spacing: grid spacing, band: optional narrow-band width
+# It returns: the reinitialized signed distance grid
+def fast_marching(grid, spacing, band = None):
+    n_x, n_y = grid.shape
+    distance, known = interface_distance(grid, spacing)
+    distance = distance.copy()
+    limit = np.inf if band is None else band
+
+    # the heap holds tentative distances of the "trial" cells surrounding the known region
+    heap = []
+    neighbours = ((1, 0), (-1, 0), (0, 1), (0, -1))
+    for i, j in zip(*np.nonzero(known)):
+        for d_i, d_j in neighbours:
+            k, l = i + d_i, j + d_j
+            if 0 <= k < n_x and 0 <= l < n_y and not known[k, l]:
+                trial = fast_marching_update(distance, known, k, l, spacing)
+                if trial < distance[k, l]:
+                    distance[k, l] = trial
+                    heapq.heappush(heap, (trial, k, l))
+
+    while heap:
+        d, i, j = heapq.heappop(heap)
+        if known[i, j] or d > distance[i, j]:
+            continue       # an outdated heap entry
+        if d > limit:
+            break          # everything left is outside the narrow band
+        known[i, j] = True
+        for d_i, d_j in neighbours:
+            k, l = i + d_i, j + d_j
+            if 0 <= k < n_x and 0 <= l < n_y and not known[k, l]:
+                trial = fast_marching_update(distance, known, k, l, spacing)
+                if trial < distance[k, l]:
+                    distance[k, l] = trial
+                    heapq.heappush(heap, (trial, k, l))
+
+    distance[~known] = np.inf
+    return signed_result(grid, distance, band)
+
+# tentative distance of cell (i, j) from its already known neighbours
+def fast_marching_update(distance, known, i, j, spacing):
+    n_x, n_y = distance.shape
+    a = min(distance[i - 1, j] if i > 0 and known[i - 1, j] else np.inf,
+            distance[i + 1, j] if i < n_x - 1 and known[i + 1, j] else np.inf)
+    b = min(distance[i, j - 1] if j > 0 and known[i, j - 1] else np.inf,
+            distance[i, j + 1] if j < n_y - 1 and known[i, j + 1] else np.inf)
+    return eikonal_update(a, b, spacing)
+
+# Fast sweeping method:
+# Gauss-Seidel sweeps in the four diagonal orderings (+x+y, -x+y, -x-y, +x-y). Within one ordering a cell only depends
+# on cells of the previous anti-diagonal, so every anti-diagonal is updated at once as an array operation.
+# grid: level-set values, spacing: grid spacing, band: optional narrow-band width,
+# max_sweeps: upper limit for the number of sweep rounds, tolerance: stop when no value changes more than this
+# It returns: the reinitialized signed distance grid
+def fast_sweeping(grid, spacing, band = None, max_sweeps = 20, tolerance = 1e-12):
+    n_x, n_y = grid.shape
+    distance, interface = interface_distance(grid, spacing)
+    active = ~interface        # interface cells keep their interpolated distance
+    if band is not None:
+        # first-order estimate of the distance (phi / |grad phi|) decides which cells lie in the band
+        D_x, D_y = np.gradient(grid, spacing)
+        estimate = np.abs(grid) / np.maximum(np.sqrt(D_x**2 + D_y**2), 1e-12)
+        reach = band + 2 * spacing       # with a safety margin of two cells
+        active &= estimate < reach
+
+    # working array with a frame of inf cells, so that every cell has four neighbours
+    padded = np.full((n_x + 2, n_y + 2), np.inf)
+    padded[1:-1, 1:-1] = distance
+    active_padded = np.zeros((n_x + 2, n_y + 2), dtype = bool)
+    active_padded[1:-1, 1:-1] = active
+
+    while True:
+        orderings = [(padded[::s_x, ::s_y], diagonal_indices(active_padded[::s_x, ::s_y])) for s_x, s_y in ((1, 1), (-1, 1), (-1, -1), (1, -1))]
+        sweep = kernel('sweep')
+        for _ in range(max_sweeps):
+            previous = padded.copy()
+            for view, (i, j) in orderings:
+                sweep(view, i, j, spacing)
+            if np.allclose(padded, previous, rtol = 0, atol = tolerance):
+                break
+        if band is None:
+            break
+
+        # the estimate above is only first order: if cells left out of the band turn out to be closer than `band`,
+        # the band is widened and the sweeps are repeated until it is complete
+        missing = ~active_padded[1:-1, 1:-1] & ~interface & (neighbour_update(padded, spacing) < band)
+        if not missing.any():
+            break
+        reach *= 1.5
+        active_padded[1:-1, 1:-1] |= missing | (~interface & (estimate < reach))
+
+    return signed_result(grid, padded[1:-1, 1:-1], band)
+
+# Eikonal update of every interior cell of a padded distance array from its four neighbours
+def neighbour_update(padded, spacing):
+    a = np.minimum(padded[:-2, 1:-1], padded[2:, 1:-1])
+    b = np.minimum(padded[1:-1, :-2], padded[1:-1, 2:])
+    return eikonal_update_vectorized(a, b, spacing)
+
+# active cells of a (padded) grid grouped by anti-diagonal i + j, in sweeping order
+# cells of the active mask sorted by diagonal (i + j)
+# It returns: (i, j) index arrays
+def diagonal_indices(active):
+    i, j = np.nonzero(active)
+    order = np.argsort(i + j, kind = 'stable')
+    return i[order], j[order]
+
+# one Gauss-Seidel sweep over the anti-diagonals of `distance` (a possibly flipped view, updated in place)
+def sweep_diagonals(distance, diagonals, spacing):
+    for i, j in diagonals:
+        a = np.minimum(distance[i - 1, j], distance[i + 1, j])
+        b = np.minimum(distance[i, j - 1], distance[i, j + 1])
+        distance[i, j] = np.minimum(distance[i, j], eikonal_update_vectorized(a, b, spacing))
+
+# loop version of sweep_diagonals for the kernel backends: the cells of all diagonals in one list (i, j), updated one by
+# one in the same order (cells of one diagonal do not depend on each other, so this gives the same values)
+def sweep_cells(distance, i, j, spacing):
+    for k in range(i.shape[0]):
+        x, y = i[k], j[k]
+        a = min(distance[x - 1, y], distance[x + 1, y])
+        b = min(distance[x, y - 1], distance[x, y + 1])
+        low = min(a, b)
+        if low == math.inf:   # both neighbours still unknown
+            continue
+        high = max(a, b)
+        gap = high - low
+        if gap < spacing:
+            update = 0.5 * (low + high + math.sqrt(max(2 * spacing**2 - gap * gap, 0.0)))
+        else:
+            update = low + spacing
+        distance[x, y] = min(distance[x, y], update)
+
+def sweep_cells_numpy(distance, i, j, spacing):
+    sweep_diagonals(distance, diagonal_split(i, j), spacing)
+
+# splits a list of cells sorted by i + j into its diagonals
+def diagonal_split(i, j):
+    split = np.flatnonzero(np.diff(i + j)) + 1
+    return list(zip(np.split(i, split), np.split(j, split)))
+
+register('sweep', sweep_cells_numpy, sweep_cells)
+
+# reinitialization with the method selected by name ('fast_marching' or 'fast_sweeping')
+def reinitialize(grid, spacing, method = 'fast_marching', band = None):
+    if method == 'fast_marching':
+        return fast_marching(grid, spacing, band)
+    elif method == 'fast_sweeping':
+        return fast_sweeping(grid, spacing, band)
+    raise ValueError(f"Unknown reinitialization method: {method}")
@@ -0,0 +1,135 @@
+import numpy as np
+import multiprocessing
+import os
+import sys
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.image import imsave
+from SimFab_Ex_1_contour import marching_squares
+from SimFab_Ex_1_gridio import load_grid, load_series
+
+# Headless frame rendering for SDF and advection plots:
+# one Agg figure (no pyplot, no window, nothing blocks) is built once with its artists - the SDF image, the zero contour
+# and the title - and every frame only replaces their data before the canvas is drawn again. Frames can be rendered by
+# a pool of worker processes (each with its own figure), written as an image sequence, or collected into an animation.
+# The zero contour comes from the marching squares of SimFab_Ex_1_contour, so no contour plot is recomputed per frame.
+
+class FrameRenderer:
+    def __init__(self, size = (8, 6), dpi = 100, cmap = 'RdYlBu', limits = None, compression = 1):
+        # size: figure size in inches, limits: fixed (vmin, vmax) of the colour scale, otherwise each frame is scaled to its data
+        # compression: PNG compression level 0 - 9 (encoding at the default level 6 takes longer than drawing the frame)
+        self.figure = Figure(figsize = size, dpi = dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        self.image = self.axes.imshow(np.zeros((2, 2)), origin = 'lower', cmap = cmap, interpolation = 'bilinear', aspect = 'auto')
+        self.colorbar = self.figure.colorbar(self.image, ax = self.axes, label = 'Signed Distance')
+        self.contour = LineCollection([], colors = 'black')
+        self.axes.add_collection(self.contour)
+        self.axes.set_xlabel('X')
+        self.axes.set_ylabel('Y')
+        self.axes.grid(True)
+        self.limits = limits
+        self.compression = compression
+
+    # updates the artists with a new grid (values indexed [x, y]) and draws the canvas
+    def update(self, grid, title = '', spacing = 1.0):
+        grid = np.asarray(grid, dtype = float)
+        n_x, n_y = grid.shape
+        self.image.set_data(grid.T)
+        self.image.set_extent((0, (n_x - 1) * spacing, 0, (n_y - 1) * spacing))
+        self.image.set_clim(*(self.limits or (grid.min(), grid.max())))
+        vertices, segments = marching_squares(grid, spacing)
+        self.contour.set_segments(vertices[segments])
+        self.axes.set_xlim(0, (n_x - 1) * spacing)
+        self.axes.set_ylim(0, (n_y - 1) * spacing)
+        self.axes.set_title(title)
+        self.canvas.draw()
+
+    # the current frame as an RGBA array
+    def pixels(self):
+        return np.asarray(self.canvas.buffer_rgba())
+
+    # renders one grid into an image file (png, jpg, ... from the extension)
+    def render(self, grid, title, filename, spacing = 1.0):
+        self.update(grid, title, spacing)
+        options = {'compress_level': self.compression} if filename.endswith('.png') else {}
+        imsave(filename, self.pixels()[..., :3], pil_kwargs = options)
+
+# per-process renderer of the worker pool
+renderer = {}
+
+def start_renderer(options):
+    renderer['frame'] = FrameRenderer(**options)
+
+# a frame is either a grid array or the name of a .sdf / .csv grid file (cheaper to send to the workers)
+def read_frame(frame):
+    if isinstance(frame, str):
+        if frame.endswith('.csv'):
+            return np.loadtxt(frame, delimiter = ',')
+        return load_grid(frame)[0]
+    return frame
+
+def render_job(job):
+    frame, title, filename, spacing = job
+    renderer['frame'].render(read_frame(frame), title, filename, spacing)
+    return filename
+
+# renders many frames into image files across a pool of worker processes
+# frames: grid arrays or grid file names, titles / filenames: one per frame, workers: number of processes (default: all cores)
+# options: keyword arguments for FrameRenderer (size, dpi, cmap, limits)
+# It returns: the list of written file names
+def render_frames(frames, titles, filenames, spacing = 1.0, workers = None, **options):
+    jobs = list(zip(frames, titles, filenames, [spacing] * len(filenames)))
+    workers = min(workers or os.cpu_count(), len(jobs))
+    if workers <= 1:
+        start_renderer(options)
+        return [render_job(job) for job in jobs]
+    with multiprocessing.Pool(workers, initializer = start_renderer, initargs = (options,)) as pool:
+        return pool.map(render_job, jobs, chunksize = max(1, len(jobs) // (4 * workers)))
+
+# writes the frames as an animation with one reused figure (.gif with Pillow, other extensions with ffmpeg)
+def write_animation(frames, titles, filename, spacing = 1.0, fps = 10, **options):
+    from matplotlib.animation import FFMpegWriter, PillowWriter
+    frame_renderer = FrameRenderer(**options)
+    writer = PillowWriter(fps = fps) if filename.endswith('.gif') else FFMpegWriter(fps = fps)
+    with writer.saving(frame_renderer.figure, filename, frame_renderer.figure.dpi):
+        for frame, title in zip(frames, titles):
+            frame_renderer.update(read_frame(frame), title, spacing)
+            writer.grab_frame()
+    return filename
+
+# the frames of grid files and time-series files (.sdfs, one frame per snapshot)
+# It returns: (frames, titles, output file names without extension), the spacing of the last time series
+def expand_frames(files):
+    frames, titles, names, spacing = [], [], [], 1.0
+    for filename in files:
+        name = os.path.splitext(filename)[0]
+        if filename.endswith('.sdfs'):
+            times, grids, header = load_series(filename)
+            frames += list(grids)
+            titles += [f"{os.path.basename(name)}    t={t:g}" for t in times]
+            names += [f"{name}_t_{t:g}" for t in times]
+            spacing = header['spacing']
+        else:
+            frames.append(filename)
+            titles.append(os.path.basename(name))
+            names.append(name)
+    return frames, titles, names, spacing
+
+def main():     # renders grid files:  python SimFab_Ex_1_render.py grid.sdf [grid.sdf / series.sdfs ...] [output.gif]
+    args = sys.argv[1:]
+    grids = [a for a in args if a.endswith('.sdf') or a.endswith('.csv') or a.endswith('.sdfs')]
+    if not grids:
+        print("Provide the following values: [grid.sdf / series.sdfs ...] [animation.gif / animation.mp4]")
+        return
+    animations = [a for a in args if a not in grids]
+    frames, titles, names, spacing = expand_frames(grids)
+    if animations:
+        print(f"Saved animation to {write_animation(frames, titles, animations[0], spacing)}")
+    else:
+        for filename in render_frames(frames, titles, [name + '.png' for name in names], spacing):
+            print(f"Saved frame to {filename}")
+
+if __name__ == '__main__':
+    main()
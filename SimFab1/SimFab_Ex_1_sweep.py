@@ -0,0 +1,183 @@
+import numpy as np
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from SimFab_Ex_1_Task3 import SDFGrid, simple_advance, velocity_field, curvature_as_velocity
+from SimFab_Ex_1_gridio import save_grid, load_grid
+from SimFab_Ex_1_integrate import snapshots, report_text
+from SimFab_Ex_1_advection import FLUXES
+
+# Parameter sweeps of the Task 3 advection runs over a process pool, with a content-addressed result cache:
+# the parameter grid (shape, method, spacing, velocity, time) is expanded into cases, and every case is stored under the
+# SHA-256 of its parameters together with the code version (a hash of the engine sources). Running a sweep again only
+# computes the cases that are missing or whose parameters or code changed; all others are read back from the cache.
+# Cases that differ only in their time belong to the same run, which is integrated once up to its latest missing time
+# (SimFab_Ex_1_integrate.snapshots), so a run is never repeated for another output time.
+#   cache directory:  <key>.sdf  the result grid (SimFab_Ex_1_gridio format),  <key>.json  the case and its run report
+
+# modules whose source determines the results (a change in any of them invalidates the cache)
+ENGINE_MODULES = ['SimFab_Ex_1_Task1', 'SimFab_Ex_1_Task2', 'SimFab_Ex_1_Task3', 'SimFab_Ex_1_advection',
+                  'SimFab_Ex_1_derivatives', 'SimFab_Ex_1_halo', 'SimFab_Ex_1_integrate', 'SimFab_Ex_1_narrowband',
+                  'SimFab_Ex_1_reinit', 'SimFab_Ex_1_backend', 'SimFab_Ex_1_fieldcache', 'SimFab_Ex_1_hamiltonian',
+                  'SimFab_Ex_1_velocity', 'SimFab_Ex_1_extension', 'SimFab_Ex_1_gridio', 'SimFab_Ex_1_sweep']
+
+# parameters of a case, in the order of the parameter grid
+PARAMETERS = ['shape', 'method', 'spacing', 'velocity', 'time']
+
+# hash of the engine sources
+def code_version(modules = ENGINE_MODULES):
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        with open(os.path.join(directory, module + '.py'), 'rb') as f:
+            digest.update(f.read().replace(b'\r\n', b'\n'))
+    return digest.hexdigest()
+
+# parameters in a canonical form for hashing: numbers as floats (spacing 1 and 1.0 are the same case), tuples as lists
+def canonical(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {k: canonical(v) for k, v in value.items()}
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+# cache key of a case
+def case_key(case, version):
+    text = json.dumps({'case': canonical(case), 'code': version}, sort_keys = True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+# all combinations of a parameter grid
+# grid: dictionary with a list of values for every name in PARAMETERS; a shape is (name, n_x, n_y, parameters), e.g.
+# ('Circle', 100, 100, (50, 50, 10)) or ('Rectangle', 100, 100, (20, 30, 25, 50)); a velocity is a number (constant
+# normal speed), a vector (V . n) or 'curvature'; method is 'simple advance' or a flux of SimFab_Ex_1_advection ('engquist_osher', 'godunov', ...)
+# It returns: list of case dictionaries
+def expand(grid):
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(*(grid[name] for name in PARAMETERS))]
+
+# the initial SDF of a shape (on the index coordinates, as in Task 3)
+def initial_grid(shape):
+    name, n_x, n_y, parameters = shape
+    sdf_grid = SDFGrid(int(n_x), int(n_y), 1.0)
+    if name == 'Circle':
+        sdf_grid.distance_circle(parameters[0:2], parameters[2])
+    elif name == 'Rectangle':
+        sdf_grid.distance_rectangle(parameters[0:2], parameters[2:4])
+    else:
+        raise ValueError(f"unknown shape {name}, has to be Circle or Rectangle")
+    return sdf_grid
+
+# velocity of every cell of the initial grid
+def case_velocity(velocity, sdf_grid):
+    if isinstance(velocity, str):
+        if velocity != 'curvature':
+            raise ValueError(f"unknown velocity {velocity}")
+        return curvature_as_velocity(sdf_grid)
+    if np.ndim(velocity) == 1:
+        return velocity_field(sdf_grid, np.asarray(velocity, dtype = float))
+    return np.full(sdf_grid.grid.shape, float(velocity))
+
+# computes the given times of one run (shape, method, spacing, velocity) and writes them into the cache
+# job: (directory, run parameters, list of (time, key))
+# It returns: (keys written, wall time of the run)
+def run_job(job):
+    directory, run, targets = job
+    start = time.perf_counter()
+    sdf_grid = initial_grid(run['shape'])
+    velocity = case_velocity(run['velocity'], sdf_grid)
+    times = [t for t, key in targets]
+    report = {}
+    if run['method'] == 'simple advance':
+        results = ((t, simple_advance(sdf_grid.grid, velocity, t)) for t in times)
+    elif run['method'] in FLUXES:
+        results = snapshots(sdf_grid.grid, velocity, run['spacing'], times, copy = False, report = report, flux = run['method'])
+    else:
+        raise ValueError(f"unknown method {run['method']}")
+    for (t, grid), (target, key) in zip(results, targets):
+        path = os.path.join(directory, key)
+        # written under a temporary name and renamed, so an interrupted job never leaves a half-written result
+        save_grid(path + '.sdf.part', grid, run['spacing'])
+        with open(path + '.json.part', 'w') as f:
+            json.dump({'case': canonical(dict(run, time = t)), 'report': report_text(report) if report else ''}, f)
+        os.replace(path + '.sdf.part', path + '.sdf')
+        os.replace(path + '.json.part', path + '.json')
+    return [key for t, key in targets], time.perf_counter() - start
+
+# runs a parameter sweep
+# grid: parameter grid (see expand), directory: cache directory, workers: number of processes (default: all cores)
+# It returns: (results, statistics) - a list of (case, result grid as np.memmap) in the order of expand(grid), and
+# a dictionary with 'cases', 'computed', 'cached' and 'wall_time'
+def sweep(grid, directory = 'sweep_cache', workers = None, progress = True):
+    os.makedirs(directory, exist_ok = True)
+    version = code_version()
+    cases = expand(grid)
+    keys = [case_key(case, version) for case in cases]
+
+    # missing cases, grouped into runs that differ only in the time
+    runs = {}
+    for case, key in zip(cases, keys):
+        if os.path.exists(os.path.join(directory, key + '.sdf')):
+            continue
+        run = {name: case[name] for name in PARAMETERS if name != 'time'}
+        targets = runs.setdefault(json.dumps(canonical(run), sort_keys = True), (run, {}))[1]
+        targets[key] = case['time']
+    jobs = [(directory, run, sorted((t, key) for key, t in targets.items())) for run, targets in runs.values()]
+    computed = sum(len(job[2]) for job in jobs)
+    if progress:
+        print(f"{len(cases)} cases: {len(cases) - computed} cached, {computed} to compute in {len(jobs)} runs")
+
+    start = time.perf_counter()
+    workers = min(workers or os.cpu_count(), max(len(jobs), 1))
+    if workers <= 1:
+        results = map(run_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(run_job, jobs)
+    try:
+        for count, (written, seconds) in enumerate(results, 1):
+            if progress:
+                print(f"\r{count}/{len(jobs)} runs    {time.perf_counter() - start:7.1f} s", end = '', flush = True)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if progress and jobs:
+        print()
+
+    results = [(case, load_grid(os.path.join(directory, key + '.sdf'))[0]) for case, key in zip(cases, keys)]
+    statistics = {'cases': len(cases), 'computed': computed, 'cached': len(cases) - computed,
+                  'wall_time': time.perf_counter() - start}
+    return results, statistics
+
+def main():     # the Task 3 sweep:  python SimFab_Ex_1_sweep.py x-size y-size [Circle / Rectangle] [parameters] [workers] [cache directory]
+    args = sys.argv[1:]
+    if len(args) < 5:
+        print("Provide the following values: [x-size(n_x) y-size(n_y)] [Circle / Rectangle] [parameters] [workers] [cache directory]")
+        return
+    n_x, n_y, name = int(args[0]), int(args[1]), args[2]
+    corner = (float(args[3]), float(args[4]))
+    if name == "Circle":
+        shape = (name, n_x, n_y, (corner[0], corner[1], 10))       # radius fixed at 10, as in Task 3
+    elif name == "Rectangle":
+        shape = (name, n_x, n_y, (corner[0], corner[1], corner[0] + 5, corner[1] + 20))
+    else:
+        print("Error: shape has to be Circle or Rectangle")
+        return
+    workers = int(args[5]) if len(args) > 5 else None
+    directory = args[6] if len(args) > 6 else 'sweep_cache'
+    grid = {'shape': [shape], 'method': ['simple advance', 'engquist_osher'], 'spacing': [1, 0.25],
+            'velocity': [10, (1, 0), 'curvature'], 'time': [0.1, 1]}
+    results, statistics = sweep(grid, directory, workers)
+    for case, result in results:
+        print(f"{case['method']:>15}  dx={case['spacing']:<5} V={str(case['velocity']):<10} t={case['time']:<4}  "
+              f"min {result.min():8.3f}  {np.count_nonzero(result < 0):6d} cells inside")
+    print(f"{statistics['computed']} computed, {statistics['cached']} from the cache in {statistics['wall_time']:.2f} s")
+
+if __name__ == '__main__':
+    main()
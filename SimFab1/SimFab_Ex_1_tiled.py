@@ -0,0 +1,140 @@
+import numpy as np
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from SimFab_Ex_1_Task1 import SDFGrid
+from SimFab_Ex_1_gridio import create_grid, load_grid, read_header
+from SimFab_Ex_1_csg import Circle, Rectangle, Union, Intersection, Difference, PRIMITIVES, evaluate_tiled
+
+# Out-of-core, tiled and process-parallel SDF generation:
+# the grid lives in a binary .sdf file (see SimFab_Ex_1_gridio) that every worker process maps with np.memmap, so the
+# workers write their tiles straight into the shared output and the grid never has to fit into memory.
+# A small sidecar file (<grid file>.tiles: the SHA-256 of the shape definition and tile size, then one byte per tile)
+# records the finished tiles; if the run is interrupted, running it again with the same arguments only computes the
+# missing tiles, and with a different shape it starts again. The sidecar is removed when all tiles are done.
+
+# per-process state of the workers (opened once in the pool initializer)
+worker = {}
+
+DIGEST_SIZE = 32          # bytes of the shape hash in front of the tile flags
+
+# the definition of a shape as nested lists (kind and float parameters), the same for equal shapes
+def shape_definition(shape):
+    if isinstance(shape, PRIMITIVES):
+        return [type(shape).__name__] + [float(p) for p in shape.parameters]
+    if isinstance(shape, (Union, Intersection)):
+        return [type(shape).__name__] + [shape_definition(s) for s in shape.shapes]
+    if isinstance(shape, Difference):
+        return ['Difference', shape_definition(shape.base), shape_definition(shape.cutters)]
+    raise ValueError(f"unknown shape {type(shape).__name__}")
+
+# hash of the shape definition and the tile size, stored in the sidecar
+def shape_digest(shape, tile):
+    return hashlib.sha256(repr((shape_definition(shape), tile)).encode()).digest()
+
+def open_worker(filename, tile, shape):
+    grid, header = load_grid(filename, mode = 'r+')
+    done = np.memmap(filename + '.tiles', dtype = np.uint8, mode = 'r+', offset = DIGEST_SIZE)
+    n_x, n_y = header['shape']
+    worker['sdf'] = SDFGrid(n_x, n_y, header['spacing'], header['boundary_condition'], grid = grid)
+    worker['done'] = done
+    worker['tile'] = tile
+    worker['shape'] = shape
+
+# computes one tile (number k in row-major tile order) of the shape's SDF and marks it as done
+def compute_tile(k):
+    sdf, done, tile, shape = worker['sdf'], worker['done'], worker['tile'], worker['shape']
+    tiles_y = -(-sdf.n_y // tile)
+    i, j = (k // tiles_y) * tile, (k % tiles_y) * tile
+    x, y = sdf.BC_vectorized(np.arange(i, min(i + tile, sdf.n_x))[:, None], np.arange(j, min(j + tile, sdf.n_y))[None, :])
+    evaluate_tiled(shape, x, y, out = sdf.grid[i:i + tile, j:j + tile])
+    sdf.grid.flush()          # the values are on disk before the tile is marked as done
+    done[k] = 1
+    done.flush()
+    return k
+
+# generates the SDF of `shape` (a primitive or CSG shape from SimFab_Ex_1_csg) into a grid file
+# tile: tile size in grid points, workers: number of processes (default: all cores), progress: print the progress
+# It returns: the SDFGrid, backed by the memory-mapped file
+def generate(filename, n_x, n_y, spacing, boundary_condition, shape, tile = 512, workers = None, progress = True):
+    tiles = -(-n_x // tile) * -(-n_y // tile)
+    sidecar = filename + '.tiles'
+    digest = shape_digest(shape, tile)
+
+    resume = os.path.exists(filename) and os.path.exists(sidecar)
+    if resume:
+        header, offset = read_header(filename)
+        if header['shape'] != (n_x, n_y) or header['spacing'] != spacing or header['boundary_condition'] != boundary_condition:
+            raise ValueError(f"{filename} is an unfinished grid with different parameters, remove it and {sidecar} to start again")
+        with open(sidecar, 'rb') as file:
+            resume = file.read(DIGEST_SIZE) == digest and os.path.getsize(sidecar) == DIGEST_SIZE + tiles
+        if not resume and progress:
+            print(f"{filename} was started with a different shape or tile size, starting again")
+    if not resume:
+        create_grid(filename, (n_x, n_y), spacing, boundary_condition)
+        with open(sidecar, 'wb') as file:
+            file.write(digest)
+            file.write(bytes(tiles))
+
+    done = np.fromfile(sidecar, dtype = np.uint8, offset = DIGEST_SIZE)
+    todo = [k for k in range(tiles) if not done[k]]
+    if progress and len(todo) < tiles:
+        print(f"Resuming {filename}: {tiles - len(todo)} of {tiles} tiles already done")
+
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    if workers == 1:
+        open_worker(filename, tile, shape)
+        results = (compute_tile(k) for k in todo)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer = open_worker, initargs = (filename, tile, shape))
+        results = pool.imap_unordered(compute_tile, todo)
+    try:
+        for count, k in enumerate(results, 1):
+            if progress and (count == len(todo) or count % max(1, len(todo) // 100) == 0):
+                elapsed = time.perf_counter() - start
+                remaining = elapsed / count * (len(todo) - count)
+                print(f"\r{filename}: {tiles - len(todo) + count}/{tiles} tiles    {elapsed:7.1f} s    about {remaining:7.1f} s left", end = '', flush = True)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        worker.clear()
+    if progress:
+        print()
+
+    os.remove(sidecar)
+    grid, header = load_grid(filename, mode = 'r+')
+    return SDFGrid(n_x, n_y, spacing, boundary_condition, grid = grid)
+
+def main():     # command line: ./grid file.sdf x-size y-size spacing [Circle / Rectangle] [reflective / periodic] [parameters] [workers] [tile]
+    args = sys.argv[1:]
+    if len(args) < 9:
+        print("Provide the following values: [file.sdf] [x-size(n_x) y-size(n_y)] [spacing] [Circle / Rectangle] [reflective / periodic] [parameters] [workers] [tile]")
+        return
+    filename = args[0]
+    n_x = int(args[1])
+    n_y = int(args[2])
+    spacing = float(args[3])
+    shape = args[4]
+    boundary_condition = args[5]
+    if shape == "Circle":
+        # args[6] and args[7] = centre of the circle, args[8] = radius
+        primitive = Circle((float(args[6]), float(args[7])), float(args[8]))
+        options = args[9:]
+    elif shape == "Rectangle":
+        # args[6] - args[9] = minimum and maximum corner of the rectangle
+        primitive = Rectangle((float(args[6]), float(args[7])), (float(args[8]), float(args[9])))
+        options = args[10:]
+    else:
+        print("Error: shape has to be Circle or Rectangle")
+        return
+    workers = int(options[0]) if len(options) > 0 else None
+    tile = int(options[1]) if len(options) > 1 else 512
+    generate(filename, n_x, n_y, spacing, boundary_condition, primitive, tile, workers)
+
+if __name__ == '__main__':
+    main()
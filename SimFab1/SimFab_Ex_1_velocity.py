@@ -0,0 +1,226 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from SimFab_Ex_1_Task2 import SDFGrid
+from SimFab_Ex_1_narrowband import NarrowBandGrid
+from SimFab_Ex_1_extension import extend_velocity
+
+# Composable normal-speed fields for the advection (phi_t + V |grad phi| = 0):
+#   Constant(V)                     the same speed everywhere
+#   Directional(vector)             V = vector . n, e.g. a directional etch
+#   Curvature(factor)               V = factor * curvature (factor -1: motion by mean curvature, as in Task 3)
+#   Masked(field, mask)             the field inside a region (boolean array), 0 outside
+#   Material(materials, speeds)     per-material lookup: materials is an array of material numbers, speeds maps every
+#                                   material to a number or a field
+#   Extended(field)                 the field evaluated at the interface cells only and extended off the interface
+#                                   (SimFab_Ex_1_extension), for speeds that only mean something on the surface
+# and field + field, number * field, field.masked(mask). A field is evaluated from the current grid (array, SDFGrid
+# or NarrowBandGrid), either for the whole grid or only at given cells (index arrays (i, j), e.g. a narrow band),
+# so normals and curvature are only computed where they are needed. The spacing of the fields that take derivatives
+# is that of the grid for an SDFGrid or NarrowBandGrid (the time integration passes an SDFGrid with the spacing of the
+# run); for a plain array it has to be given to the field.
+# Every field also knows the cells where it can be nonzero (active()); the advection (SimFab_Ex_1_advection) only
+# takes derivatives and fluxes at those cells, and cells with zero velocity keep their values.
+
+# the spacing of a grid: that of an SDFGrid or NarrowBandGrid, otherwise the given one (a plain array has none)
+def grid_spacing(phi, spacing):
+    if isinstance(phi, (SDFGrid, NarrowBandGrid)):
+        return phi.spacing
+    if spacing is None:
+        raise ValueError("the spacing of a plain grid array is unknown: give the field a spacing or pass an SDFGrid")
+    return spacing
+
+# an SDFGrid over the grid values for the normal and curvature operators of Task 2
+# (an SDFGrid is used as it is, so its cached normals and curvature are reused)
+def sdf_view(phi, spacing):
+    if isinstance(phi, SDFGrid):
+        return phi
+    sdf_grid = SDFGrid(phi.shape[0], phi.shape[1], grid_spacing(phi, spacing))
+    sdf_grid.grid = phi
+    return sdf_grid
+
+# base class: a field has to define evaluate(), otherwise it cannot be constructed
+class VelocityField(ABC):
+    # speeds of the whole grid (cells = None, dense arrays only) or of the cells (i, j)
+    @abstractmethod
+    def evaluate(self, phi, cells = None):
+        pass
+
+    # boolean array of the cells where the speed can be nonzero, or None if that can be every cell
+    def active(self, phi):
+        return None
+
+    # the cells to evaluate: the active cells among the given ones (all cells of a dense grid if cells is None)
+    # It returns: index arrays (i, j), or None for the whole grid
+    def active_cells(self, phi, cells = None):
+        mask = self.active(phi)
+        if mask is None:
+            return cells
+        if cells is None:
+            return np.nonzero(mask)
+        keep = mask[cells]
+        return cells[0][keep], cells[1][keep]
+
+    # largest |V| of the grid (for the CFL condition); a NarrowBandGrid is only evaluated at its band cells
+    def max_speed(self, phi):
+        cells = (phi.keys // phi.n_y, phi.keys % phi.n_y) if isinstance(phi, NarrowBandGrid) else None
+        cells = self.active_cells(phi, cells)
+        if cells is not None and not len(cells[0]):
+            return 0.0
+        return np.max(np.abs(self.evaluate(phi, cells)))
+
+    def __add__(self, other):
+        return Sum(self, other if isinstance(other, VelocityField) else Constant(other))
+
+    __radd__ = __add__
+
+    def __mul__(self, factor):
+        return Scaled(self, factor)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Scaled(self, -1.0)
+
+    def masked(self, mask):
+        return Masked(self, mask)
+
+# the shape of the evaluated speeds
+def value_shape(phi, cells):
+    values = phi.grid if isinstance(phi, SDFGrid) else phi
+    return values.shape if cells is None else np.shape(cells[0])
+
+class Constant(VelocityField):
+    def __init__(self, speed):
+        self.speed = float(speed)
+
+    def evaluate(self, phi, cells = None):
+        return np.full(value_shape(phi, cells), self.speed)
+
+    def active(self, phi):
+        return None if self.speed != 0 else np.zeros(value_shape(phi, None), dtype = bool)
+
+class Directional(VelocityField):
+    def __init__(self, vector, spacing = None):
+        self.vector = np.asarray(vector, dtype = float)
+        self.spacing = spacing
+
+    def evaluate(self, phi, cells = None):
+        sdf_grid = sdf_view(phi, self.spacing)
+        normal_x, normal_y = sdf_grid.normal_field() if cells is None else sdf_grid.normal(*cells)
+        return self.vector[0] * normal_x + self.vector[1] * normal_y
+
+    def active(self, phi):
+        return None if np.any(self.vector != 0) else np.zeros(value_shape(phi, None), dtype = bool)
+
+class Curvature(VelocityField):
+    def __init__(self, factor = -1.0, spacing = None):
+        self.factor = factor
+        self.spacing = spacing
+
+    def evaluate(self, phi, cells = None):
+        sdf_grid = sdf_view(phi, self.spacing)
+        curvature = sdf_grid.curvature_field() if cells is None else sdf_grid.curvature(*cells)
+        return self.factor * curvature
+
+    def active(self, phi):
+        return None if self.factor != 0 else np.zeros(value_shape(phi, None), dtype = bool)
+
+class Masked(VelocityField):
+    def __init__(self, field, mask):
+        self.field = field
+        self.mask = np.asarray(mask, dtype = bool)
+
+    def evaluate(self, phi, cells = None):
+        inside = self.mask if cells is None else self.mask[cells]
+        speed = np.zeros(inside.shape)
+        if np.any(inside):      # the field is only evaluated inside the mask
+            where = np.nonzero(inside) if cells is None else (cells[0][inside], cells[1][inside])
+            speed[inside] = self.field.evaluate(phi, where)
+        return speed
+
+    def active(self, phi):
+        mask = self.field.active(phi)
+        return self.mask if mask is None else self.mask & mask
+
+class Material(VelocityField):
+    # materials: integer array of the grid shape, speeds: dictionary material -> number or field (missing: speed 0)
+    def __init__(self, materials, speeds):
+        self.materials = np.asarray(materials)
+        self.speeds = {m: s if isinstance(s, VelocityField) else Constant(s) for m, s in speeds.items()}
+
+    def evaluate(self, phi, cells = None):
+        material = self.materials if cells is None else self.materials[cells]
+        speed = np.zeros(material.shape)
+        for m, field in self.speeds.items():
+            inside = material == m
+            if np.any(inside):
+                where = np.nonzero(inside) if cells is None else (cells[0][inside], cells[1][inside])
+                speed[inside] = field.evaluate(phi, where)
+        return speed
+
+    def active(self, phi):
+        mask = np.zeros(self.materials.shape, dtype = bool)
+        for m, field in self.speeds.items():
+            field_mask = field.active(phi)
+            mask |= (self.materials == m) if field_mask is None else (self.materials == m) & field_mask
+        return mask
+
+class Extended(VelocityField):
+    # band: extend only to the cells with |phi| < band * spacing (0 beyond), default: the whole grid or narrow band
+    def __init__(self, field, band = None, spacing = None):
+        self.field = field
+        self.band = band
+        self.spacing = spacing
+        self.cached = None
+        self.evaluations = 0        # number of cells at which the field was evaluated so far
+
+    # the extended speeds and their flat indices; the CFL condition and the advection rate evaluate the field for the
+    # same grid, so the extension of the last grid values is kept
+    def extension(self, phi):
+        values = phi.grid if isinstance(phi, SDFGrid) else phi
+        current = (values.keys, values.values) if isinstance(values, NarrowBandGrid) else (values,)
+        if self.cached is None or not all(np.array_equal(a, b) for a, b in zip(self.cached[0], current)):
+            spacing = grid_spacing(phi, self.spacing)
+            speeds, keys, evaluated = extend_velocity(values, lambda i, j: self.field.evaluate(phi, (i, j)), spacing, self.band)
+            self.evaluations += evaluated
+            self.cached = (tuple(np.copy(a) for a in current), speeds, keys)
+        return self.cached[1], self.cached[2]
+
+    def evaluate(self, phi, cells = None):
+        speeds, keys = self.extension(phi)
+        shape = np.shape(phi.grid if isinstance(phi, SDFGrid) else phi)
+        if cells is None:
+            speed = np.zeros(np.prod(shape))
+            speed[keys] = speeds
+            return speed.reshape(shape)
+        flat = np.ravel_multi_index(cells, shape)
+        position = np.searchsorted(keys, flat)
+        found = np.take(keys, position, mode = 'clip') == flat
+        return np.where(found, np.take(speeds, position, mode = 'clip'), 0.0)
+
+    def active(self, phi):
+        return self.field.active(phi)
+
+class Sum(VelocityField):
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def evaluate(self, phi, cells = None):
+        return sum(field.evaluate(phi, cells) for field in self.fields)
+
+    def active(self, phi):
+        masks = [field.active(phi) for field in self.fields]
+        if any(mask is None for mask in masks):
+            return None
+        return np.logical_or.reduce(masks)
+
+class Scaled(VelocityField):
+    def __init__(self, field, factor):
+        self.field = field
+        self.factor = float(factor)
+
+    def evaluate(self, phi, cells = None):
+        return self.factor * self.field.evaluate(phi, cells)
+
+    def active(self, phi):
+        return self.field.active(phi) if self.factor != 0 else np.zeros(value_shape(phi, None), dtype = bool)